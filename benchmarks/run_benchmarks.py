@@ -0,0 +1,331 @@
+'''
+Scaling benchmark of the flexCHP and flexCHP_SysOpt models.
+
+Both models are solved on synthetic demand profiles of different horizon
+lengths (number of time steps), each case in its own process so that the
+peak memory is measured per case. The stages of the pipeline (build,
+solve, postprocess) are timed with the instrumentation of the models
+(metrics=True, see common/instrumentation.py). build_memory_mb is the peak
+memory of the process at the end of the build of the energy system and the
+model, peak_memory_mb the peak of the whole case.
+
+With --frequency the models are solved at another resolution than hourly
+(the number of time steps refers to this resolution), the hourly synthetic
+profiles are resampled by the models.
+
+The results are appended to benchmarks/history.csv. A stage of a case is
+flagged as a regression if it takes longer (or needs more memory) than the
+median of the previous runs of the same case on the same host by more than
+the tolerance.
+
+Run from the repository root, e.g.:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --models flexCHP_SysOpt --steps 24 168
+    python benchmarks/run_benchmarks.py --frequency 15min --steps 96 35040
+
+The solver set in the config file of the model (e.g. cbc) has to be
+installed. The exit code is 1 if a regression is found.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import argparse
+import datetime
+import math
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Config file of each model (directory), scenario solved in the benchmark
+# and result directories (in results/optimisation_results) the model
+# writes to
+MODELS = {'flexCHP': {'config': 'experiment_1.yml', 'scenario': 1,
+                      'dirs': ['log', 'dumps']},
+          'flexCHP_SysOpt': {'config': 'experiment.yml', 'scenario': 0,
+                             'dirs': ['log',
+                                      'dumps/linear_price_relationship',
+                                      'dumps/quadratic_price_relationship']}}
+
+# Horizons in time steps (hours): day, week, four weeks, quarter, year, two
+# and three years
+HORIZONS = [24, 168, 672, 2190, 8760, 17520, 26280]
+
+# Settings of the config file overridden in the benchmark
+SETTINGS = {'debug': False, 'run_single_scenario': True, 'metrics': True,
+            'trace': False, 'profile': False, 'plots': 'off',
+            'typical_days': 0, 'duals': False, 'rolling_horizon': False,
+            'aggregation_compare_full': False}
+
+# Stages (see instrumentation.stage) summed up to the benchmarked stages
+STAGES = {'build': ['read_data', 'energysystem', 'model'],
+          'solve': ['solve'],
+          'postprocess': ['processing', 'dump', 'load_results', 'kpis']}
+
+# Columns compared with previous runs
+COMPARED = ['build_s', 'solve_s', 'postprocess_s', 'total_s',
+            'build_memory_mb', 'peak_memory_mb']
+
+MODEL_SIZE = ['variables', 'binaries', 'constraints', 'nonzeros']
+
+
+def synthetic_profiles(steps, seed=0):
+    """
+    Nominal demand profiles (0...1) with daily and seasonal patterns:
+    heat demand, positive (demand_el) and negative (neg_residual_el) share
+    of a residual load.
+    """
+    rng = np.random.RandomState(seed)
+    hours = np.arange(steps)
+    season = np.cos(2 * np.pi * hours / 8760)
+    day = np.sin(2 * np.pi * (hours - 6) / 24)
+    demand_th = np.clip(0.55 + 0.3 * season + 0.1 * day
+                        + 0.05 * rng.randn(steps), 0, 1)
+    residual = (0.2 + 0.2 * season + 0.3 * day
+                + 0.3 * np.convolve(rng.randn(steps), np.ones(12) / 12,
+                                    mode='same'))
+    return pd.DataFrame({
+        'demand_th': demand_th,
+        'demand_el': residual.clip(min=0) / residual.max(),
+        'neg_residual_el': residual.clip(max=0) / residual.min()})
+
+
+def case_name(steps, frequency='H'):
+    if frequency == 'H':
+        return 'benchmark_{0}'.format(steps)
+    return 'benchmark_{0}_{1}'.format(steps, frequency)
+
+
+def hourly_steps(steps, frequency):
+    """Number of hours covered by steps time steps of frequency."""
+    return int(math.ceil(steps * pd.tseries.frequencies.to_offset(
+        frequency).nanos / 3.6e12))
+
+
+def prepare_case(model, steps, config_dir, frequency='H'):
+    """Write the synthetic profiles and the config file of a case."""
+    model_dir = os.path.join(ROOT, model)
+    for d in ['data_preprocessed'] + [
+            os.path.join('results', 'optimisation_results', d)
+            for d in MODELS[model]['dirs']]:
+        os.makedirs(os.path.join(model_dir, d), exist_ok=True)
+    hours = hourly_steps(steps, frequency)
+    demand_file = '/data_preprocessed/{0}_demand.csv'.format(case_name(hours))
+    if not os.path.exists(model_dir + demand_file):
+        synthetic_profiles(hours).to_csv(model_dir + demand_file, index=False)
+
+    with open(os.path.join(model_dir, 'experiment_config',
+                           MODELS[model]['config']), 'r') as ymlfile:
+        cfg = yaml.safe_load(ymlfile)
+    cfg.update(SETTINGS,
+               number_of_time_steps=steps,
+               frequency=frequency,
+               demand_frequency='H',
+               demand_time_series=demand_file,
+               filename_dumb=case_name(steps, frequency),
+               filename_logfile=case_name(steps, frequency))
+    config_path = os.path.join(config_dir, '{0}_{1}.yml'.format(
+        model, case_name(steps, frequency)))
+    with open(config_path, 'w') as ymlfile:
+        yaml.safe_dump(cfg, ymlfile)
+    return config_path
+
+
+def run_case(model, config_path):
+    """
+    Solve and postprocess a case (run in a separate process with the src
+    directory of the model as working directory).
+    """
+    sys.path.insert(0, os.path.join(ROOT, 'common'))
+    sys.path.insert(0, os.getcwd())
+    from instrumentation import reset, start_stages, stage, write_reports
+    from kpi import stack_sequences, compute_kpis
+    from model_flex_chp import run_model_flexchp
+    from analyse import load_results
+
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.safe_load(ymlfile)
+    abs_path = os.path.dirname(os.getcwd())
+    scenario = MODELS[model]['scenario']
+
+    reset(cfg, abs_path)
+    run_model_flexchp(config_path, scenario)
+    start_stages(cfg, abs_path, scenario)
+    with stage('load_results'):
+        results = load_results(cfg, abs_path, scenario)
+    with stage('kpis'):
+        values, names, _ = stack_sequences(results)
+        compute_kpis(values, names)
+    write_reports(cfg, abs_path)
+
+
+def build_memory_mb(events_file, scenario):
+    """
+    Peak memory of the process at the end of the build stages of scenario
+    (from the events recorded by the instrumentation of the model).
+    """
+    with open(events_file, 'r') as f:
+        events = [json.loads(line) for line in f]
+    return max(e['peak_memory_mb'] for e in events
+               if e['type'] == 'stage' and e['scenario'] == scenario
+               and e['name'] in STAGES['build'])
+
+
+def benchmark(model, steps, config_dir, timeout=None, frequency='H'):
+    """Run a case in its own process and return its metrics."""
+    model_dir = os.path.join(ROOT, model)
+    log_dir = os.path.join(model_dir, 'results', 'optimisation_results',
+                           'log')
+    config_path = prepare_case(model, steps, config_dir, frequency)
+    name = case_name(steps, frequency)
+    row = {'model': model, 'steps': steps, 'frequency': frequency}
+    print('Benchmark {0} with {1} time steps of {2}'.format(
+        model, steps, frequency))
+    with open(os.path.join(log_dir, name + '_stdout.log'), 'w') as log:
+        try:
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--case', model,
+                 config_path],
+                cwd=os.path.join(model_dir, 'src'), stdout=log,
+                stderr=subprocess.STDOUT, timeout=timeout)
+            row['status'] = 'ok' if process.returncode == 0 else 'failed'
+        except subprocess.TimeoutExpired:
+            row['status'] = 'timeout'
+
+    metrics_file = os.path.join(log_dir, name + '_metrics.json')
+    if row['status'] == 'ok':
+        with open(metrics_file, 'r') as f:
+            metrics = [m for m in json.load(f)
+                       if m['scenario'] == MODELS[model]['scenario']][0]
+        for stage, stages in STAGES.items():
+            row[stage + '_s'] = sum(metrics.get(s + '_s') or 0
+                                    for s in stages)
+        row['total_s'] = metrics['total_s']
+        row['build_memory_mb'] = build_memory_mb(
+            os.path.join(log_dir, name + '_events.jsonl'),
+            MODELS[model]['scenario'])
+        row['peak_memory_mb'] = metrics['peak_memory_mb']
+        row.update({key: metrics.get(key) for key in MODEL_SIZE})
+
+    # The results of the benchmark are not kept
+    for file_path in glob.glob(os.path.join(
+            model_dir, 'results', 'optimisation_results', 'dumps', '**',
+            name + '_scenario_*'), recursive=True):
+        os.remove(file_path)
+    return row
+
+
+def find_regressions(runs, history, tolerance, min_seconds, baseline_runs):
+    """
+    Compare the runs with the median of the last baseline_runs successful
+    runs of the same case on the same host. Returns a list of
+    (model, steps, column, value, baseline).
+    """
+    regressions = []
+    if history.empty:
+        return regressions
+    # Runs recorded before the resolution could be chosen are hourly
+    frequencies = (history['frequency'].fillna('H')
+                   if 'frequency' in history else 'H')
+    for _, run in runs[runs['status'] == 'ok'].iterrows():
+        previous = history[(history['model'] == run['model'])
+                           & (history['steps'] == run['steps'])
+                           & (frequencies == run['frequency'])
+                           & (history['host'] == run['host'])
+                           & (history['status'] == 'ok')].tail(baseline_runs)
+        if previous.empty:
+            continue
+        for column in COMPARED:
+            baseline = previous[column].median()
+            margin = 0 if column == 'peak_memory_mb' else min_seconds
+            if (run[column] > baseline * (1 + tolerance)
+                    and run[column] - baseline > margin):
+                regressions.append((run['model'], run['steps'], column,
+                                    run[column], baseline))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Scaling benchmark of the flexCHP models.')
+    parser.add_argument('--models', nargs='+', default=list(MODELS),
+                        choices=list(MODELS))
+    parser.add_argument('--steps', nargs='+', type=int, default=HORIZONS,
+                        help='horizons in time steps')
+    parser.add_argument('--frequency', default='H',
+                        help="resolution of the models, e.g. '15min'")
+    parser.add_argument('--history',
+                        default=os.path.join(ROOT, 'benchmarks',
+                                             'history.csv'))
+    parser.add_argument('--no-history', action='store_true',
+                        help='do not append the results to the history')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative slowdown flagged as regression')
+    parser.add_argument('--min-seconds', type=float, default=0.5,
+                        help='ignore slowdowns below this absolute value')
+    parser.add_argument('--baseline-runs', type=int, default=3,
+                        help='number of previous runs of the baseline')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='timeout of each case in seconds')
+    parser.add_argument('--case', nargs=2, metavar=('MODEL', 'CONFIG'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(*args.case)
+        return 0
+
+    config_dir = tempfile.mkdtemp(prefix='flexchp_benchmark_')
+    runs = pd.DataFrame([benchmark(model, steps, config_dir, args.timeout,
+                                   args.frequency)
+                         for model in args.models for steps in args.steps])
+    runs.insert(0, 'timestamp', datetime.datetime.now().isoformat(
+        timespec='seconds'))
+    runs.insert(1, 'commit', git_commit())
+    runs.insert(2, 'host', platform.node())
+    runs.insert(3, 'python', platform.python_version())
+
+    pd.set_option('display.width', 200)
+    print('\n*** Benchmark results ***')
+    print(runs.drop(columns=['timestamp', 'host', 'python']).to_string(
+        index=False))
+
+    history = (pd.read_csv(args.history) if os.path.exists(args.history)
+               else pd.DataFrame())
+    regressions = find_regressions(runs, history, args.tolerance,
+                                   args.min_seconds, args.baseline_runs)
+    for model, steps, column, value, baseline in regressions:
+        print('REGRESSION {0} ({1} steps): {2} = {3:.2f}, baseline '
+              '{4:.2f}'.format(model, steps, column, value, baseline))
+
+    if not args.no_history:
+        pd.concat([history, runs], sort=False).to_csv(args.history,
+                                                      index=False)
+        print('Results appended to {0}'.format(args.history))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
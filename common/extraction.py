@@ -0,0 +1,110 @@
+'''
+Selective extraction of the results of a solved model.
+
+outputlib.processing.results collects every variable of every block of the
+model into one large table before it is split into a DataFrame per flow and
+component. The analysis reads only a few of them, so with
+results_extraction='selected' in the config file only the requested results
+are read from the variables of the solved model into numpy arrays:
+
+    flows:  list of (from, to) label tuples, e.g. ('CHP_01', 'heat'), and
+            ('storage_th', 'None') for the variables of a component, e.g.
+            its capacity and investment
+    nodes:  labels of nodes of which all flows are extracted, e.g. the buses
+            'electricity' and 'heat' for their balances
+
+Like the selection of read_results (see results_store.py). The results have
+the format of outputlib.processing.results (keys are nodes or (node, None),
+sequences with the variables as columns, scalars as Series), so they are
+dumped, written to the results store and analysed as before.
+results_extraction='full' uses outputlib.processing.results, e.g. for
+debugging.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import numpy as np
+import pandas as pd
+from pyomo.core import Var
+
+EXTRACTION_MODES = ['selected', 'full']
+
+
+def extraction_mode(cfg):
+    mode = cfg.get('results_extraction', 'selected')
+    if mode not in EXTRACTION_MODES:
+        raise ValueError("Unknown setting results_extraction='{0}', use one "
+                         "of {1}.".format(mode, EXTRACTION_MODES))
+    return mode
+
+
+def selected_keys(model, flows=None, nodes=None):
+    """
+    Keys (tuples of nodes) of the requested flows and of the components
+    (node, None) whose variables are extracted.
+    """
+    flows = [tuple(str(n) for n in f) for f in (flows or [])]
+    nodes = nodes or []
+    by_label = {str(n): n for key in model.flows for n in key}
+    flow_keys = [key for key in model.flows
+                 if tuple(str(n) for n in key) in flows
+                 or any(str(n) in nodes for n in key)]
+    components = [by_label[label] for label, target in flows
+                  if target == 'None' and label in by_label]
+    components += [by_label[label] for label in nodes
+                   if label in by_label and by_label[label] not in components]
+    return flow_keys, components
+
+
+def extract_results(model, flows=None, nodes=None):
+    """
+    Read the requested results (see module docstring) from the variables of
+    the solved model. Variables indexed by flow (and time step) and by
+    component (and time step) are read, without a time step they are
+    scalars.
+    """
+    flow_keys, components = selected_keys(model, flows, nodes)
+    timesteps = list(model.TIMESTEPS)
+    sequences = {}
+    scalars = {}
+
+    def read_sequence(var, key):
+        return np.array([var[key + (t,)].value for t in timesteps],
+                        dtype=float)
+
+    for var in model.component_objects(Var, active=True):
+        if not var.is_indexed():
+            continue
+        name = var.local_name
+        dim = var.dim()
+        if dim == 3:
+            for key in flow_keys:
+                if key + (timesteps[0],) in var:
+                    sequences.setdefault(key, {})[name] = read_sequence(
+                        var, key)
+        elif dim == 2:
+            for key in flow_keys:
+                if key in var:
+                    scalars.setdefault(key, {})[name] = var[key].value
+            for node in components:
+                # Variables of a component over other indices than the time
+                # steps (e.g. storage_level per day, see aggregation.py)
+                # are not read
+                if ((node, timesteps[0]) in var
+                        and (node, timesteps[-1]) in var):
+                    sequences.setdefault((node, None), {})[name] = \
+                        read_sequence(var, (node,))
+        elif dim == 1:
+            for node in components:
+                if node in var:
+                    scalars.setdefault((node, None), {})[name] = \
+                        var[node].value
+
+    index = model.es.timeindex[:len(timesteps)]
+    return {key: {'sequences': pd.DataFrame(sequences.get(key, {}),
+                                            index=index),
+                  'scalars': pd.Series(scalars.get(key, {}), dtype=float)}
+            for key in list(sequences) + [k for k in scalars
+                                          if k not in sequences]}
@@ -0,0 +1,363 @@
+'''
+Timing of the stages of the pipeline and size of the optimisation model.
+
+With metrics=True in the config file every stage that is run within
+
+    with stage('solve'):
+        ...
+
+is recorded (duration and peak memory of the process) for the current
+scenario, which is set with start_stages(cfg, abs_path, scenario). The
+records of all processes of a run are appended to
+<filename_logfile>_events.jsonl in results/optimisation_results/log/.
+write_reports sums them up to one row per scenario (seconds per stage,
+model size and peak memory) in <filename_logfile>_metrics.csv and .json.
+With trace=True all stages are additionally written in the Chrome trace
+event format to <filename_logfile>_trace.json, which can be opened in
+chrome://tracing or https://ui.perfetto.dev to inspect a sweep on a
+timeline.
+
+With profile=True in the config file (or main.py --profile) each stage is
+additionally profiled with cProfile. The statistics of all calls of a stage
+within a scenario are written to
+<filename_logfile>_<scenario>_<stage>.prof (e.g. open with snakeviz) and
+write_profile_summary lists the profile_top functions with the highest own
+time of each stage over all scenarios in
+<filename_logfile>_profile_summary.txt. With profile='pyinstrument' the
+stages are profiled with pyinstrument instead (pip install pyinstrument)
+and written to <filename_logfile>_<scenario>_<stage>.html, no summary is
+written for them.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import cProfile
+import glob
+import json
+import os
+import pstats
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Events file of the current run (None if metrics are not recorded),
+# scenario the recorded stages belong to (None for stages of the whole run,
+# e.g. preprocessing), profiler used for the stages (None if not profiled),
+# the basename of the profile files and whether a stage is being profiled
+_state = {'events_file': None, 'scenario': None, 'profiler': None,
+          'profile_basename': None, 'profiling': False}
+
+# Profilers of the stages of the current process by (scenario, stage), the
+# statistics of repeated calls of a stage are accumulated
+_profilers = {}
+
+# Profile all stages regardless of the config file (main.py --profile)
+_force_profile = {'profiler': None}
+
+PROFILERS = ['cprofile', 'pyinstrument']
+
+# Extension of the profile files written by each profiler
+PROFILE_SUFFIXES = {'cprofile': '.prof', 'pyinstrument': '.html'}
+
+# Marks the end of an iteration in staged
+_END = object()
+
+
+def log_dir(abs_path):
+    return abs_path + '/results/optimisation_results/log/'
+
+
+def events_file(cfg, abs_path):
+    return log_dir(abs_path) + cfg['filename_logfile'] + '_events.jsonl'
+
+
+def start_stages(cfg, abs_path, scenario=None):
+    """
+    Record (metrics=True) and profile (profile=True) the following stages
+    for scenario.
+    """
+    _state['events_file'] = (events_file(cfg, abs_path)
+                             if cfg.get('metrics', False) else None)
+    _state['scenario'] = scenario
+    _state['profiler'] = profiler_name(cfg)
+    _state['profile_basename'] = log_dir(abs_path) + cfg['filename_logfile']
+
+
+def force_profile(profiler='cprofile'):
+    """Profile all stages of this process and of processes forked by it."""
+    _force_profile['profiler'] = profiler
+
+
+def profiler_name(cfg):
+    """Profiler selected in the config file or forced, None if disabled."""
+    profiler = cfg.get('profile', False) or _force_profile['profiler']
+    if profiler is True:
+        profiler = 'cprofile'
+    if profiler and profiler not in PROFILERS:
+        raise ValueError("Unknown setting profile='{0}', use True, False or "
+                         "one of {1}.".format(profiler, PROFILERS))
+    return profiler or None
+
+
+def peak_memory_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_event(event):
+    if _state['events_file'] is None:
+        return
+    event.update(scenario=_state['scenario'], pid=os.getpid())
+    with open(_state['events_file'], 'a') as f:
+        f.write(json.dumps(event) + '\n')
+
+
+def profile_file(name, suffix):
+    scenario = 'run' if _state['scenario'] is None else _state['scenario']
+    return '{0}_{1}_{2}{3}'.format(_state['profile_basename'], scenario, name,
+                                   suffix)
+
+
+def start_profiler(name):
+    """
+    Start (or resume) the profiler of stage name in the current scenario.
+    Returns None if the stages are not profiled or another stage is already
+    being profiled (nested stages).
+    """
+    if _state['profiler'] is None or _state['profiling']:
+        return None
+    key = (_state['scenario'], name)
+    if key not in _profilers:
+        if _state['profiler'] == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise ImportError("profile='pyinstrument' requires "
+                                  "pyinstrument (pip install pyinstrument).")
+            _profilers[key] = Profiler()
+        else:
+            _profilers[key] = cProfile.Profile()
+    profiler = _profilers[key]
+    if _state['profiler'] == 'pyinstrument':
+        profiler.start()
+    else:
+        profiler.enable()
+    _state['profiling'] = True
+    return profiler
+
+
+def stop_profiler(profiler, name):
+    """Stop the profiler and write the statistics of the stage so far."""
+    _state['profiling'] = False
+    if _state['profiler'] == 'pyinstrument':
+        profiler.stop()
+        with open(profile_file(name, PROFILE_SUFFIXES['pyinstrument']),
+                  'w') as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        profiler.dump_stats(profile_file(name, PROFILE_SUFFIXES['cprofile']))
+
+
+@contextmanager
+def stage(name):
+    """Record (and profile) the enclosed block as stage name."""
+    profiler = start_profiler(name)
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        duration = time.time() - start_time
+        if profiler is not None:
+            stop_profiler(profiler, name)
+        write_event({'type': 'stage', 'name': name, 'start': start_time,
+                     'duration': duration,
+                     'peak_memory_mb': peak_memory_mb()})
+
+
+def staged(iterable, name):
+    """
+    Iterate over iterable (e.g. a generator reading results year by year),
+    recording the retrieval of each item as stage name.
+    """
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+@contextmanager
+def traced_memory():
+    """
+    Trace the memory allocated within the enclosed block (by python and
+    numpy). Yields a dict that holds the peak of the traced allocations
+    ('peak_mb') and the peak memory of the process ('process_peak_mb')
+    after the block.
+    """
+    usage = {}
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        yield usage
+    finally:
+        usage['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        usage['process_peak_mb'] = peak_memory_mb()
+        if not tracing:
+            tracemalloc.stop()
+
+
+def model_size(model):
+    """
+    Number of variables, binary variables, constraints and nonzeros (entries
+    of the constraint matrix) of a pyomo model.
+    """
+    from pyomo.core import Var, Constraint
+    try:
+        from pyomo.core.expr.visitor import identify_variables
+    except ImportError:  # pyomo < 6
+        from pyomo.core.expr.current import identify_variables
+
+    size = {'variables': 0, 'binaries': 0, 'constraints': 0, 'nonzeros': 0}
+    for variable in model.component_data_objects(Var):
+        size['variables'] += 1
+        size['binaries'] += variable.is_binary()
+    for constraint in model.component_data_objects(Constraint, active=True):
+        size['constraints'] += 1
+        size['nonzeros'] += sum(1 for _ in identify_variables(
+            constraint.body, include_fixed=False))
+    return size
+
+
+def record(**values):
+    """Record values (e.g. the model size) for the current scenario."""
+    write_event(dict(values, type='values'))
+
+
+def record_model_size(model):
+    """
+    Record the size of the model for the current scenario and return it
+    (None if metrics are not recorded).
+    """
+    if _state['events_file'] is None:
+        return None
+    size = model_size(model)
+    record(**size)
+    return size
+
+
+def profile_files(cfg, abs_path, profiler=None):
+    """
+    Profile files of the stages written by profiler (by default the profiler
+    of the current run, no files if the stages are not profiled).
+    """
+    profiler = profiler or profiler_name(cfg)
+    if profiler is None:
+        return []
+    return glob.glob(log_dir(abs_path) + cfg['filename_logfile'] + '_*'
+                     + PROFILE_SUFFIXES[profiler])
+
+
+def reset(cfg, abs_path):
+    """Delete the records and profiles (of any profiler) of a previous run."""
+    if os.path.exists(events_file(cfg, abs_path)):
+        os.remove(events_file(cfg, abs_path))
+    for profiler in PROFILERS:
+        for file_path in profile_files(cfg, abs_path, profiler):
+            os.remove(file_path)
+
+
+def read_events(cfg, abs_path):
+    with open(events_file(cfg, abs_path), 'r') as f:
+        return [json.loads(line) for line in f]
+
+
+def metrics_table(events):
+    """One row per scenario: seconds per stage, total, values and memory."""
+    events = [dict(e, scenario='run' if e['scenario'] is None
+                   else e['scenario']) for e in events]
+    stages = pd.DataFrame([e for e in events if e['type'] == 'stage'])
+    table = stages.pivot_table(index='scenario', columns='name',
+                               values='duration', aggfunc='sum',
+                               sort=False).add_suffix('_s')
+    table['total_s'] = table.sum(axis=1)
+    table['peak_memory_mb'] = stages.groupby('scenario')[
+        'peak_memory_mb'].max()
+    values = pd.DataFrame([e for e in events if e['type'] == 'values'])
+    if not values.empty:
+        table = table.join(values.drop(columns=['type', 'pid']).groupby(
+            'scenario').last())
+    table.index.name = 'scenario'
+    return table
+
+
+def trace_events(events):
+    """Stages in the Chrome trace event format (complete events)."""
+    return [{'name': e['name'], 'cat': 'stage', 'ph': 'X',
+             'ts': e['start'] * 1e6, 'dur': e['duration'] * 1e6,
+             'pid': e['pid'], 'tid': e['pid'],
+             'args': {'scenario': e['scenario']}}
+            for e in events if e['type'] == 'stage']
+
+
+def write_reports(cfg, abs_path):
+    """Write the metrics (and the trace) of the current run."""
+    if not cfg.get('metrics', False) or not os.path.exists(
+            events_file(cfg, abs_path)):
+        return
+    events = read_events(cfg, abs_path)
+    table = metrics_table(events)
+    basename = log_dir(abs_path) + cfg['filename_logfile']
+    table.to_csv(basename + '_metrics.csv')
+    table.reset_index().to_json(basename + '_metrics.json',
+                                orient='records', indent=2)
+    print('Metrics of the stages written to {0}_metrics.csv'.format(basename))
+    if cfg.get('trace', False):
+        with open(basename + '_trace.json', 'w') as f:
+            json.dump({'traceEvents': trace_events(events)}, f)
+
+
+def write_profile_summary(cfg, abs_path):
+    """
+    Write the profile_top functions with the highest own time (tottime) of
+    each stage, summed over all scenarios, to
+    <filename_logfile>_profile_summary.txt and print the total time of each
+    stage. Only the profiles of cProfile are summarised, the html files of
+    pyinstrument are listed.
+    """
+    basename = log_dir(abs_path) + cfg['filename_logfile']
+    if profiler_name(cfg) == 'pyinstrument':
+        file_paths = profile_files(cfg, abs_path)
+        if file_paths:
+            print('\n*** {0} profiled stages written to {1}_*{2} ***'.format(
+                len(file_paths), basename, PROFILE_SUFFIXES['pyinstrument']))
+        return
+
+    stages = {}
+    suffix = PROFILE_SUFFIXES['cprofile']
+    for file_path in sorted(profile_files(cfg, abs_path)):
+        name = os.path.basename(file_path)[
+            len(cfg['filename_logfile']) + 1:-len(suffix)].split('_', 1)[1]
+        stages.setdefault(name, []).append(file_path)
+    if not stages:
+        return
+
+    with open(basename + '_profile_summary.txt', 'w') as f:
+        print('\n*** Profiled stages (total time of all scenarios) ***')
+        for name, file_paths in stages.items():
+            stats = pstats.Stats(*file_paths, stream=f)
+            print('{0}: {1:.2f} s ({2} profiles)'.format(
+                name, stats.total_tt, len(file_paths)))
+            f.write('*** Stage {0}: {1:.2f} s in {2} profiles ***\n'.format(
+                name, stats.total_tt, len(file_paths)))
+            stats.sort_stats('tottime').print_stats(
+                cfg.get('profile_top', 20))
+    print('Hotspots of the stages written to {0}_profile_summary.txt'.format(
+        basename))
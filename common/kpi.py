@@ -0,0 +1,167 @@
+'''
+Key performance indicators (KPI) of the optimised energy system.
+
+All analysed sequences are stacked into one 2-D array (time steps x flows),
+the KPIs of all flows are computed from it at once and returned as a
+structured numpy record, e.g. kpis['boiler_hours']. Records of several
+scenarios can be concatenated with numpy.stack.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import numpy as np
+
+# Analysed sequences: name, (from, to) and variable in the results
+FLOWS = [('chp_heat', ('CHP_01', 'heat'), 'flow'),
+         ('chp_el', ('CHP_01', 'electricity'), 'flow'),
+         ('gas_chp', ('natural_gas', 'CHP_01'), 'flow'),
+         ('boiler', ('boiler', 'heat'), 'flow'),
+         ('p2h', ('P2H', 'heat'), 'flow'),
+         ('residual_load', ('residual_el', 'residual'), 'flow'),
+         ('tes_charge', ('heat', 'storage_th'), 'flow'),
+         ('tes_discharge', ('storage_th', 'heat'), 'flow'),
+         ('tes_soc', ('storage_th', 'None'), 'capacity'),
+         ('ees_charge', ('electricity', 'storage_el'), 'flow'),
+         ('ees_discharge', ('storage_el', 'electricity'), 'flow'),
+         ('ees_soc', ('storage_el', 'None'), 'capacity'),
+         ('shortage_el', ('shortage_bel', 'electricity'), 'flow'),
+         ('shortage_heat', ('shortage_bth', 'heat'), 'flow'),
+         ('excess_el', ('electricity', 'excess_bel'), 'flow'),
+         ('excess_heat', ('heat', 'excess_bth'), 'flow'),
+         ('gas', ('rgas', 'natural_gas'), 'flow'),
+         ('demand_el', ('electricity', 'demand_el'), 'flow'),
+         ('demand_th', ('heat', 'demand_th'), 'flow')]
+
+# Sequences that are the sum of other sequences
+COMBINED = {'chp': ['chp_heat', 'chp_el'],
+            'shortage': ['shortage_heat', 'shortage_el']}
+
+# Efficiencies over the whole period: ratio of the sums of two sequences
+EFFICIENCIES = {'eta_el_sum': ('chp_el_sum', 'gas_chp_sum'),
+                'omega_sum': ('chp_sum', 'gas_chp_sum')}
+
+# A unit is counted as operating in time steps in which its flow exceeds
+# the threshold (in MW). The flows and thresholds of flexCHP are given in
+# its analyse.py.
+OPERATION_THRESHOLDS = {'chp': 0.2, 'boiler': 0.2, 'p2h': 0.1,
+                        'tes_charge': 0.1, 'tes_discharge': 0.1,
+                        'ees_charge': 0.1, 'ees_discharge': 0.1,
+                        'demand_el': 0.1, 'shortage': 0}
+
+
+def stack_sequences(results, flows=FLOWS):
+    """
+    Stack the sequences of the given flows of string keyed results into one
+    array (time steps x flows). Flows that do not exist in the results
+    (e.g. a storage that is not part of the energy system) are filled with
+    zeros. Returns the array, the names of its columns and the time index.
+    """
+    index = next(iter(results.values()))['sequences'].index
+    values = np.zeros((len(index), len(flows)))
+    for i, (name, key, variable) in enumerate(flows):
+        if key in results:
+            values[:, i] = results[key]['sequences'][variable].values
+    return values, [name for name, _, _ in flows], index
+
+
+def compute_kpis(values, names, combined=COMBINED,
+                 thresholds=OPERATION_THRESHOLDS, timeincrement=1):
+    """
+    Compute the KPIs of the stacked sequences (see stack_sequences):
+
+        <name>_sum, <name>_max: sum and maximum of each sequence,
+        <name>_hours: hours of operation (see
+            OPERATION_THRESHOLDS),
+        <name>_full_load_hours: sum divided by the maximum,
+        eta_el_min/max/sum, omega_min/max/sum: electrical and total
+            efficiency of the CHP in time steps with gas consumption and
+            over the whole period (if gas_chp is stacked),
+        stored_el_sum: electricity consumed while the residual load is
+            positive beyond the electricity demand,
+        residual_load_ees_charging_sum: residual load in time steps in which
+            the EES is charged (both if residual_load is stacked),
+        time_steps: number of time steps,
+        period_hours: length of the analysed period in hours.
+
+    The sequences are flows (MW), the sums are energies: they are weighted
+    with the length of the time steps (timeincrement in hours), as are the
+    numbers of hours.
+    """
+    col = {name: i for i, name in enumerate(names)}
+    extra = np.column_stack([values[:, [col[c] for c in columns]].sum(axis=1)
+                             for columns in combined.values()])
+    values = np.hstack([values, extra])
+    names = list(names) + list(combined)
+    col = {name: i for i, name in enumerate(names)}
+
+    sums = values.sum(axis=0) * timeincrement
+    maxima = values.max(axis=0)
+    threshold = np.array([thresholds.get(name, np.inf) for name in names])
+    hours = (values > threshold).sum(axis=0) * timeincrement
+    with np.errstate(divide='ignore', invalid='ignore'):
+        full_load_hours = np.where(maxima > 0, sums / maxima, 0)
+
+    kpis = {}
+    for i, name in enumerate(names):
+        kpis[name + '_sum'] = sums[i]
+        kpis[name + '_max'] = maxima[i]
+        kpis[name + '_full_load_hours'] = full_load_hours[i]
+        if name in thresholds:
+            kpis[name + '_hours'] = hours[i]
+
+    if 'gas_chp' in col:
+        gas_chp = values[:, col['gas_chp']]
+        operating = gas_chp > 0
+        eta_el = values[operating, col['chp_el']] / gas_chp[operating]
+        omega = values[operating, col['chp']] / gas_chp[operating]
+        kpis['eta_el_min'] = eta_el.min() if operating.any() else np.nan
+        kpis['eta_el_max'] = eta_el.max() if operating.any() else np.nan
+        kpis['omega_min'] = omega.min() if operating.any() else np.nan
+        kpis['omega_max'] = omega.max() if operating.any() else np.nan
+        gas_chp_sum = sums[col['gas_chp']]
+        kpis['eta_el_sum'] = (sums[col['chp_el']] / gas_chp_sum
+                              if gas_chp_sum > 0 else np.nan)
+        kpis['omega_sum'] = (sums[col['chp']] / gas_chp_sum
+                             if gas_chp_sum > 0 else np.nan)
+
+    if 'residual_load' in col:
+        residual_load = values[:, col['residual_load']]
+        kpis['stored_el_sum'] = (residual_load - values[:, col['demand_el']])[
+            residual_load > 0].sum() * timeincrement
+        kpis['residual_load_ees_charging_sum'] = residual_load[
+            values[:, col['ees_charge']] > 0.5].sum() * timeincrement
+
+    kpis['time_steps'] = len(values)
+    kpis['period_hours'] = len(values) * timeincrement
+
+    return np.array(tuple(kpis.values()),
+                    dtype=[(name, 'f8') for name in kpis])
+
+
+def merge_kpis(records):
+    """
+    Combine the KPIs of consecutive periods (e.g. the years of a horizon of
+    several years, see results_store.iter_years) into the KPIs of the whole
+    horizon.
+    """
+    records = np.stack(records)
+    kpis = {}
+    for name in records.dtype.names:
+        if name.endswith('_min'):
+            kpis[name] = np.fmin.reduce(records[name])
+        elif name.endswith('_max'):
+            kpis[name] = np.fmax.reduce(records[name])
+        else:
+            kpis[name] = records[name].sum()
+    for name in records.dtype.names:
+        if name.endswith('_full_load_hours'):
+            flow = name[:-len('_full_load_hours')]
+            kpis[name] = (kpis[flow + '_sum'] / kpis[flow + '_max']
+                          if kpis[flow + '_max'] > 0 else 0)
+    for name, (numerator, denominator) in EFFICIENCIES.items():
+        if name in kpis:
+            kpis[name] = (kpis[numerator] / kpis[denominator]
+                          if kpis[denominator] > 0 else np.nan)
+    return np.array(tuple(kpis.values()), dtype=records.dtype)
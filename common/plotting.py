@@ -0,0 +1,122 @@
+'''
+Headless rendering of the plots.
+
+A plot is described by a plot job: the file path of the image, the layout
+of the figure (keyword arguments of matplotlib.pyplot.subplots), the
+matplotlib style and a module-level function that draws the data (its
+keyword arguments) into the figure. The jobs are rendered with the Agg
+backend, in a process pool with plot_workers > 1, and every figure is closed
+as soon as it is saved.
+
+Depending on the setting 'plots' in the config file the jobs are
+
+    immediate:  rendered when they are submitted (default)
+    deferred:   stored in results/plots/jobs/ and rendered at the end of the
+                run (render_deferred), e.g. after all parameter variations
+                of a sweep are solved
+    off:        discarded
+
+matplotlib is imported only when the first job is rendered, so that stages
+without plots do not pay for it.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import glob
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+PLOT_MODES = ['immediate', 'deferred', 'off']
+
+
+def plot_job(function, file_path, layout=None, style='default', dpi=300,
+             **data):
+    """
+    Describe a plot: function(fig, ax, **data) draws the data into the
+    figure created with plt.subplots(**layout), which is saved to file_path.
+    """
+    return {'function': function,
+            'file_path': os.path.abspath(file_path),
+            'layout': layout or {},
+            'style': style,
+            'dpi': dpi,
+            'data': data}
+
+
+def jobs_dir(abs_path):
+    return abs_path + '/results/plots/jobs'
+
+
+def pyplot():
+    """matplotlib.pyplot with the Agg backend."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def render(job):
+    """Render a plot job and close its figure."""
+    plt = pyplot()
+    with plt.style.context(job['style']):
+        fig, ax = plt.subplots(**job['layout'])
+        try:
+            job['function'](fig, ax, **job['data'])
+            fig.savefig(job['file_path'], dpi=job['dpi'])
+        finally:
+            plt.close(fig)
+    return job['file_path']
+
+
+def render_file(job_path):
+    """Render a plot job stored with plots='deferred' and delete it."""
+    with open(job_path, 'rb') as f:
+        job = pickle.load(f)
+    file_path = render(job)
+    os.remove(job_path)
+    return file_path
+
+
+def run_jobs(function, items, workers):
+    if workers > 1 and len(items) > 1:
+        with ProcessPoolExecutor(
+                max_workers=min(workers, len(items))) as executor:
+            return list(executor.map(function, items))
+    return [function(item) for item in items]
+
+
+def submit(cfg, abs_path, jobs):
+    """Render, store or discard the plot jobs depending on cfg['plots']."""
+    mode = cfg.get('plots', 'immediate')
+    if mode not in PLOT_MODES:
+        raise ValueError("Unknown setting plots='{0}', use one of "
+                         "{1}.".format(mode, PLOT_MODES))
+    if mode == 'immediate':
+        run_jobs(render, jobs, cfg.get('plot_workers', 1))
+    if mode == 'deferred':
+        os.makedirs(jobs_dir(abs_path), exist_ok=True)
+        for job in jobs:
+            fd, job_path = tempfile.mkstemp(suffix='.pkl',
+                                            dir=jobs_dir(abs_path))
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(job, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def discard_deferred(abs_path):
+    """Delete plot jobs left over from an interrupted run."""
+    for job_path in glob.glob(os.path.join(jobs_dir(abs_path), '*.pkl')):
+        os.remove(job_path)
+
+
+def render_deferred(cfg, abs_path):
+    """Render all stored plot jobs. Returns the paths of the images."""
+    job_paths = sorted(glob.glob(os.path.join(jobs_dir(abs_path), '*.pkl')),
+                       key=os.path.getmtime)
+    if not job_paths:
+        return []
+    print('Render {0} plots.'.format(len(job_paths)))
+    return run_jobs(render_file, job_paths, cfg.get('plot_workers', 1))
@@ -0,0 +1,184 @@
+'''
+Columnar storage of optimisation results.
+
+The sequences of all flows and components are stored as columns of one
+compressed Parquet file (requires pyarrow), scalars (e.g. installed
+capacities) in a small csv-file next to it. Columns are named
+'<from>|<to>|<variable>' with the labels of the nodes, e.g.
+'CHP_01|heat|flow' or 'storage_th|None|capacity'.
+
+The results read from the store have the format of the results converted by
+outputlib.views.convert_keys_to_strings, i.e.
+results[('CHP_01', 'heat')]['sequences'] is a DataFrame with a column
+'flow' and results[('storage_th', 'None')]['scalars'] a Series.
+
+The sequences are written one year at a time, each year is a row group of
+the Parquet file. Results of horizons of several years can be read year by
+year with iter_years.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import os
+import pandas as pd
+
+from timeseries import year_slices
+
+SEPARATOR = '|'
+INDEX_COLUMN = 'timestamp'
+
+
+def sequences_file(dpath, filename):
+    return os.path.join(dpath, filename + '_sequences.parquet')
+
+
+def scalars_file(dpath, filename):
+    return os.path.join(dpath, filename + '_scalars.csv')
+
+
+def write_results(results, dpath, filename):
+    """
+    Write the results (dict of oemof.outputlib.processing.results, keys
+    can be nodes or labels) to the store.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sequences = {}
+    scalars = []
+    for key, value in results.items():
+        labels = [str(n) for n in key]
+        for variable, column in value['sequences'].items():
+            sequences[SEPARATOR.join(labels + [variable])] = column.values
+        for variable, scalar in value['scalars'].items():
+            scalars.append(labels + [variable, scalar])
+        index = value['sequences'].index
+
+    # Only the sequences of one year are copied into a table at a time
+    writer = None
+    try:
+        for _, steps in year_slices(index):
+            year = pd.DataFrame({name: values[steps]
+                                 for name, values in sequences.items()})
+            year.insert(0, INDEX_COLUMN, index[steps])
+            table = pa.Table.from_pandas(year, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sequences_file(dpath, filename),
+                                          table.schema, compression='zstd')
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    pd.DataFrame(scalars, columns=['from', 'to', 'variable', 'value']).to_csv(
+        scalars_file(dpath, filename), index=False)
+
+
+def select_columns(file_path, flows=None, nodes=None):
+    """
+    Columns of the sequences file of the requested flows and nodes (see
+    read_results), all columns if neither are given.
+    """
+    import pyarrow.parquet as pq
+
+    columns = [c for c in pq.read_schema(file_path).names
+               if c != INDEX_COLUMN]
+    if flows is not None or nodes is not None:
+        flows = [tuple(f) for f in (flows or [])]
+        nodes = nodes or []
+        columns = [c for c in columns
+                   if tuple(c.split(SEPARATOR)[:2]) in flows
+                   or any(n in c.split(SEPARATOR)[:2] for n in nodes)]
+    return columns
+
+
+def read_scalars(dpath, filename):
+    """
+    Read the table of the scalars. The labels are kept as they are, e.g.
+    'None' of a component is not read as missing value.
+    """
+    return pd.read_csv(scalars_file(dpath, filename),
+                       dtype={'from': str, 'to': str, 'variable': str},
+                       keep_default_na=False, na_values={'value': ['']})
+
+
+def to_results(sequences, columns, scalars, all_scalars):
+    """
+    Convert the sequences (DataFrame with the columns of the store) and the
+    scalars (table of the scalars file) to string keyed results. Scalars of
+    flows without sequences are only included with all_scalars=True.
+    """
+    results = {}
+    for column in columns:
+        source, target, variable = column.split(SEPARATOR)
+        entry = results.setdefault(
+            (source, target), {'sequences': pd.DataFrame(
+                index=sequences.index), 'scalars': pd.Series(dtype=float)})
+        entry['sequences'][variable] = sequences[column]
+
+    for row in scalars.itertuples(index=False):
+        key = (row[0], row[1])
+        if key in results or all_scalars:
+            entry = results.setdefault(
+                key, {'sequences': pd.DataFrame(index=sequences.index),
+                      'scalars': pd.Series(dtype=float)})
+            entry['scalars'][row[2]] = row[3]
+
+    return results
+
+
+def read_results(dpath, filename, flows=None, nodes=None):
+    """
+    Read results from the store.
+
+    If neither flows nor nodes are given, all results are read. Otherwise
+    only the columns of the requested flows (list of (from, to) label
+    tuples, e.g. ('storage_th', 'None')) and of all flows connected to the
+    requested nodes (list of labels) are read from the file.
+    """
+    file_path = sequences_file(dpath, filename)
+    columns = select_columns(file_path, flows, nodes)
+    sequences = pd.read_parquet(file_path, columns=[INDEX_COLUMN] + columns)
+    sequences.set_index(INDEX_COLUMN, inplace=True)
+    return to_results(sequences, columns,
+                      read_scalars(dpath, filename),
+                      all_scalars=flows is None and nodes is None)
+
+
+def iter_years(dpath, filename, flows=None, nodes=None):
+    """
+    Read results from the store like read_results, but one row group (one
+    year) at a time. Yields the results of each year, the scalars are
+    included in each of them.
+    """
+    import pyarrow.parquet as pq
+
+    file_path = sequences_file(dpath, filename)
+    columns = select_columns(file_path, flows, nodes)
+    scalars = read_scalars(dpath, filename)
+    parquet_file = pq.ParquetFile(file_path)
+    for i in range(parquet_file.num_row_groups):
+        sequences = parquet_file.read_row_group(
+            i, columns=[INDEX_COLUMN] + columns).to_pandas()
+        sequences.set_index(INDEX_COLUMN, inplace=True)
+        yield to_results(sequences, columns, scalars,
+                         all_scalars=flows is None and nodes is None)
+
+
+def node(results, label):
+    """
+    Return the sequences and scalars of all flows connected to the node with
+    the given label (like outputlib.views.node for string keyed results).
+    Columns and index entries are tuples ((from, to), variable).
+    """
+    filtered = {}
+    scalars = {(k, v): s for k, value in results.items() if label in k
+               for v, s in value['scalars'].items()}
+    if scalars:
+        filtered['scalars'] = pd.Series(scalars).sort_index()
+    sequences = {(k, v): s for k, value in results.items() if label in k
+                 for v, s in value['sequences'].items()}
+    if sequences:
+        filtered['sequences'] = pd.DataFrame(sequences).sort_index(axis=1)
+    return filtered
@@ -0,0 +1,150 @@
+'''
+Time horizon of the model and year-wise handling of the time series.
+
+The horizon is given by the demand time series: all of its time steps are
+optimised unless number_of_time_steps in the config file limits it (3 with
+debug=True). Horizons of several years (e.g. 2011 to 2020, 87672 hourly
+time steps) are possible. If the demand time series has a column
+'timestamp' and start_date is null in the config file, its timestamps are
+used as time index, otherwise the time index starts at start_date.
+
+The demand time series is resampled from its resolution (demand_frequency
+in the config file, hourly by default) to the resolution of the model
+(frequency), e.g. to 15 minutes for 35040 time steps per year. Upsampled
+values are repeated (resample_method='repeat', keeps the energy of each
+time step) or linearly interpolated ('interpolate'), downsampled values are
+averaged.
+
+Long time series are processed one year at a time (see year_slices) where
+the full horizon is not needed at once, e.g. when the results are written
+to and read from the columnar results store.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+TIMESTAMP = 'timestamp'
+
+RESAMPLE_METHODS = ['repeat', 'interpolate']
+
+
+def horizon_steps(cfg):
+    """Number of time steps to optimise, None for the whole time series."""
+    if cfg['debug']:
+        return 3
+    return cfg.get('number_of_time_steps')
+
+
+def step_hours(freq):
+    """Length of a time step of the frequency freq (e.g. 'H') in hours."""
+    return to_offset(freq).nanos / 3.6e12
+
+
+def resampling_ratio(source_freq, target_freq):
+    """
+    Number of target time steps per source time step (e.g. 4 from hourly to
+    15 minutes, 0.25 from 15 minutes to hourly). Raises ValueError if one
+    resolution is not a multiple of the other.
+    """
+    ratio = step_hours(source_freq) / step_hours(target_freq)
+    factor = ratio if ratio >= 1 else 1 / ratio
+    if not np.isclose(factor, round(factor)):
+        raise ValueError("Cannot resample the time series from {0} to {1}."
+                         .format(source_freq, target_freq))
+    return round(factor) if ratio >= 1 else 1 / round(factor)
+
+
+def resample(data, source_freq, target_freq, method='repeat'):
+    """
+    Resample the columns of data (one row per time step of source_freq) to
+    target_freq at once for all columns (see module docstring). Timestamps
+    are continued at the new resolution.
+    """
+    if method not in RESAMPLE_METHODS:
+        raise ValueError("Unknown setting resample_method='{0}', use one of "
+                         "{1}.".format(method, RESAMPLE_METHODS))
+    ratio = resampling_ratio(source_freq, target_freq)
+    if ratio == 1:
+        return data
+    columns = [c for c in data.columns if c != TIMESTAMP]
+    values = data[columns].values.astype(float)
+    if ratio > 1 and method == 'repeat':
+        values = np.repeat(values, ratio, axis=0)
+    elif ratio > 1:
+        positions = np.arange(len(values) * ratio) / ratio
+        values = np.column_stack([
+            np.interp(positions, np.arange(len(values)), values[:, i])
+            for i in range(len(columns))])
+    else:
+        n = round(1 / ratio)
+        values = values[:len(values) // n * n].reshape(
+            -1, n, len(columns)).mean(axis=1)
+    resampled = pd.DataFrame(values, columns=columns)
+    if TIMESTAMP in data:
+        resampled.insert(0, TIMESTAMP, pd.date_range(
+            data[TIMESTAMP].iloc[0], periods=len(resampled),
+            freq=target_freq))
+    return resampled
+
+
+def read_demand(cfg, abs_path, columns=None):
+    """
+    Read the demand time series over the horizon of the model at the
+    resolution of the model. Only the given columns (and the timestamps)
+    are read if columns is given.
+    """
+    file_path = abs_path + cfg['demand_time_series']
+    header = pd.read_csv(file_path, nrows=0).columns
+    has_timestamps = TIMESTAMP in header
+    usecols = None
+    if columns is not None:
+        usecols = list(columns) + ([TIMESTAMP] if has_timestamps else [])
+    source_freq = cfg.get('demand_frequency', 'H')
+    ratio = resampling_ratio(source_freq, cfg['frequency'])
+    steps = horizon_steps(cfg)
+    data = pd.read_csv(
+        file_path, usecols=usecols,
+        nrows=None if steps is None else int(np.ceil(steps / ratio)),
+        parse_dates=[TIMESTAMP] if has_timestamps else False)
+    data = resample(data, source_freq, cfg['frequency'],
+                    cfg.get('resample_method', 'repeat'))
+    if steps is not None:
+        if len(data) < steps:
+            raise ValueError(
+                "The demand time series {0} covers {1} time steps, "
+                "number_of_time_steps is {2}.".format(
+                    cfg['demand_time_series'], len(data), steps))
+        data = data.iloc[:steps]
+    return data
+
+
+def time_index(cfg, data):
+    """Time index of the horizon covered by data (see read_demand)."""
+    if cfg.get('start_date') is None:
+        if TIMESTAMP not in data:
+            raise ValueError(
+                "start_date is null, but the demand time series has no "
+                "column '{0}'.".format(TIMESTAMP))
+        return pd.DatetimeIndex(data[TIMESTAMP], freq='infer', name=None)
+    return pd.date_range(cfg['start_date'], periods=len(data),
+                         freq=cfg['frequency'])
+
+
+def year_slices(index):
+    """
+    Split a time index into years. Returns a list of (year, slice) with the
+    positions of the time steps of each year. An index without dates is
+    returned as one slice (year None).
+    """
+    if not isinstance(index, pd.DatetimeIndex) or len(index) == 0:
+        return [(None, slice(0, len(index)))]
+    years = index.year
+    starts = np.r_[0, np.flatnonzero(np.diff(years)) + 1]
+    ends = np.r_[starts[1:], len(index)]
+    return [(int(years[start]), slice(int(start), int(end)))
+            for start, end in zip(starts, ends)]
@@ -2,17 +2,75 @@
 # imports
 ###############################################################################
 
-import oemof.solph as solph
-import oemof.outputlib as outputlib
-
 import os
 import pandas as pd
 import pprint as pp
-import matplotlib
 import numpy as np
-import matplotlib.pyplot as plt
 import yaml
 
+from results_store import read_results, iter_years, node
+from kpi import FLOWS, stack_sequences, compute_kpis, merge_kpis
+from plotting import plot_job, submit
+from instrumentation import start_stages, stage, staged
+from timeseries import step_hours
+
+# Buses whose flows are all read from the results (balances)
+ANALYSED_BUSES = ['electricity', 'heat']
+
+# Flows (besides those of the buses) read from the results. The flows of
+# the buses and these flows are extracted from the solved model with
+# results_extraction='selected' (see extraction.py).
+ANALYSED_FLOWS = [('storage_th', 'None'), ('storage_el', 'None'),
+                  ('rgas', 'natural_gas'), ('natural_gas', 'CHP_01')]
+
+# Analysed sequences (see kpi.py), there is no residual load bus
+KPI_FLOWS = [flow for flow in FLOWS if flow[0] != 'residual_load']
+
+# A unit is counted as operating in time steps in which its flow exceeds
+# the threshold (in MW)
+OPERATION_THRESHOLDS = {'chp': 0, 'boiler': 0, 'shortage': 0}
+
+# Colors
+BEUTH_RED = (239 / 255, 24 / 255, 30 / 255)
+BEUTH_COL_2 = (57 / 255, 183 / 255, 188 / 255)
+BEUTH_COL_3 = (0 / 255, 152 / 255, 161 / 255)
+
+
+def load_results(cfg, abs_path, scenario_nr, flows=None, nodes=None):
+    """
+    Return the results of a scenario with string keys. From the columnar
+    results store only the given flows and the flows of the given nodes are
+    read (see results_store.py), a dumped energy system is always restored
+    completely.
+    """
+    dpath = abs_path + "/results/optimisation_results/dumps"
+    filename = cfg['filename_dumb'] + '_scenario_{0}'.format(scenario_nr)
+    if cfg.get('results_format', 'oemof') == 'parquet':
+        return read_results(dpath, filename, flows=flows, nodes=nodes)
+
+    # oemof is only needed to restore a dumped energy system
+    import oemof.solph as solph
+    import oemof.outputlib as outputlib
+
+    energysystem = solph.EnergySystem()
+    energysystem.restore(dpath=dpath, filename=filename + '.oemof')
+    return outputlib.views.convert_keys_to_strings(energysystem.results['main'])
+
+
+def iter_results(cfg, abs_path, scenario_nr, flows=None, nodes=None):
+    """
+    Yield the results of a scenario year by year from the columnar results
+    store (see results_store.iter_years), a dumped energy system is yielded
+    at once.
+    """
+    if cfg.get('results_format', 'oemof') == 'parquet':
+        dpath = abs_path + "/results/optimisation_results/dumps"
+        filename = cfg['filename_dumb'] + '_scenario_{0}'.format(scenario_nr)
+        for results in iter_years(dpath, filename, flows=flows, nodes=nodes):
+            yield results
+    else:
+        yield load_results(cfg, abs_path, scenario_nr, flows=flows, nodes=nodes)
+
 
 def analyse_and_print(config_path, scenario_nr):
 
@@ -20,6 +78,7 @@ def analyse_and_print(config_path, scenario_nr):
         cfg = yaml.load(ymlfile)
 
     abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+    start_stages(cfg, abs_path, scenario_nr)
 
     file_path_param_01 = abs_path + cfg['parameters_energy_system'][scenario_nr-1]
     file_path_param_02 = abs_path + cfg['parameters_all_energy_systems']
@@ -28,305 +87,195 @@ def analyse_and_print(config_path, scenario_nr):
     param_df = pd.concat([param_df_01, param_df_02])
     param_value = param_df['value']
 
-    energysystem = solph.EnergySystem()
-    energysystem.restore(dpath=abs_path + "/results/optimisation_results/dumps",
-                         filename=cfg['filename_dumb'] + '_scenario_{0}.oemof'.format(scenario_nr))
-
-    results = energysystem.results['main']
+    # Read only the flows of the buses and the components analysed below, one
+    # year at a time. The bus sums and key performance indicators of the years
+    # are combined.
+    # Flows are in MW, energies are weighted with the length of the time steps
+    timeincrement = step_hours(cfg['frequency'])
+    bus_sums = {bus: 0 for bus in ANALYSED_BUSES}
+    yearly_kpis = []
+    yearly_sequences = []
+    for string_results in staged(iter_results(cfg, abs_path, scenario_nr, flows=ANALYSED_FLOWS,
+                                              nodes=list(bus_sums)), 'load_results'):
+        # Stack the sequences of the analysed flows and compute all key
+        # performance indicators at once
+        with stage('kpis'):
+            for bus in bus_sums:
+                bus_sums[bus] = bus_sums[bus] + node(
+                    string_results, bus)['sequences'].sum(axis=0) * timeincrement
+            values, names, timeindex = stack_sequences(string_results, flows=KPI_FLOWS)
+            yearly_kpis.append(compute_kpis(values, names, thresholds=OPERATION_THRESHOLDS,
+                                            timeincrement=timeincrement))
+            yearly_sequences.append(pd.DataFrame(values, index=timeindex, columns=names))
+    kpis = merge_kpis(yearly_kpis)
 
     print('\n *** Analysis of scenario {} *** '.format(scenario_nr))
 
-    electricity_bus = outputlib.views.node(results, 'electricity')
     print('electricity bus: sums in GWh_el')
-    print(electricity_bus['sequences'].sum(axis=0)/1e3)
+    print(bus_sums['electricity']/1e3)
 
-    heat_bus = outputlib.views.node(results, 'heat')
     print('heat bus: sums in GWh_th')
-    print(heat_bus['sequences'].sum(axis=0)/1e3)
-
-    string_results = outputlib.views.convert_keys_to_strings(energysystem.results['main'])
-
-    # Collecting results for specific components and flows
-    CHP_01_heat = string_results[('CHP_01', 'heat')]['sequences']
-    CHP_01_electricity = string_results[('CHP_01', 'electricity')]['sequences']
-    boiler = string_results[('boiler', 'heat')]['sequences']
-    P2H_th = string_results['P2H', 'heat']['sequences']
-    if param_value['nom_capacity_storage_th'] > 0:
-        TES_discharge = string_results['storage_th', 'heat']['sequences']
-        TES_charge = string_results['heat', 'storage_th']['sequences']
-        TES_soc = string_results['storage_th', 'None']['sequences']  # State of charge in [MWh_th]
-        TES_soc_rel = string_results['storage_th', 'None']['sequences']/\
-                      string_results['storage_th', 'None']['sequences'].max()*100  # State of charge in [%]
-    if param_value['nom_capacity_storage_el'] > 0:
-        battery_discharge = string_results['storage_el', 'electricity']['sequences']
-        battery_charge = string_results['electricity', 'storage_el']['sequences']
-        battery_soc = string_results['storage_el', 'None']['sequences']
-        battery_soc_rel = string_results['storage_el', 'None']['sequences'] / string_results['storage_el', 'None'][
-            'sequences'].max() * 100
-    shortage_electricity = string_results['shortage_bel', 'electricity']['sequences']
-    shortage_heat = string_results['shortage_bth', 'heat']['sequences']
-    excess_electricity = string_results['electricity', 'excess_bel']['sequences']
-    excess_heat = string_results['heat', 'excess_bth']['sequences']
-    gas_consumption = string_results['rgas', 'natural_gas']['sequences']
-    demand_th = string_results['heat', 'demand_th']['sequences']
-    demand_el = string_results['electricity', 'demand_el']['sequences']
-#
+    print(bus_sums['heat']/1e3)
+
     print('-- Consumption, Shortage and Excess Energy --')
-    print("Total shortage electr.: {:.3f}".format(shortage_electricity.flow.sum()/1e3), "GWh_el")
-    print("Total shortage heat:    {:.3f}".format(shortage_heat.flow.sum()/1e3), "GWh_el")
-    print("Total excess electr.:   {:.2f}".format(excess_electricity.flow.sum()/1e3), "GWh_el")
-    print("Total excess heat.:     {:.2f}".format(excess_heat.flow.sum()/1e3), "GWh_el")
-    print("Total gas consumption:  {:.2f}".format(gas_consumption.flow.sum()/1e3), "GWh_th")
-    print("Total el demand:  {:.2f}".format(demand_el.flow.sum()/1e3), "GWh_th")
-    print("Total heat demand:  {:.2f}".format(demand_th.flow.sum()/1e3), "GWh_th")
-
-    gas_consumption_CHP = string_results['natural_gas', 'CHP_01']['sequences']
-    eta_el = string_results[('CHP_01', 'electricity')]['sequences']/gas_consumption_CHP
-    omega_CHP = (string_results[('CHP_01', 'electricity')]['sequences']
-                 + string_results[('CHP_01', 'heat')]['sequences'])/gas_consumption_CHP
-    eta_el_sum = string_results[('CHP_01', 'electricity')]['sequences'].sum()/gas_consumption_CHP.sum()
-    omega_CHP_sum = (string_results[('CHP_01', 'electricity')]['sequences'].flow.sum()
-                  + string_results[('CHP_01', 'heat')]['sequences'].flow.sum())/gas_consumption_CHP.flow.sum()
+    print("Total shortage electr.: {:.3f}".format(kpis['shortage_el_sum']/1e3), "GWh_el")
+    print("Total shortage heat:    {:.3f}".format(kpis['shortage_heat_sum']/1e3), "GWh_el")
+    print("Total excess electr.:   {:.2f}".format(kpis['excess_el_sum']/1e3), "GWh_el")
+    print("Total excess heat.:     {:.2f}".format(kpis['excess_heat_sum']/1e3), "GWh_el")
+    print("Total gas consumption:  {:.2f}".format(kpis['gas_sum']/1e3), "GWh_th")
+    print("Total el demand:  {:.2f}".format(kpis['demand_el_sum']/1e3), "GWh_th")
+    print("Total heat demand:  {:.2f}".format(kpis['demand_th_sum']/1e3), "GWh_th")
 
     print('--- Wirkungsgrad ---')
-    print('Elektr. Nettowirkungsgrad des CHP: eta_min= {:2.4f}, eta_max= {:2.4f}'.format(eta_el.flow.min(), eta_el.flow.max()))
-    print('Gesamtwirkungsgrad des CHP: omega_min= {:2.4f}, omega_max= {:2.4f}'.format(omega_CHP.flow.min(), omega_CHP.flow.max()))
-    print('Jahresnutzungsgrad: {:2.4f}'.format(omega_CHP_sum))
+    print('Elektr. Nettowirkungsgrad des CHP: eta_min= {:2.4f}, eta_max= {:2.4f}'.format(kpis['eta_el_min'], kpis['eta_el_max']))
+    print('Gesamtwirkungsgrad des CHP: omega_min= {:2.4f}, omega_max= {:2.4f}'.format(kpis['omega_min'], kpis['omega_max']))
+    print('Jahresnutzungsgrad: {:2.4f}'.format(kpis['omega_sum']))
     print('-- Anzahl der Stunden im betrachteten Zeitraum --')
-    print(CHP_01_electricity.flow.count(), "h")
+    print('{:g} h'.format(kpis['period_hours']))
     print('-- Stunden mit eingeschränkter Versorgung (Strom) --')
-    aux_shortage_df = shortage_heat.add(shortage_electricity)
-    print('Hours of shortage:', aux_shortage_df[aux_shortage_df > 0].flow.count(), "h")
+    print('Hours of shortage: {:g} h'.format(kpis['shortage_hours']))
     print('-- Betriebsstunden im betrachteten Zeitraum --')
-    aux_chp_01_df = CHP_01_heat.add(CHP_01_electricity)
-    print('CHP_01:', aux_chp_01_df[aux_chp_01_df > 0].flow.count(), "h")
-    print('Boiler:', boiler[boiler > 0].flow.count(), "h")
+    print('CHP_01: {:g} h'.format(kpis['chp_hours']))
+    print('Boiler: {:g} h'.format(kpis['boiler_hours']))
     print('*** End analysis of scenario {} *** '.format(scenario_nr))
 
     # Export time series of results for plotting (make_plots) and external analysis (e.g. in Excel)
+    sequences = pd.concat(yearly_sequences)
     zeitreihen = pd.DataFrame()
-    zeitreihen['Strombedarf'] = demand_el.flow
-    zeitreihen['Waermebedarf'] = demand_th.flow
-    zeitreihen['CHP_01_th'] = CHP_01_heat.flow
-    zeitreihen['CHPs_th'] = CHP_01_heat
-    zeitreihen['CHP_01_el'] = CHP_01_electricity
-    zeitreihen['CHPs_el'] = CHP_01_electricity
-    zeitreihen['Kessel'] = boiler
-    zeitreihen['negative_Residuallast_MW_el'] = P2H_th/param_value['conversion_factor_p2h']
+    zeitreihen['Strombedarf'] = sequences['demand_el']
+    zeitreihen['Waermebedarf'] = sequences['demand_th']
+    zeitreihen['CHP_01_th'] = sequences['chp_heat']
+    zeitreihen['CHPs_th'] = sequences['chp_heat']
+    zeitreihen['CHP_01_el'] = sequences['chp_el']
+    zeitreihen['CHPs_el'] = sequences['chp_el']
+    zeitreihen['Kessel'] = sequences['boiler']
+    zeitreihen['negative_Residuallast_MW_el'] = sequences['p2h']/param_value['conversion_factor_p2h']
     if scenario_nr == 2:
-        zeitreihen['Fuellstand_Waermespeicher_relativ'] = TES_soc_rel
-        zeitreihen['Waermespeicher_beladung'] = TES_charge
-        zeitreihen['Waermespeicher_entladung'] = TES_discharge
+        zeitreihen['Fuellstand_Waermespeicher_relativ'] = sequences['tes_soc']/sequences['tes_soc'].max()*100
+        zeitreihen['Waermespeicher_beladung'] = sequences['tes_charge']
+        zeitreihen['Waermespeicher_entladung'] = sequences['tes_discharge']
     if scenario_nr == 3:
-        zeitreihen['Fuellstand_Batterie_relativ'] = battery_soc_rel
-        zeitreihen['batterie_beladen'] = battery_charge
-        zeitreihen['batterie_entladen'] = battery_discharge
+        zeitreihen['Fuellstand_Batterie_relativ'] = sequences['ees_soc']/sequences['ees_soc'].max()*100
+        zeitreihen['batterie_beladen'] = sequences['ees_charge']
+        zeitreihen['batterie_entladen'] = sequences['ees_discharge']
     zeitreihen.to_csv('../results/data_postprocessed/zeitreihen_A{0}.csv'.format(scenario_nr))
 
 
-def make_plots():
-    # Colors
-    beuth_red = (239 / 255, 24 / 255, 30 / 255)
-    beuth_col_1 = (190 / 255, 226 / 255, 226 / 255)
-    beuth_col_2 = (57 / 255, 183 / 255, 188 / 255)
-    beuth_col_3 = (0 / 255, 152 / 255, 161 / 255)
+def production(zeitreihen):
+    """Thermal and electrical production (including P2H) of a scenario."""
+    produktion_th = zeitreihen['CHPs_th'].add(zeitreihen['Kessel']).add(
+        zeitreihen['negative_Residuallast_MW_el'] * 0.99)
+    produktion_el = zeitreihen['CHPs_el'].add(-1 * zeitreihen['negative_Residuallast_MW_el'])
+    return produktion_th, produktion_el
+
+
+def plot_chp_operation(fig, ax, scenarios):
+    """Operation of the CHP in each scenario (zeitreihen, label) side by side."""
+    for i, (zeitreihen, label) in enumerate(scenarios):
+        ax[i].scatter(x=zeitreihen['CHPs_th'],
+                      y=zeitreihen['CHPs_el'],
+                      marker='.',
+                      c=[BEUTH_COL_3],
+                      zorder=10,
+                      label=label)
+        ax[i].grid(color='grey',  # beuth_col_2,
+                   linestyle='-',
+                   linewidth=0.5,
+                   zorder=1)
+        ax[i].tick_params(axis='both', which='major', labelsize=16)
+    ax[0].set_ylim([-20, 1020])
+    ax[0].set_ylabel('Elektrische Leistung in $\mathrm{MW_{el}}$', fontsize=20)
+    ax[1].set_xlabel('Wärmeleistung in $\mathrm{MW_{th}}$', fontsize=20)
+
+
+def plot_storage_influence(fig, ax, reference, storage, active, marker, label):
+    """
+    Production without storage (reference) and with storage in the hours
+    (index labels) in which the storage is active.
+    """
+    produktion_th_a1, produktion_el_a1 = reference
+    produktion_th, produktion_el = storage
+    ax.scatter(x=produktion_th_a1,
+               y=produktion_el_a1,
+               marker='o',
+               c=[BEUTH_COL_2],
+               zorder=1,
+               label=None,
+               alpha=1)
+    ax.grid(color='grey',
+            linestyle='-',
+            linewidth=0.5,
+            zorder=2)
+    ax.scatter(x=produktion_th_a1.loc[active],
+               y=produktion_el_a1.loc[active],
+               marker=marker,
+               s=20,
+               c=[BEUTH_COL_3],
+               zorder=10,
+               alpha=1,
+               label='ohne Speicher')
+    ax.scatter(x=produktion_th.loc[active],
+               y=produktion_el.loc[active],
+               marker=marker,
+               s=20,
+               c=[BEUTH_RED],
+               zorder=10,
+               alpha=1,
+               label=label)
+    ax.set_ylim([-250, 1050])
+    ax.legend(loc=4, fontsize=12)
+    ax.set_ylabel('Elektrische Leistung in $\mathrm{MW_{el}}$', fontsize=12)
+    ax.set_xlabel('Wärmeleistung in $\mathrm{MW_{th}}$', fontsize=12)
+
+
+def make_plots(config_path):
+
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+    start_stages(cfg, abs_path)
 
     zeitreihen_a1 = pd.read_csv('../results/data_postprocessed/zeitreihen_A1.csv')
     zeitreihen_a2 = pd.read_csv('../results/data_postprocessed/zeitreihen_A2.csv')
     zeitreihen_a3 = pd.read_csv('../results/data_postprocessed/zeitreihen_A3.csv')
+    produktion_a1 = production(zeitreihen_a1)
+    produktion_a2 = production(zeitreihen_a2)
+    produktion_a3 = production(zeitreihen_a3)
 
-    # Comparision of CHP operation in all three scenarios
-    fig3, ax3 = plt.subplots(1, 3, sharey=True, figsize=(12, 6))
-    ax3[0].scatter(x=zeitreihen_a1['CHPs_th'],
-                   y=zeitreihen_a1['CHPs_el'],
-                   marker='.',
-                   c=[beuth_col_3],
-                   zorder=10,
-                   label='ohne Speicher')
-    ax3[0].grid(color='grey',  # beuth_col_2,
-                linestyle='-',
-                linewidth=0.5,
-                zorder=1)
-    ax3[1].scatter(x=zeitreihen_a2['CHPs_th'],
-                   y=zeitreihen_a2['CHPs_el'],
-                   marker='.',
-                   c=[beuth_col_3],
-                   zorder=10,
-                   label='mit Wärmespeicher')
-    ax3[1].grid(color='grey',  # beuth_col_2,
-                linestyle='-',
-                linewidth=0.5,
-                zorder=1)
-    ax3[2].scatter(x=zeitreihen_a3['CHPs_th'],
-                   y=zeitreihen_a3['CHPs_el'],
-                   marker='.',
-                   c=[beuth_col_3],
-                   zorder=10,
-                   label='mit Stromspeicher')
-    ax3[2].grid(color='grey',  # beuth_col_2,
-                linestyle='-',
-                linewidth=0.5,
-                zorder=1)
-    ax3[0].set_ylim([-20, 1020])
-    ax3[0].tick_params(axis='both', which='major', labelsize=16)
-    ax3[1].tick_params(axis='both', which='major', labelsize=16)
-    ax3[2].tick_params(axis='both', which='major', labelsize=16)
-    ax3[0].set_ylabel('Elektrische Leistung in $\mathrm{MW_{el}}$', fontsize=20)
-    ax3[1].set_xlabel('Wärmeleistung in $\mathrm{MW_{th}}$', fontsize=20)
-    plt.savefig('../results/plots/scatter_plot_all3scenarios.png', dpi=300)
-
-    # Influence of Thermal Energy Storage (TES) charging
-    fig4, ax4 = plt.subplots()
-    produktion_el_a1 = zeitreihen_a1['CHPs_el'].add(-1 * zeitreihen_a1['negative_Residuallast_MW_el'])
-    produktion_th_a1 = zeitreihen_a1['CHPs_th'].add(zeitreihen_a1['Kessel']).add(
-        zeitreihen_a1['negative_Residuallast_MW_el'] * 0.99)
-    produktion_el_a2 = zeitreihen_a2['CHPs_el'].add(-1 * zeitreihen_a2['negative_Residuallast_MW_el'])
-    produktion_th_a2 = zeitreihen_a2['CHPs_th'].add(zeitreihen_a2['Kessel']).add(
-        zeitreihen_a2['negative_Residuallast_MW_el'] * 0.99)
-    ax4.scatter(x=produktion_th_a1,
-                y=produktion_el_a1,
-                marker='o',
-                c=[beuth_col_2],
-                zorder=1,
-                label=None,
-                alpha=1)
-    ax4.grid(color='grey',
-             linestyle='-',
-             linewidth=0.5,
-             zorder=2)
-    ax4.scatter(x=produktion_th_a1[zeitreihen_a2['Waermespeicher_beladung'] > 0][:-10],
-                y=produktion_el_a1[zeitreihen_a2['Waermespeicher_beladung'] > 0][:-10],
-                marker='|',
-                s=20,
-                c=[beuth_col_3],
-                zorder=10,
-                alpha=1,
-                label='ohne Speicher')
-    ax4.scatter(x=produktion_th_a2[zeitreihen_a2['Waermespeicher_beladung'] > 0][:-10],
-                y=produktion_el_a2[zeitreihen_a2['Waermespeicher_beladung'] > 0][:-10],
-                marker='|',
-                s=20,
-                c=[beuth_red],
-                zorder=10,
-                alpha=1,
-                label='mit Wärmespeicher (beladen)')
-    ax4.set_ylim([-250, 1050])
-    ax4.legend(loc=4, fontsize=12)
-    ax4.set_ylabel('Elektrische Leistung in $\mathrm{MW_{el}}$', fontsize=12)
-    ax4.set_xlabel('Wärmeleistung in $\mathrm{MW_{th}}$', fontsize=12)
-    plt.savefig('../results/plots/scatter_plot_TES_charge_influence.png', dpi=300)
-
-    # Influence of Thermal Energy Storage (TES) discharging
-    fig5, ax5 = plt.subplots()
-    produktion_el_a1 = zeitreihen_a1['CHPs_el'].add(-1 * zeitreihen_a1['negative_Residuallast_MW_el'])
-    produktion_th_a1 = zeitreihen_a1['CHPs_th'].add(zeitreihen_a1['Kessel']).add(
-        zeitreihen_a1['negative_Residuallast_MW_el'] * 0.99)
-    produktion_el_a2 = zeitreihen_a2['CHPs_el'].add(-1 * zeitreihen_a2['negative_Residuallast_MW_el'])
-    produktion_th_a2 = zeitreihen_a2['CHPs_th'].add(zeitreihen_a2['Kessel']).add(
-        zeitreihen_a2['negative_Residuallast_MW_el'] * 0.99)
-    ax5.scatter(x=produktion_th_a1,
-                y=produktion_el_a1,
-                marker='o',
-                c=[beuth_col_2],
-                zorder=1,
-                label=None,
-                alpha=1)
-    ax5.grid(color='grey',
-             linestyle='-',
-             linewidth=0.5,
-             zorder=2)
-    ax5.scatter(x=produktion_th_a1[zeitreihen_a2['Waermespeicher_entladung'] > 0][10:],
-                y=produktion_el_a1[zeitreihen_a2['Waermespeicher_entladung'] > 0][10:],
-                marker='|',
-                s=20,
-                c=[beuth_col_3],
-                zorder=10,
-                alpha=1,
-                label='ohne Speicher')
-    ax5.scatter(x=produktion_th_a2[zeitreihen_a2['Waermespeicher_entladung'] > 0][10:],
-                y=produktion_el_a2[zeitreihen_a2['Waermespeicher_entladung'] > 0][10:],
-                marker='|',
-                s=20,
-                c=[beuth_red],
-                zorder=10,
-                alpha=1,
-                label='mit Wärmespeicher (entladen)')
-    ax5.set_ylim([-250, 1050])
-    ax5.legend(loc=4, fontsize=12)
-    ax5.set_ylabel('Elektrische Leistung in $\mathrm{MW_{el}}$', fontsize=12)
-    ax5.set_xlabel('Wärmeleistung in $\mathrm{MW_{th}}$', fontsize=12)
-    plt.savefig('../results/plots/scatter_plot_TES_discharge_influence.png', dpi=300)
-
-    # Influence of Electrical Energy Storage (EES) charging
-    fig6, ax6 = plt.subplots()
-    produktion_el_a3 = zeitreihen_a3['CHPs_el'].add(-1 * zeitreihen_a3['negative_Residuallast_MW_el'])
-    produktion_th_a3 = zeitreihen_a3['CHPs_th'].add(zeitreihen_a3['Kessel']).add(
-        zeitreihen_a3['negative_Residuallast_MW_el'] * 0.99)
-    ax6.scatter(x=produktion_th_a1,
-                y=produktion_el_a1,
-                marker='o',
-                c=[beuth_col_2],
-                zorder=1,
-                label=None,
-                alpha=1)
-    ax6.grid(color='grey',
-             linestyle='-',
-             linewidth=0.5,
-             zorder=2)
-    ax6.scatter(x=produktion_th_a1[zeitreihen_a3['batterie_beladen'] > 0][:-10],
-                y=produktion_el_a1[zeitreihen_a3['batterie_beladen'] > 0][:-10],
-                marker='_',
-                s=20,
-                c=[beuth_col_3],
-                zorder=10,
-                alpha=1,
-                label='ohne Speicher')
-    ax6.scatter(x=produktion_th_a3[zeitreihen_a3['batterie_beladen'] > 0][:-10],
-                y=produktion_el_a3[zeitreihen_a3['batterie_beladen'] > 0][:-10],
-                marker='_',
-                s=20,
-                c=[beuth_red],
-                zorder=10,
-                alpha=1,
-                label='mit Stromspeicher')
-    ax6.set_ylim([-250, 1050])
-    ax6.legend(loc=4, fontsize=12)
-    ax6.set_ylabel('Elektrische Leistung in $\mathrm{MW_{el}}$', fontsize=12)
-    ax6.set_xlabel('Wärmeleistung in $\mathrm{MW_{th}}$', fontsize=12)
-    plt.savefig('../results/plots/scatter_plot_EES_charge_influence.png', dpi=300)
-
-    # Influence of Electrical Energy Storage (EES) discharging
-    fig7, ax7 = plt.subplots()
-    ax7.scatter(x=produktion_th_a1,
-                y=produktion_el_a1,
-                marker='o',
-                c=[beuth_col_2],
-                zorder=1,
-                label=None,
-                alpha=1)
-    ax7.grid(color='grey',
-             linestyle='-',
-             linewidth=0.5,
-             zorder=2)
-    ax7.scatter(x=produktion_th_a1[zeitreihen_a3['batterie_entladen'] > 0][10:],
-                y=produktion_el_a1[zeitreihen_a3['batterie_entladen'] > 0][10:],
-                marker='_',
-                s=20,
-                c=[beuth_col_3],
-                zorder=10,
-                alpha=1,
-                label='ohne Speicher')
-    ax7.scatter(x=produktion_th_a3[zeitreihen_a3['batterie_entladen'] > 0][10:],
-                y=produktion_el_a3[zeitreihen_a3['batterie_entladen'] > 0][10:],
-                marker='_',
-                s=20,
-                c=[beuth_red],
-                zorder=10,
-                alpha=1,
-                label='mit Stromspeicher')
-    ax7.set_ylim([-250, 1050])
-    ax7.legend(loc=4, fontsize=12)
-    ax7.set_ylabel('Elektrische Leistung in $\mathrm{MW_{el}}$', fontsize=12)
-    ax7.set_xlabel('Wärmeleistung in $\mathrm{MW_{th}}$', fontsize=12)
-    plt.savefig('../results/plots/scatter_plot_EES_discharge_influence.png', dpi=300)
+    # Hours in which the storages are charged or discharged (the first and
+    # last ten hours are not shown)
+    tes_charge = (zeitreihen_a2['Waermespeicher_beladung'] > 0)
+    tes_discharge = (zeitreihen_a2['Waermespeicher_entladung'] > 0)
+    ees_charge = (zeitreihen_a3['batterie_beladen'] > 0)
+    ees_discharge = (zeitreihen_a3['batterie_entladen'] > 0)
 
+    jobs = [
+        # Comparision of CHP operation in all three scenarios
+        plot_job(plot_chp_operation, '../results/plots/scatter_plot_all3scenarios.png',
+                 layout={'nrows': 1, 'ncols': 3, 'sharey': True, 'figsize': (12, 6)},
+                 scenarios=[(zeitreihen_a1[['CHPs_th', 'CHPs_el']], 'ohne Speicher'),
+                            (zeitreihen_a2[['CHPs_th', 'CHPs_el']], 'mit Wärmespeicher'),
+                            (zeitreihen_a3[['CHPs_th', 'CHPs_el']], 'mit Stromspeicher')]),
+        # Influence of Thermal Energy Storage (TES) charging
+        plot_job(plot_storage_influence, '../results/plots/scatter_plot_TES_charge_influence.png',
+                 reference=produktion_a1, storage=produktion_a2,
+                 active=tes_charge[tes_charge].index[:-10], marker='|',
+                 label='mit Wärmespeicher (beladen)'),
+        # Influence of Thermal Energy Storage (TES) discharging
+        plot_job(plot_storage_influence, '../results/plots/scatter_plot_TES_discharge_influence.png',
+                 reference=produktion_a1, storage=produktion_a2,
+                 active=tes_discharge[tes_discharge].index[10:], marker='|',
+                 label='mit Wärmespeicher (entladen)'),
+        # Influence of Electrical Energy Storage (EES) charging
+        plot_job(plot_storage_influence, '../results/plots/scatter_plot_EES_charge_influence.png',
+                 reference=produktion_a1, storage=produktion_a3,
+                 active=ees_charge[ees_charge].index[:-10], marker='_',
+                 label='mit Stromspeicher'),
+        # Influence of Electrical Energy Storage (EES) discharging
+        plot_job(plot_storage_influence, '../results/plots/scatter_plot_EES_discharge_influence.png',
+                 reference=produktion_a1, storage=produktion_a3,
+                 active=ees_discharge[ees_discharge].index[10:], marker='_',
+                 label='mit Stromspeicher')]
+    with stage('plots'):
+        submit(cfg, abs_path, jobs)
@@ -1,42 +1,123 @@
-
 """
 
 Date: 6th of February 2019
 Author: Jakob Wolf (jakob.wolf@beuth-hochschule.de)
 
+Usage (from the src directory):
+
+    python main.py              all stages selected in the config file
+    python main.py solve        solve the scenarios
+    python main.py analyse      analyse the solved scenarios
+    python main.py plot         plot the comparison of the scenarios
+
+The config file is experiment_config/experiment_1.yml unless given with
+--config. solve and analyse take the scenarios with --scenarios (default:
+scenario_number with run_single_scenario=True, otherwise 1, 2 and 3).
+oemof and pyomo are only imported to solve the model, matplotlib only to
+render plots.
+
 """
 
 
 import os
-from model_flex_chp import run_model_flexchp
-from analyse import analyse_and_print
-from analyse import make_plots
+import sys
+# Modules shared by the models (instrumentation, results store, KPIs, ...)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'common')))
+from instrumentation import (reset, write_reports, force_profile,
+                             write_profile_summary)
+import argparse
 import yaml
 
-def main():
+SCENARIOS = [1, 2, 3]
 
-    # Configuration file to run model with
-    exp_cfg_file_name = 'experiment_1.yml'
-    config_file_path = os.path.abspath('../experiment_config/' + exp_cfg_file_name)
-    with open(config_file_path, 'r') as ymlfile:
-        cfg = yaml.load(ymlfile)
 
+def solve(config_file_path, scenarios):
+    from model_flex_chp import run_model_flexchp
+    for scenario in scenarios:
+        if len(scenarios) > 1:
+            print('\n*** Scenario {0}***'.format(scenario))
+        run_model_flexchp(config_path=config_file_path, scenario_nr=scenario)
+
+
+def analyse(config_file_path, scenarios):
+    from analyse import analyse_and_print
+    for scenario in scenarios:
+        analyse_and_print(config_path=config_file_path, scenario_nr=scenario)
+        if len(scenarios) > 1:
+            print('')
+
+
+def plot(config_file_path):
+    from analyse import make_plots
+    make_plots(config_path=config_file_path)
+
+
+def selected_scenarios(cfg, scenarios=None):
+    if scenarios:
+        return scenarios
+    if cfg['run_single_scenario']:
+        return [cfg['scenario_number']]
+    return SCENARIOS
+
+
+def run_all(config_file_path, cfg):
+    """Run the stages selected in the config file."""
     run_single_scenario = cfg['run_single_scenario']
     if run_single_scenario:
         if cfg['run_model']:
-            run_model_flexchp(config_path=config_file_path, scenario_nr=cfg['scenario_number'])
+            solve(config_file_path, [cfg['scenario_number']])
         if cfg['run_postprocessing']:
-            analyse_and_print(config_path=config_file_path, scenario_nr=cfg['scenario_number'])
+            analyse(config_file_path, [cfg['scenario_number']])
     else:
-        scenarios = [1, 2, 3]
-        for scenario in scenarios:
+        for scenario in SCENARIOS:
             if cfg['run_model']:
                 print('\n*** Scenario {0}***'.format(scenario))
-                run_model_flexchp(config_path=config_file_path, scenario_nr=scenario)
+                solve(config_file_path, [scenario])
             if cfg['run_postprocessing']:
-                analyse_and_print(config_path=config_file_path, scenario_nr=scenario)
+                analyse(config_file_path, [scenario])
                 print('')
         if cfg['make_plots']:
-                make_plots()
+            plot(config_file_path)
+
+
+def main(argv=None):
+
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+
+    parser = argparse.ArgumentParser(description='Dispatch optimisation of a flexible CHP plant.')
+    parser.add_argument('--config', default=abs_path + '/experiment_config/experiment_1.yml',
+                        help='config file of the experiment')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile each stage with cProfile')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    for name, text in [('solve', 'solve the scenarios'),
+                       ('analyse', 'analyse the solved scenarios')]:
+        commands.add_parser(name, help=text).add_argument(
+            '--scenarios', nargs='+', type=int, help='numbers of the scenarios')
+    commands.add_parser('plot', help='plot the comparison of the scenarios')
+    args = parser.parse_args(argv)
+
+    # Configuration file to run model with
+    config_file_path = os.path.abspath(args.config)
+    with open(config_file_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    reset(cfg, abs_path)
+    if args.profile:
+        force_profile()
+
+    if args.command is None:
+        run_all(config_file_path, cfg)
+    elif args.command == 'solve':
+        solve(config_file_path, selected_scenarios(cfg, args.scenarios))
+    elif args.command == 'analyse':
+        analyse(config_file_path, selected_scenarios(cfg, args.scenarios))
+    elif args.command == 'plot':
+        plot(config_file_path)
+
+    write_reports(cfg, abs_path)
+    write_profile_summary(cfg, abs_path)
+
 
-main()
+if __name__ == '__main__':
+    main()
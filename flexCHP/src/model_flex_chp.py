@@ -66,59 +66,65 @@ from oemof.tools import logger
 from oemof.tools import helpers
 
 import oemof.solph as solph
+from oemof.solph.plumbing import sequence
 import oemof.outputlib as outputlib
-import oemof.graph as grph
-import networkx as nx
+from pyomo.opt import SolverFactory
+
+from results_store import write_results
+from extraction import extraction_mode, extract_results
+from analyse import ANALYSED_FLOWS, ANALYSED_BUSES
+from timeseries import read_demand, time_index, step_hours
+from instrumentation import start_stages, stage, record_model_size
 
 import logging
 import os
+import resource
+import time
+import numpy as np
 import pandas as pd
 import yaml  # pip install pyyaml
 import pprint as pp
 
 
-def run_model_flexchp(config_path, scenario_nr):
+def broadcast(value, periods=None):
+    """
+    Return a time dependent parameter as sequence over the time index.
 
-    with open(config_path, 'r') as ymlfile:
-        cfg = yaml.load(ymlfile)
+    Scalars are wrapped in oemof's sequence, which returns the scalar for
+    every time step without materialising a list. Array-likes (one value per
+    time step) are converted to numpy arrays. With periods, scalars are
+    repeated to an array of this length, for parameters whose length is read
+    (GenericCHP derives one pair of coefficients alpha per entry of the
+    electrical power and efficiency limits).
+    """
+    if np.isscalar(value):
+        if periods is not None:
+            return np.full(periods, value, dtype=float)
+        return sequence(value)
+    return np.asarray(value, dtype=float)
 
-    if cfg['debug']:
-        number_of_time_steps = 3
-    else:
-        number_of_time_steps = 8760
 
-    solver = cfg['solver']
-    debug = cfg['debug']
-    periods = number_of_time_steps
-    solver_verbose = cfg['solver_verbose']
+def loss_per_step(loss_per_hour, hours):
+    """Relative storage loss of a time step of the given length in hours."""
+    return 1 - (1 - loss_per_hour) ** hours
 
-    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
 
-    logger.define_logging(logpath=abs_path+'/results/optimisation_results/log/',
-                          logfile=cfg['filename_logfile']+'_scenario_{0}.log'.format(scenario_nr),
-                          screen_level=logging.INFO,
-                          file_level=logging.DEBUG)
+def create_energysystem(cfg, param_value, data, date_time_index,
+                        storage_levels=None):
+    """
+    Create the energy system with all its components.
 
-    logging.info('Use parameters for scenario {0}'.format(scenario_nr))
-    logging.info('Initialize the energy system')
-    date_time_index = pd.date_range(cfg['start_date'], periods=number_of_time_steps,
-                                    freq=cfg['frequency'])
+    storage_levels optionally overrides the initial (relative) capacity of
+    the storages, keyed by their labels. oemof weights flows and costs with
+    the length of the time steps, the storage losses (given per hour) are
+    converted to the length of the time steps here.
+    """
+    if storage_levels is None:
+        storage_levels = {}
 
     energysystem = solph.EnergySystem(timeindex=date_time_index)
-
-    ##########################################################################
-    # Read time series and parameter values from data files
-    ##########################################################################
-
-    file_path_demand_ts = abs_path + cfg['demand_time_series']
-    data = pd.read_csv(file_path_demand_ts)
-
-    file_path_param_01 = abs_path + cfg['parameters_energy_system'][scenario_nr-1]
-    file_path_param_02 = abs_path + cfg['parameters_all_energy_systems']
-    param_df_01 = pd.read_csv(file_path_param_01, index_col=1)
-    param_df_02 = pd.read_csv(file_path_param_02, index_col=1)
-    param_df = pd.concat([param_df_01, param_df_02], sort=True)
-    param_value = param_df['value']
+    hours = step_hours(date_time_index.freq)
+    periods = len(date_time_index)
 
     ##########################################################################
     # Create oemof object
@@ -152,32 +158,37 @@ def run_model_flexchp(config_path, scenario_nr):
                                   variable_costs=param_value['var_costs_gas'])}))
     energysystem.add(solph.Source(
         label='P2H',
-        outputs={bth: solph.Flow(actual_value=data['neg_residual_el'],
+        outputs={bth: solph.Flow(actual_value=broadcast(data['neg_residual_el']),
                                  nominal_value=param_value['nom_val_neg_residual']*param_value['conversion_factor_p2h'],
                                  fixed=True)}))
     energysystem.add(solph.Sink(
         label='demand_el',
-        inputs={bel: solph.Flow(actual_value=data['demand_el'],
+        inputs={bel: solph.Flow(actual_value=broadcast(data['demand_el']),
                                 nominal_value=param_value['nom_val_demand_el'],
                                 fixed=True)}))
     energysystem.add(solph.Sink(
         label='demand_th',
-        inputs={bth: solph.Flow(actual_value=data['demand_th'],
+        inputs={bth: solph.Flow(actual_value=broadcast(data['demand_th']),
                                 nominal_value=param_value['nom_val_demand_th'],
                                 fixed=True)}))
 
+    # The CHP parameters are constant over time, they are broadcast lazily
+    # over the time index instead of creating one list entry per period. The
+    # limits GenericCHP derives its coefficients alpha from are arrays (see
+    # broadcast). Build time and memory of the model are measured by
+    # benchmarks/run_benchmarks.py (columns build_s and build_memory_mb).
     energysystem.add(solph.components.GenericCHP(
         label='CHP_01',
         fuel_input={bgas: solph.Flow(
-            H_L_FG_share_max=[param_value['H_L_FG_share_max'] for p in range(0, periods)])},
+            H_L_FG_share_max=broadcast(param_value['H_L_FG_share_max']))},
         electrical_output={bel: solph.Flow(
-            P_max_woDH=[param_value['P_max_woDH'] for p in range(0, periods)],
-            P_min_woDH=[param_value['P_min_woDH'] for p in range(0, periods)],
-            Eta_el_max_woDH=[param_value['Eta_el_max_woDH'] for p in range(0, periods)],
-            Eta_el_min_woDH=[param_value['Eta_el_min_woDH'] for p in range(0, periods)])},
+            P_max_woDH=broadcast(param_value['P_max_woDH'], periods),
+            P_min_woDH=broadcast(param_value['P_min_woDH'], periods),
+            Eta_el_max_woDH=broadcast(param_value['Eta_el_max_woDH'], periods),
+            Eta_el_min_woDH=broadcast(param_value['Eta_el_min_woDH'], periods))},
         heat_output={bth: solph.Flow(
-            Q_CW_min=[param_value['Q_CW_min_chp'] for p in range(0, periods)])},
-        Beta=[param_value['Beta_chp'] for p in range(0, periods)],
+            Q_CW_min=broadcast(param_value['Q_CW_min_chp']))},
+        Beta=broadcast(param_value['Beta_chp']),
         back_pressure=False))
 
     energysystem.add(solph.Transformer(
@@ -195,8 +206,9 @@ def run_model_flexchp(config_path, scenario_nr):
                                     variable_costs=param_value['var_costs_input_bth_storage_th'])},
             outputs={bth: solph.Flow(nominal_value=param_value['nom_val_output_bth_storage_th'],
                                      variable_costs=param_value['var_costs_output_bth_storage_th'])},
-            capacity_loss=param_value['capacity_loss_storage_th'],
-            initial_capacity=param_value['init_capacity_storage_th'],
+            capacity_loss=loss_per_step(param_value['capacity_loss_storage_th'], hours),
+            initial_capacity=storage_levels.get(
+                'storage_th', param_value['init_capacity_storage_th']),
             inflow_conversion_factor=param_value['inflow_conv_factor_storage_th'],
             outflow_conversion_factor=param_value['outflow_conv_factor_storage_th'])
         energysystem.add(storage_th)
@@ -209,37 +221,270 @@ def run_model_flexchp(config_path, scenario_nr):
                                     variable_costs=param_value['var_costs_input_bel_storage_el'])},
             outputs={bel: solph.Flow(nominal_value=param_value['nom_val_output_bel_storage_el'],
                                      variable_costs=param_value['var_costs_output_bel_storage_el'])},
-            capacity_loss=param_value['capacity_loss_storage_el'],
-            initial_capacity=param_value['init_capacity_storage_el'],
+            capacity_loss=loss_per_step(param_value['capacity_loss_storage_el'], hours),
+            initial_capacity=storage_levels.get(
+                'storage_el', param_value['init_capacity_storage_el']),
             inflow_conversion_factor=param_value['inflow_conv_factor_storage_el'],
             outflow_conversion_factor=param_value['outflow_conv_factor_storage_el'])
         energysystem.add(storage_el)
 
-    ##########################################################################
-    # Optimise the energy system and plot the results
-    ##########################################################################
+    return energysystem
+
+
+def solve_model(model, cfg):
+    """Solve the model and store the solver results in the energy system."""
+    with stage('solve'):
+        if cfg.get('solver_interface', 'lp') == 'direct':
+            # Solve with HiGHS in memory, no lp- and solution-files are written
+            opt = SolverFactory('appsi_highs')
+            model.es.results = opt.solve(model, tee=cfg['solver_verbose'])
+        else:
+            model.solve(solver=cfg['solver'],
+                        solve_kwargs={'tee': cfg['solver_verbose']})
+
+
+def process_results(model, cfg):
+    """
+    Results of the solved model: the flows and components read by the analysis or, with
+    results_extraction='full', all (see extraction.py).
+    """
+    if extraction_mode(cfg) == 'full':
+        return outputlib.processing.results(model)
+    return extract_results(model, flows=ANALYSED_FLOWS, nodes=ANALYSED_BUSES)
+
+
+def variable_costs(model, timesteps):
+    """
+    Variable costs of the flows in the given time steps of the solved model,
+    i.e. its objective restricted to these time steps (the model has no
+    other costs).
+    """
+    costs = 0
+    for i, o in model.FLOWS:
+        if model.flows[i, o].variable_costs[0] is not None:
+            costs += sum(model.flow[i, o, t].value * model.objective_weighting[t] *
+                         model.flows[i, o].variable_costs[t] for t in timesteps)
+    return costs
+
+
+# Solver status of pyomo from the best to the worst, a rolling horizon
+# reports the worst status of its windows
+SOLVER_STATUS = ['ok', 'warning', 'aborted', 'unknown', 'error']
+
+# Times of the solver and sizes of the problem summed up over the windows
+# of a rolling horizon
+SOLVER_TIMES = ['Time', 'User time', 'System time', 'Wallclock time']
+PROBLEM_SIZES = ['Number of constraints', 'Number of variables',
+                 'Number of binary variables', 'Number of integer variables',
+                 'Number of continuous variables', 'Number of nonzeros']
+
+
+def merge_meta_results(window_meta, objective):
+    """
+    Meta results of a rolling horizon in the structure of
+    outputlib.processing.meta_results from those of its windows.
+
+    The solver entries (status, termination condition, message) are those of
+    the window with the worst status, the solver times are summed up. The
+    sizes of the problems (number of variables, constraints, ...) are summed
+    up, their bounds are left out as they refer to the objective of a single
+    window including its overlap. objective are the costs of the kept parts.
+    """
+    def severity(meta):
+        status = str(meta['solver'].get('Status'))
+        return (SOLVER_STATUS.index(status) if status in SOLVER_STATUS
+                else len(SOLVER_STATUS))
+
+    def summed(values):
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool)
+               for v in values):
+            return sum(values)
+        return values[0]
+
+    solver = dict(max(window_meta, key=severity)['solver'])
+    for key in SOLVER_TIMES:
+        if all(key in meta['solver'] for meta in window_meta):
+            solver[key] = summed([meta['solver'][key] for meta in window_meta])
+
+    problem = {}
+    for key, value in window_meta[0]['problem'].items():
+        if key in ['Lower bound', 'Upper bound']:
+            continue
+        if key in PROBLEM_SIZES and all(key in meta['problem'] for meta in window_meta):
+            value = summed([meta['problem'][key] for meta in window_meta])
+        problem[key] = value
+
+    return {'objective': objective, 'problem': problem, 'solver': solver,
+            'rolling_horizon_windows': len(window_meta)}
+
+
+def solve_rolling_horizon(cfg, param_value, data, date_time_index):
+    """
+    Solve the dispatch in overlapping windows (rolling horizon).
+
+    Each window covers rolling_horizon_window_days days. Only the first
+    (window - overlap) days of a window are kept, the overlap is solved
+    again as the beginning of the next window. Carried over from one window
+    to the next are
+    - the storage levels at the end of the kept part (oemof sets the initial
+      capacity at the last time step of a window, so the window starts with
+      this level; the end of the window has to return to it, which only
+      affects the discarded overlap),
+    - the CHP status (binary variable Y) of the first time step of the next
+      window, which was already decided in the overlap of the previous one.
+
+    Returns an energy system with the full time index whose results of the
+    kept parts are stitched together, so that it can be dumped and analysed
+    like the result of a single optimisation. The objective in its meta
+    results are the costs of the kept parts, so the overlaps are not counted
+    twice (see merge_meta_results).
+    """
+    steps_per_day = int(round(24 / step_hours(date_time_index.freq)))
+    window = cfg['rolling_horizon_window_days'] * steps_per_day
+    overlap = cfg['rolling_horizon_overlap_days'] * steps_per_day
+    if overlap >= window:
+        raise ValueError('The overlap of the rolling horizon has to be '
+                         'shorter than its window.')
+    periods = len(date_time_index)
+
+    storage_levels = {}
+    chp_status = None
+    window_results = []
+    window_meta = []
+    objective = 0
+    start = 0
+    while start < periods:
+        end = min(start + window, periods)
+        logging.info('Solve rolling horizon window {0} to {1}'.format(
+            date_time_index[start], date_time_index[end - 1]))
+        with stage('energysystem'):
+            energysystem = create_energysystem(
+                cfg, param_value, data.iloc[start:end].reset_index(drop=True),
+                date_time_index[start:end], storage_levels)
+        with stage('model'):
+            model = solph.Model(energysystem)
+
+        chp = energysystem.groups['CHP_01']
+        if chp_status is not None:
+            model.GenericCHPBlock.Y[chp, 0].fix(chp_status)
+
+        solve_model(model, cfg)
+
+        kept = end - start if end == periods else window - overlap
+        objective += variable_costs(model, range(kept))
+        with stage('processing'):
+            results = process_results(model, cfg)
+            window_meta.append(outputlib.processing.meta_results(model))
+        window_results.append(
+            {k: v['sequences'].iloc[:kept]
+             for k, v in outputlib.views.convert_keys_to_strings(
+                 results).items()})
+
+        for label in ['storage_th', 'storage_el']:
+            if label in energysystem.groups:
+                storage = energysystem.groups[label]
+                storage_levels[label] = (
+                    results[(storage, None)]['sequences']['capacity'].iloc[
+                        kept - 1] / storage.nominal_capacity)
+        if end < periods:
+            chp_status = round(model.GenericCHPBlock.Y[chp, kept].value)
+        if start == 0:
+            first_results = results
+            stitched_energysystem = energysystem
+
+        start += kept
+
+    # Stitch the sequences of all windows, the result keys of the first
+    # window (node objects) are kept.
+    stitched = {}
+    for key, value in first_results.items():
+        label_key = tuple(str(n) for n in key)
+        sequences = pd.concat([r[label_key] for r in window_results])
+        sequences.index = date_time_index
+        stitched[key] = {'scalars': value['scalars'],
+                         'sequences': sequences}
+
+    stitched_energysystem.timeindex = date_time_index
+    stitched_energysystem.results = {
+        'main': stitched,
+        'meta': merge_meta_results(window_meta, objective)}
+    return stitched_energysystem
 
-    logging.info('Optimise the energy system')
 
-    model = solph.Model(energysystem)
+def run_model_flexchp(config_path, scenario_nr):
 
-    if debug:
-        lpfile_name = 'flexCHP_scenario_{0}.lp'.format(scenario_nr)
-        filename = os.path.join(
-            helpers.extend_basic_path('lp_files'), lpfile_name)
-        logging.info('Store lp-file in {0}.'.format(filename))
-        model.write(filename, io_options={'symbolic_solver_labels': True})
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
 
-    logging.info('Solve the optimization problem')
-    model.solve(solver=solver, solve_kwargs={'tee': solver_verbose})
+    debug = cfg['debug']
 
-    logging.info('Store the energy system with the results.')
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+
+    logger.define_logging(logpath=abs_path+'/results/optimisation_results/log/',
+                          logfile=cfg['filename_logfile']+'_scenario_{0}.log'.format(scenario_nr),
+                          screen_level=logging.INFO,
+                          file_level=logging.DEBUG)
+    start_stages(cfg, abs_path, scenario_nr)
+
+    logging.info('Use parameters for scenario {0}'.format(scenario_nr))
+    logging.info('Initialize the energy system')
 
-    energysystem.results['main'] = outputlib.processing.results(model)
-    energysystem.results['meta'] = outputlib.processing.meta_results(model)
+    ##########################################################################
+    # Read time series and parameter values from data files
+    ##########################################################################
+
+    with stage('read_data'):
+        data = read_demand(cfg, abs_path)
+        date_time_index = time_index(cfg, data)
+
+        file_path_param_01 = abs_path + cfg['parameters_energy_system'][scenario_nr-1]
+        file_path_param_02 = abs_path + cfg['parameters_all_energy_systems']
+        param_df_01 = pd.read_csv(file_path_param_01, index_col=1)
+        param_df_02 = pd.read_csv(file_path_param_02, index_col=1)
+        param_df = pd.concat([param_df_01, param_df_02], sort=True)
+        param_value = param_df['value']
+
+    ##########################################################################
+    # Optimise the energy system and plot the results
+    ##########################################################################
 
-    energysystem.dump(dpath=abs_path + "/results/optimisation_results/dumps",
-                      filename=cfg['filename_dumb']+'_scenario_{0}.oemof'.format(scenario_nr))
+    logging.info('Optimise the energy system')
 
+    if cfg.get('rolling_horizon', False):
+        energysystem = solve_rolling_horizon(cfg, param_value, data,
+                                             date_time_index)
+    else:
+        start = time.time()
+        with stage('energysystem'):
+            energysystem = create_energysystem(cfg, param_value, data,
+                                               date_time_index)
+        with stage('model'):
+            model = solph.Model(energysystem)
+        logging.info('Model built in {0:.1f} s, peak memory {1:.0f} MB'.format(
+            time.time() - start,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+        record_model_size(model)
+
+        if debug:
+            lpfile_name = 'flexCHP_scenario_{0}.lp'.format(scenario_nr)
+            filename = os.path.join(
+                helpers.extend_basic_path('lp_files'), lpfile_name)
+            logging.info('Store lp-file in {0}.'.format(filename))
+            model.write(filename, io_options={'symbolic_solver_labels': True})
+
+        logging.info('Solve the optimization problem')
+        solve_model(model, cfg)
+
+        with stage('processing'):
+            energysystem.results['main'] = process_results(model, cfg)
+            energysystem.results['meta'] = outputlib.processing.meta_results(model)
 
+    logging.info('Store the energy system with the results.')
 
+    dpath = abs_path + "/results/optimisation_results/dumps"
+    filename = cfg['filename_dumb'] + '_scenario_{0}'.format(scenario_nr)
+    with stage('dump'):
+        if cfg.get('results_format', 'oemof') == 'parquet':
+            write_results(energysystem.results['main'], dpath, filename)
+        else:
+            energysystem.dump(dpath=dpath, filename=filename + '.oemof')
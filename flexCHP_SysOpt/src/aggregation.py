@@ -0,0 +1,374 @@
+'''
+Aggregation of the demand time series into typical days and
+disaggregation of the optimisation results back to the full time horizon.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+
+def kmeans(features, n_clusters, max_iter=300, seed=0):
+    """
+    Cluster the rows of features with k-means (k-means++ initialisation).
+    Returns the cluster label of each row.
+    """
+    rng = np.random.RandomState(seed)
+    centers = features[[rng.randint(len(features))]]
+    for _ in range(1, n_clusters):
+        dist = ((features[:, None, :] - centers[None, :, :])**2).sum(
+            axis=2).min(axis=1)
+        if dist.sum() > 0:
+            new_center = rng.choice(len(features), p=dist/dist.sum())
+        else:
+            new_center = rng.randint(len(features))
+        centers = np.vstack([centers, features[new_center]])
+
+    labels = None
+    for _ in range(max_iter):
+        new_labels = ((features[:, None, :] - centers[None, :, :])**2).sum(
+            axis=2).argmin(axis=1)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        for k in range(n_clusters):
+            if np.any(labels == k):
+                centers[k] = features[labels == k].mean(axis=0)
+    return labels
+
+
+def aggregate_typical_days(data, n_typical_days, steps_per_day=24,
+                           columns=('demand_el', 'demand_th',
+                                    'neg_residual_el'),
+                           seed=0):
+    """
+    Cluster the days of the time series in data into typical days.
+
+    The typical day of each cluster is the real day closest to the cluster
+    center (medoid), so the profiles keep their original characteristics
+    (e.g. hours with zero residual load). Only complete days are used.
+
+    Returns a dict with
+        'data': time series of the typical days in chronological order of
+            the medoids (n_typical_days * steps_per_day rows),
+        'weights': number of days represented by each typical day,
+        'day_to_typical_day': index of the typical day for each day,
+        'steps_per_day': steps_per_day.
+    """
+    n_days = len(data) // steps_per_day
+    if n_typical_days > n_days:
+        raise ValueError('Cannot aggregate {0} days into {1} typical days.'.
+                         format(n_days, n_typical_days))
+
+    values = data[list(columns)].values[:n_days*steps_per_day]
+    features = values.reshape(n_days, steps_per_day, len(columns)).reshape(
+        n_days, -1)
+
+    labels = kmeans(features, n_typical_days, seed=seed)
+
+    medoids = []
+    for k in np.unique(labels):
+        members = np.flatnonzero(labels == k)
+        center = features[members].mean(axis=0)
+        medoids.append(members[
+            ((features[members] - center)**2).sum(axis=1).argmin()])
+    medoids = np.sort(medoids)
+
+    # Map every day to the position of its typical day
+    position = {labels[day]: i for i, day in enumerate(medoids)}
+    day_to_typical_day = np.array([position[k] for k in labels])
+
+    steps = (medoids[:, None]*steps_per_day
+             + np.arange(steps_per_day)[None, :]).ravel()
+    typical_data = data.iloc[steps].reset_index(drop=True)
+
+    return {'data': typical_data,
+            'weights': np.bincount(day_to_typical_day,
+                                   minlength=len(medoids)),
+            'day_to_typical_day': day_to_typical_day,
+            'steps_per_day': steps_per_day}
+
+
+def objective_weighting(aggregation, timeincrement=1):
+    """
+    Weight of each time step of the typical days in the objective function,
+    i.e. the number of days represented by its typical day.
+    """
+    return list(np.repeat(aggregation['weights'],
+                          aggregation['steps_per_day']) * timeincrement)
+
+
+def add_weighted_flow_limits(model, weighting):
+    """
+    Weight the summed flow limits (summed_max, summed_min) with the number
+    of days represented by each typical day.
+
+    oemof limits the unweighted sum of a flow over the time steps of the
+    model, i.e. over the typical days only, while the limit is given for the
+    full time horizon. The constraints of oemof are replaced by constraints
+    on the weighted sum (weighting as passed to objective_weighting).
+    """
+    import pyomo.environ as po
+    block = model.Flow
+
+    def weighted_sum(i, o):
+        return sum(model.flow[i, o, t] * weighting[t]
+                   for t in model.TIMESTEPS)
+
+    for i, o in block.SUMMED_MAX_FLOWS:
+        block.summed_max[i, o].deactivate()
+    for i, o in block.SUMMED_MIN_FLOWS:
+        block.summed_min[i, o].deactivate()
+
+    def _weighted_summed_max_rule(m, i, o):
+        return weighted_sum(i, o) <= (m.flows[i, o].summed_max *
+                                      m.flows[i, o].nominal_value)
+
+    def _weighted_summed_min_rule(m, i, o):
+        return weighted_sum(i, o) >= (m.flows[i, o].summed_min *
+                                      m.flows[i, o].nominal_value)
+
+    model.weighted_summed_max = po.Constraint(
+        block.SUMMED_MAX_FLOWS, rule=_weighted_summed_max_rule)
+    model.weighted_summed_min = po.Constraint(
+        block.SUMMED_MIN_FLOWS, rule=_weighted_summed_min_rule)
+
+
+def add_typical_day_storage_constraints(model, aggregation):
+    """
+    Link the storage state of charge across the days of the full horizon.
+
+    The storage level of a day d with typical day k is split into the level
+    at the start of the day, storage_level[n, d], which is linked
+    chronologically with day_to_typical_day, and the change within the day,
+    which is the same for all days of typical day k:
+
+        level(d, tau) = storage_level[n, d] * (1 - loss)**tau
+                        + capacity[n, k, tau]
+
+    capacity[n, t] of the model therefore is the change of the level since
+    the start of its typical day (the balance of the first time step of a
+    typical day starts at zero and the variable may become negative), and
+    the balance of the days is
+
+        storage_level[n, d+1] = storage_level[n, d] * (1 - loss)**steps
+                                + capacity[n, last step of k]
+
+    The bounds of the level (capacity_max, capacity_min) hold for the
+    maximum and minimum of the change within each typical day
+    (intra_day_max, intra_day_min). The levels are cyclic, the initial
+    capacity sets the level at the start of the horizon. Energy can thus be
+    shifted between the days, e.g. by a seasonal storage.
+
+    The variables and constraints of the levels are added to their own
+    block, model.typical_day_storage (see without_storage_levels).
+    """
+    import pyomo.environ as po
+    steps_per_day = aggregation['steps_per_day']
+    day_to_typical_day = aggregation['day_to_typical_day']
+    typical_days = range(len(aggregation['weights']))
+    days = range(len(day_to_typical_day))
+    block = model.GenericInvestmentStorageBlock
+
+    # The time steps of the model are numbered 0, 1, ... (see oemof)
+    def first(k):
+        return k*steps_per_day
+
+    def last(k):
+        return (k+1)*steps_per_day - 1
+
+    def typical_day(t):
+        return t // steps_per_day
+
+    def size(n):
+        return n.investment.existing + block.invest[n]
+
+    def decay(n):
+        return (1 - n.capacity_loss[0]) ** steps_per_day
+
+    # The change of the level within the typical days replaces the level
+    for n in block.INVESTSTORAGES:
+        for t in model.TIMESTEPS:
+            block.capacity[n, t].domain = po.Reals
+            block.capacity[n, t].setlb(None)
+            block.max_capacity[n, t].deactivate()
+            if n in block.MIN_INVESTSTORAGES:
+                block.min_capacity[n, t].deactivate()
+        for k in typical_days:
+            block.balance[n, first(k)].deactivate()
+        if n in block.INITIAL_CAPACITY:
+            block.initial_capacity[n].deactivate()
+
+    def _intra_day_start_rule(m, n, k):
+        t = first(k)
+        inflow = [i for i in n.inputs][0]
+        outflow = [o for o in n.outputs][0]
+        return block.capacity[n, t] == (
+            model.flow[inflow, n, t] * n.inflow_conversion_factor[t]
+            - model.flow[n, outflow, t] / n.outflow_conversion_factor[t]
+        ) * model.timeincrement[t]
+
+    model.typical_day_storage = po.Block()
+    levels = model.typical_day_storage
+
+    levels.intra_day_start = po.Constraint(
+        block.INVESTSTORAGES, typical_days, rule=_intra_day_start_rule)
+
+    levels.storage_level = po.Var(block.INVESTSTORAGES,
+                                  range(len(days) + 1),
+                                  within=po.NonNegativeReals)
+    levels.intra_day_max = po.Var(block.INVESTSTORAGES, typical_days,
+                                  within=po.NonNegativeReals)
+    levels.intra_day_min = po.Var(block.INVESTSTORAGES, typical_days,
+                                  within=po.NonPositiveReals)
+
+    def _storage_level_balance_rule(m, n, d):
+        return m.storage_level[n, d+1] == (
+            m.storage_level[n, d] * decay(n)
+            + block.capacity[n, last(day_to_typical_day[d])])
+
+    def _storage_level_cycle_rule(m, n):
+        return m.storage_level[n, len(days)] == m.storage_level[n, 0]
+
+    def _storage_level_initial_rule(m, n):
+        return m.storage_level[n, 0] == size(n) * n.initial_capacity
+
+    def _intra_day_max_rule(m, n, t):
+        return m.intra_day_max[n, typical_day(t)] >= block.capacity[n, t]
+
+    def _intra_day_min_rule(m, n, t):
+        return m.intra_day_min[n, typical_day(t)] <= block.capacity[n, t]
+
+    def _storage_level_max_rule(m, n, d):
+        return (m.storage_level[n, d]
+                + m.intra_day_max[n, day_to_typical_day[d]]
+                <= size(n) * n.capacity_max[0])
+
+    def _storage_level_min_rule(m, n, d):
+        return (m.storage_level[n, d] * decay(n)
+                + m.intra_day_min[n, day_to_typical_day[d]]
+                >= size(n) * n.capacity_min[0])
+
+    levels.storage_level_balance = po.Constraint(
+        block.INVESTSTORAGES, days, rule=_storage_level_balance_rule)
+    levels.storage_level_cycle = po.Constraint(
+        block.INVESTSTORAGES, rule=_storage_level_cycle_rule)
+    levels.storage_level_initial = po.Constraint(
+        block.INITIAL_CAPACITY, rule=_storage_level_initial_rule)
+    levels.intra_day_upper = po.Constraint(
+        block.INVESTSTORAGES, model.TIMESTEPS, rule=_intra_day_max_rule)
+    levels.intra_day_lower = po.Constraint(
+        block.INVESTSTORAGES, model.TIMESTEPS, rule=_intra_day_min_rule)
+    levels.storage_level_max = po.Constraint(
+        block.INVESTSTORAGES, days, rule=_storage_level_max_rule)
+    levels.storage_level_min = po.Constraint(
+        block.INVESTSTORAGES, days, rule=_storage_level_min_rule)
+
+
+@contextmanager
+def without_storage_levels(model):
+    """
+    Detach the block of the storage levels of the typical days
+    (model.typical_day_storage) from the model within the context.
+
+    oemof's outputlib.processing.results reads every variable of the model
+    and takes the last element of its index as the time step. The levels per
+    day and the bounds per typical day would end up in the results of the
+    storages with an index that does not match the time index.
+    """
+    levels = getattr(model, 'typical_day_storage', None)
+    if levels is None:
+        yield model
+        return
+    model.del_component(levels)
+    try:
+        yield model
+    finally:
+        model.add_component('typical_day_storage', levels)
+
+
+def storage_levels(model, aggregation):
+    """
+    Return the levels at the start of the days (storage_level) and the
+    relative loss per time step of each linked storage of the solved model,
+    to disaggregate its level (see add_typical_day_storage_constraints).
+    """
+    if not hasattr(model, 'typical_day_storage'):
+        return {}
+    block = model.GenericInvestmentStorageBlock
+    storage_level = model.typical_day_storage.storage_level
+    n_levels = len(aggregation['day_to_typical_day']) + 1
+    return {n: (np.array([storage_level[n, d].value
+                          for d in range(n_levels)], dtype=float),
+                n.capacity_loss[0])
+            for n in block.INVESTSTORAGES}
+
+
+def typical_steps(aggregation, length):
+    """
+    Return for each time step of the full time horizon (of the given length)
+    the corresponding time step of the typical days.
+    """
+    steps_per_day = aggregation['steps_per_day']
+    steps = (aggregation['day_to_typical_day'][:, None]*steps_per_day
+             + np.arange(steps_per_day)[None, :]).ravel()
+    # A horizon that does not end with a complete day is filled up with the
+    # typical day of the last complete day
+    remaining = length - len(steps)
+    if remaining > 0:
+        steps = np.concatenate([steps, steps[-steps_per_day:][:remaining]])
+    return steps[:length]
+
+
+def disaggregate_results(results, aggregation, timeindex, levels=None):
+    """
+    Expand the results of the typical days to the full time horizon.
+
+    The sequences of each day are taken from its typical day, scalars (e.g.
+    installed capacities) are kept as they are. The capacity of the storages
+    in levels (see storage_levels) is the change within the typical day, it
+    is added to the level at the start of each day.
+    """
+    steps = typical_steps(aggregation, len(timeindex))
+    levels = levels or {}
+    steps_per_day = aggregation['steps_per_day']
+    day = np.arange(len(steps)) // steps_per_day
+    tau = np.arange(len(steps)) % steps_per_day + 1
+
+    full_results = {}
+    for key, value in results.items():
+        sequences = value['sequences'].iloc[steps].copy()
+        sequences.index = timeindex
+        node = key[0] if isinstance(key, tuple) and key[1] is None else None
+        if node in levels and 'capacity' in sequences:
+            start, loss = levels[node]
+            sequences['capacity'] += (start[np.minimum(day, len(start) - 1)]
+                                      * (1 - loss) ** tau)
+        full_results[key] = {'scalars': value['scalars'],
+                             'sequences': sequences}
+    return full_results
+
+
+def compare_investments(results_aggregated, results_full):
+    """
+    Return the installed capacities of the aggregated and the full
+    resolution model and the relative error of the aggregated model.
+    """
+    def investments(results):
+        return pd.Series({
+            '_'.join(str(n) for n in key if n is not None):
+                value['scalars']['invest']
+            for key, value in results.items()
+            if 'invest' in value['scalars'].index})
+
+    comparison = pd.DataFrame({'full': investments(results_full),
+                               'aggregated': investments(results_aggregated)})
+    comparison['relative_error'] = (
+        (comparison['aggregated'] - comparison['full'])
+        / comparison['full'].where(comparison['full'] != 0))
+    return comparison
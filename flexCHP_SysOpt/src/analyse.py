@@ -7,19 +7,157 @@ __author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
 # imports
 ###############################################################################
 
-import oemof.solph as solph
-import oemof.outputlib as outputlib
-from oemof.outputlib import processing, views
-import oemof.tools.economics as eco
-
 import os
 import pandas as pd
 import pprint as pp
-import matplotlib
 import numpy as np
-import matplotlib.pyplot as plt
 import yaml
 
+from results_store import read_results, iter_years, node
+from kpi import stack_sequences, compute_kpis, merge_kpis
+from parameters import read_parameters
+from plotting import plot_job, submit
+from instrumentation import start_stages, stage, staged
+from timeseries import read_demand, step_hours
+
+# Buses whose flows are all read from the results (balances)
+ANALYSED_BUSES = ['electricity', 'heat']
+
+# Flows (besides those of the buses) read from the results. The flows of
+# the buses and these flows are extracted from the solved model with
+# results_extraction='selected' (see extraction.py).
+ANALYSED_FLOWS = [('residual_el', 'residual'),
+                  ('storage_th', 'None'),
+                  ('storage_el', 'None'),
+                  ('rgas', 'natural_gas'),
+                  ('natural_gas', 'CHP_01')]
+
+# Colors
+BEUTH_RED = (239 / 255, 24 / 255, 30 / 255)
+BEUTH_COL_2 = (57 / 255, 183 / 255, 188 / 255)
+BEUTH_COL_3 = (0 / 255, 152 / 255, 161 / 255)
+
+# Columns of zeitreihen shown in the scatter plot of the storage operation
+STORAGE_OPERATION_COLUMNS = ['Waermebedarf', 'Strombedarf',
+                             'Waermespeicher_entladung', 'batterie_entladen',
+                             'Waermespeicher_beladung', 'batterie_beladen']
+
+
+def results_location(cfg, abs_path, variation_nr):
+    """
+    Directory and filename of the results of a parameter variation.
+
+    Decide which results are to be analysed depending on the settings in
+    the config-file.
+    """
+    if cfg['price_el_quadratic']:
+        dpath = (abs_path + "/results/optimisation_results/dumps/"
+                            "quadratic_price_relationship")
+    if cfg['price_el_quadratic'] == False:
+        dpath = (abs_path + "/results/optimisation_results/dumps/"
+                            "linear_price_relationship")
+    return dpath, cfg['filename_dumb'] + '_scenario_{0}'.format(variation_nr)
+
+
+def load_results(cfg, abs_path, variation_nr, flows=None, nodes=None):
+    """
+    Return the results of a parameter variation with string keys.
+
+    From the columnar results store only the given flows and the flows of
+    the given nodes are read (see results_store.py), a dumped energy system
+    is always restored completely.
+    """
+    dpath, filename = results_location(cfg, abs_path, variation_nr)
+
+    if cfg.get('results_format', 'oemof') == 'parquet':
+        return read_results(dpath, filename, flows=flows, nodes=nodes)
+
+    # oemof is only needed to restore a dumped energy system
+    import oemof.solph as solph
+    import oemof.outputlib as outputlib
+
+    energysystem = solph.EnergySystem()
+    energysystem.restore(dpath=dpath, filename=filename + '.oemof')
+    return outputlib.views.convert_keys_to_strings(
+        energysystem.results['main'])
+
+
+def iter_results(cfg, abs_path, variation_nr, flows=None, nodes=None):
+    """
+    Yield the results of a parameter variation year by year from the
+    columnar results store (see results_store.iter_years). A dumped energy
+    system is restored completely and yielded at once.
+    """
+    if cfg.get('results_format', 'oemof') == 'parquet':
+        dpath, filename = results_location(cfg, abs_path, variation_nr)
+        for results in iter_years(dpath, filename, flows=flows, nodes=nodes):
+            yield results
+    else:
+        yield load_results(cfg, abs_path, variation_nr, flows=flows,
+                           nodes=nodes)
+
+
+def plot_storage_operation(fig, ax, zeitreihen):
+    """
+    Heat and electricity demand in all hours and in hours in which the
+    storages are charged or discharged (2 x 2 axes).
+    """
+    size__01 = 5
+    size_02 = 5
+    fig.subplots_adjust(hspace=.3)
+    panels = [((0, 0), 'Waermespeicher_entladung', 'TES discharge'),
+              ((0, 1), 'batterie_entladen', 'EES discharge'),
+              ((1, 0), 'Waermespeicher_beladung', 'TES charge'),
+              ((1, 1), 'batterie_beladen', 'EES charge')]
+    for position, column, title in panels:
+        ax[position].grid(zorder=2)
+        ax[position].scatter(
+            x=zeitreihen['Waermebedarf'],
+            y=zeitreihen['Strombedarf'],
+            label='Total production',
+            marker='o',
+            s=size__01**2,
+            color=BEUTH_COL_2,
+            zorder=10
+        )
+        ax[position].scatter(
+            x=zeitreihen['Waermebedarf'][zeitreihen[column] > 3],
+            y=zeitreihen['Strombedarf'][zeitreihen[column] > 3],
+            label=title,
+            marker='x',
+            s=size_02**2,
+            color=BEUTH_RED,
+            zorder=10
+        )
+        ax[position].set_title(title)
+    ax[0, 0].set_ylim([-120, 2000])
+    ax[0, 0].set_xlim([0, 1050])
+    ax[1, 1].set_xlabel('District Heating '
+                        'Distribution ($\mathrm{MWh_{th}}$)')
+    ax[1, 0].set_xlabel('District Heating '
+                        'Distribution ($\mathrm{MWh_{th}}$)')
+    ax[0, 0].set_ylabel('Power Supply ($\mathrm{MWh_{el}}$)')
+    ax[1, 0].set_ylabel('Power Supply ($\mathrm{MWh_{el}}$)')
+
+
+def plot_supply_over_price(fig, ax, el_price, power_supply):
+    """Power supply over electricity price."""
+    ax.scatter(
+        x=el_price,
+        y=power_supply.clip(lower=0),
+        color=BEUTH_COL_3
+    )
+    ax.scatter(
+        x=el_price,
+        y=power_supply,
+        color=BEUTH_RED,
+        marker='x'
+    )
+    ax.set_ylim([-100, 1950])
+    ax.set_xlim([-10, 220])
+    ax.set_ylabel('Power supply ($\mathrm{MWh_{el}})$')
+    ax.set_xlabel('Electricity price ($\mathrm{EUR/MWh_{el}}$)')
+
 
 def analyse_energy_system(config_path, variation_nr):
 
@@ -32,46 +170,51 @@ def analyse_energy_system(config_path, variation_nr):
         cfg = yaml.load(ymlfile)
 
     abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+    start_stages(cfg, abs_path, variation_nr)
 
     # Read parameters
-    file_path_param_01 = abs_path + cfg['parameters_energy_system']
-    file_path_param_02 = abs_path + cfg['parameter_variation'][variation_nr]
-    param_df_01 = pd.read_csv(file_path_param_01, index_col=1)
-    param_df_02 = pd.read_csv(file_path_param_02, index_col=1)
-    param_df = pd.concat([param_df_01, param_df_02])
-    param_value = param_df['value']
+    param_value = read_parameters(cfg, abs_path, variation_nr)
 
     # Read district heating and electricity demand
-    file_path_demand_ts = abs_path + cfg['demand_time_series']
-    data = pd.read_csv(file_path_demand_ts)
+    data = read_demand(cfg, abs_path)
 
     ##########################################################################
     # Restore optimization results
     ##########################################################################
 
-    energysystem = solph.EnergySystem()
-
-    # Decide which results (oemof-file) is to be analysed depending on
-    # the settings in the config-file
     if cfg['price_el_quadratic']:
-        energysystem.restore(
-            dpath=(abs_path + "/results/optimisation_results/dumps/"
-                              "quadratic_price_relationship"),
-            filename=(cfg['filename_dumb'] + '_scenario_{0}.oemof'.
-                      format(variation_nr)))
         price_relation = 'quadratic'
     if cfg['price_el_quadratic'] == False:
-        energysystem.restore(
-            dpath=(abs_path + "/results/optimisation_results/dumps/"
-                              "linear_price_relationship"),
-            filename=(cfg['filename_dumb'] + '_scenario_{0}.oemof'.
-                      format(variation_nr)))
         price_relation = 'linear'
 
-    results = energysystem.results['main']
-
-    string_results = outputlib.views.convert_keys_to_strings(
-        energysystem.results['main'])
+    # Read only the flows of the buses and the components analysed below.
+    # The results are read year by year: the sums of the bus flows and the
+    # key performance indicators of all years are combined, the sequences
+    # are only kept for the export of the time series.
+    keep_sequences = cfg['run_single_scenario']
+    # Flows are in MW, energies are weighted with the length of the time
+    # steps in hours
+    timeincrement = step_hours(cfg['frequency'])
+    bus_sums = {bus: 0 for bus in ANALYSED_BUSES}
+    yearly_kpis = []
+    yearly_sequences = []
+    for string_results in staged(iter_results(
+            cfg, abs_path, variation_nr, flows=ANALYSED_FLOWS,
+            nodes=list(bus_sums)), 'load_results'):
+        with stage('kpis'):
+            for bus in bus_sums:
+                bus_sums[bus] = bus_sums[bus] + node(
+                    string_results, bus)['sequences'].sum(
+                        axis=0) * timeincrement
+            # Stack the sequences (time series) of the analysed flows and
+            # compute all key performance indicators at once
+            values, names, timeindex = stack_sequences(string_results)
+            yearly_kpis.append(compute_kpis(values, names,
+                                             timeincrement=timeincrement))
+            if keep_sequences:
+                yearly_sequences.append(
+                    pd.DataFrame(values, index=timeindex, columns=names))
+    kpis = merge_kpis(yearly_kpis)
 
     ##########################################################################
     # Display accumulated flows of buses
@@ -81,79 +224,24 @@ def analyse_energy_system(config_path, variation_nr):
     print('Used price relationship: {}  '.format(price_relation))
     print("")
 
-    electricity_bus = outputlib.views.node(results, 'electricity')
     print('electricity bus: sums in GWh_el')
-    print(electricity_bus['sequences'].sum(axis=0)/1e3)
+    print(bus_sums['electricity']/1e3)
 
-    heat_bus = outputlib.views.node(results, 'heat')
     print('heat bus: sums in GWh_th')
-    print(heat_bus['sequences'].sum(axis=0)/1e3)
+    print(bus_sums['heat']/1e3)
 
     ##########################################################################
     # Extract information from the results file
     ##########################################################################
 
-    # Get sequences (time series) for specific components from the results file
-    CHP_01_heat = string_results[('CHP_01', 'heat')]['sequences']
-    CHP_01_electricity = string_results[('CHP_01', 'electricity')]['sequences']
-    residual_load = string_results[('residual_el', 'residual')]['sequences']
-    boiler = string_results[('boiler', 'heat')]['sequences']
-    P2H_th = string_results['P2H', 'heat']['sequences']
-    TES_discharge = string_results['storage_th', 'heat']['sequences']
-    TES_charge = string_results['heat', 'storage_th']['sequences']
-    TES_soc = (string_results['storage_th', 'None'][
-            'sequences'])  # State of charge (SOC) in MWh_th
-    TES_soc_rel = (string_results['storage_th', 'None']['sequences']
-                   / string_results['storage_th', 'None']['sequences'].
-                   max()*100)  # State of charge in %
-    battery_discharge = string_results['storage_el', 'electricity'][
-        'sequences']
-    battery_charge = string_results['electricity', 'storage_el']['sequences']
-    battery_soc = string_results['storage_el', 'None']['sequences']
-    battery_soc_rel = (string_results['storage_el', 'None']['sequences']
-                       /string_results['storage_el', 'None']['sequences']
-                       .max()*100)
-    shortage_electricity = string_results['shortage_bel', 'electricity'][
-        'sequences']
-    shortage_heat = string_results['shortage_bth', 'heat']['sequences']
-    excess_electricity = string_results['electricity', 'excess_bel'][
-        'sequences']
-    excess_heat = string_results['heat', 'excess_bth']['sequences']
-    gas_consumption = string_results['rgas', 'natural_gas']['sequences']
-    demand_th = string_results['heat', 'demand_th']['sequences']
-    demand_el = string_results['electricity', 'demand_el']['sequences']
-    gas_consumption_CHP = string_results['natural_gas', 'CHP_01']['sequences']
-    eta_el = (string_results[('CHP_01', 'electricity')]['sequences']
-              /gas_consumption_CHP)
-
-    omega_CHP = ((string_results[('CHP_01', 'electricity')]['sequences']
-                  + string_results[('CHP_01', 'heat')]['sequences'])
-                 /gas_consumption_CHP)
-    eta_el_sum = (string_results[('CHP_01', 'electricity')]['sequences'].
-                  sum()/gas_consumption_CHP.sum())
-    omega_CHP_sum = ((string_results[('CHP_01', 'electricity')]['sequences'].
-                      flow.sum()
-                      + string_results[('CHP_01', 'heat')]['sequences'].flow.
-                      sum())/gas_consumption_CHP.flow.sum())
-    stored_el = residual_load - demand_el[residual_load > 0]
-
-    # Auxiliary values for the later operation analysis
-    aux_shortage_df = shortage_heat.add(shortage_electricity)
-    aux_chp_01_df = CHP_01_heat.add(CHP_01_electricity)
-
     # Get investment results (i.e., installed capacity or power of the
     # components) from the results file. Scalar values.
-    storage_el_cap = (outputlib.views.node(results, 'storage_el')[
-        'scalars'][(('storage_el', 'None'), 'invest')])
-    storage_th_cap = (outputlib.views.node(results, 'storage_th')[
-        'scalars'][(('storage_th', 'None'), 'invest')])
-    chp_cap = (outputlib.views.node(results, 'CHP_01')[
-                   'scalars'][(('natural_gas', 'CHP_01'), 'invest')]
+    storage_el_cap = string_results['storage_el', 'None']['scalars']['invest']
+    storage_th_cap = string_results['storage_th', 'None']['scalars']['invest']
+    chp_cap = (string_results['natural_gas', 'CHP_01']['scalars']['invest']
                * param_value['conv_factor_full_cond'])
-    P2H_cap = (outputlib.views.node(results, 'P2H')[
-        'scalars'][(('P2H', 'heat'), 'invest')])
-    boiler_cap = (outputlib.views.node(results, 'boiler')[
-        'scalars'][(('boiler', 'heat'), 'invest')])
+    P2H_cap = string_results['P2H', 'heat']['scalars']['invest']
+    boiler_cap = string_results['boiler', 'heat']['scalars']['invest']
 
     ##########################################################################
     # Display analysis
@@ -161,55 +249,53 @@ def analyse_energy_system(config_path, variation_nr):
 
     print('-- Consumption, Shortage and Excess Energy --')
     print("Total shortage electr.: {:.3f}".
-          format(shortage_electricity.flow.sum()/1e3),"GWh_el")
+          format(kpis['shortage_el_sum']/1e3), "GWh_el")
     print("Total shortage heat:    {:.3f}".
-        format(shortage_heat.flow.sum()/1e3), "GWh_el")
+          format(kpis['shortage_heat_sum']/1e3), "GWh_el")
     print("Total excess electr.:   {:.2f}".
-        format(excess_electricity.flow.sum()/1e3), "GWh_el")
+          format(kpis['excess_el_sum']/1e3), "GWh_el")
     print("Total excess heat.:     {:.2f}".
-        format(excess_heat.flow.sum()/1e3), "GWh_el")
+          format(kpis['excess_heat_sum']/1e3), "GWh_el")
     print("Total electrical consumption (neg. residual load):  {:.2f}".
-        format(residual_load.flow.sum() / 1e3), "GWh_el")
-    print(residual_load[battery_charge > 0.5].flow.sum()/1e3)
+          format(kpis['residual_load_sum']/1e3), "GWh_el")
+    print(kpis['residual_load_ees_charging_sum']/1e3)
     print("Consumed electr by charging EES: %3.2f GWh_el"
-          % (stored_el.flow.sum()/1e3))
+          % (kpis['stored_el_sum']/1e3))
     print("Total gas consumption:  {:.2f}".
-          format(gas_consumption.flow.sum()/1e3), "GWh_th")
-    print("Total el demand:  {:.2f}".format(demand_el.flow.sum()/1e3),
+          format(kpis['gas_sum']/1e3), "GWh_th")
+    print("Total el demand:  {:.2f}".format(kpis['demand_el_sum']/1e3),
           "GWh_th")
-    print("Total heat demand:  {:.2f}".format(demand_th.flow.sum()/1e3),
+    print("Total heat demand:  {:.2f}".format(kpis['demand_th_sum']/1e3),
           "GWh_th")
     print('--- Efficiencies ---')
     print('Electr. efficiency CHP: eta_min= {:2.4f}, '
-          'eta_max= {:2.4f}'.format(eta_el.flow.min(), eta_el.flow.max()))
+          'eta_max= {:2.4f}'.format(kpis['eta_el_min'], kpis['eta_el_max']))
     print('Energetic Efficiency CHP: omega_min= {:2.4f}, omega_max= {:2.4f}'.
-        format(omega_CHP.flow.min(), omega_CHP.flow.max()))
-    print('Energetic Efficiency (whole year): {:2.4f}'.format(omega_CHP_sum))
+          format(kpis['omega_min'], kpis['omega_max']))
+    print('Energetic Efficiency (whole year): {:2.4f}'.format(
+        kpis['omega_sum']))
     print('-- Hours in simulated period --')
-    print(CHP_01_electricity.flow.count(), "h")
-    print('Hours of electric. shortage :', aux_shortage_df[aux_shortage_df > 0].
-        flow.count(),"h")
+    print('{:g} h'.format(kpis['period_hours']))
+    print('Hours of electric. shortage : {:g} h'.format(
+        kpis['shortage_hours']))
     print('-- Hours of Operation --')
-    print('CHP_01:', aux_chp_01_df[aux_chp_01_df > 0.2].flow.count(), "h")
-    print('Boiler:', boiler[boiler > 0.2].flow.count(), "h")
-    print('P2H:', P2H_th[P2H_th > 0.1].flow.count(), "h")
-    print('Hours of charging TES: ', TES_charge[TES_charge > 0.1].
-          flow.count(), "h")
-    print('Hours of discharging TES: ', TES_discharge[TES_discharge > 0.1].
-          flow.count(), "h")
-    print('Hours of charging EES: ', battery_charge[battery_charge > 0.1].
-          flow.count(), "h")
-    print('Hours of discharging EES: ', battery_discharge[
-        battery_discharge > 0.1].flow.count(), "h")
-    print('Hours of feed in (in to the grid): ', demand_el[
-        demand_el > 0.1].flow.count(), "h")
+    print('CHP_01: {:g} h'.format(kpis['chp_hours']))
+    print('Boiler: {:g} h'.format(kpis['boiler_hours']))
+    print('P2H: {:g} h'.format(kpis['p2h_hours']))
+    print('Hours of charging TES:  {:g} h'.format(kpis['tes_charge_hours']))
+    print('Hours of discharging TES:  {:g} h'.format(
+        kpis['tes_discharge_hours']))
+    print('Hours of charging EES:  {:g} h'.format(kpis['ees_charge_hours']))
+    print('Hours of discharging EES:  {:g} h'.format(
+        kpis['ees_discharge_hours']))
+    print('Hours of feed in (in to the grid):  {:g} h'.format(
+        kpis['demand_el_hours']))
     print('-- Installed capacity of thermal energy storage (TES) --')
     print(storage_th_cap, "MWh")
-    print("Maximum discharge capacity: ", TES_discharge.flow.max(), "MW_el")
+    print("Maximum discharge capacity: ", kpis['tes_discharge_max'], "MW_el")
     print('-- Installed capacity of electrical energy storage (EES) --')
     print(storage_el_cap, "MWh")
-    print("Maximum discharge capacity: ", battery_discharge.
-          flow.max(), "MW_el")
+    print("Maximum discharge capacity: ", kpis['ees_discharge_max'], "MW_el")
     print('-- Installed capacity of CHP --')
     print(chp_cap, "MW_el")
     print('-- Installed capacity of conventional boiler --')
@@ -229,7 +315,7 @@ def analyse_energy_system(config_path, variation_nr):
          'EES_cap_MWh': [storage_el_cap],
          'P2H_cap_MW_th': [P2H_cap],
          'Boiler_cap_MW_th': [boiler_cap],
-         'gas_comsumption_MWh': [gas_consumption.flow.sum()]}
+         'gas_comsumption_MWh': [kpis['gas_sum']]}
     invest_results = pd.DataFrame(data=d, index=[variation_nr])
     print('invest results: ')
     print(invest_results)
@@ -244,22 +330,25 @@ def analyse_energy_system(config_path, variation_nr):
 
     # Save specific time series for plotting and postprocessing
     if cfg['run_single_scenario']:
+        sequences = pd.concat(yearly_sequences)
         zeitreihen = pd.DataFrame()
-        zeitreihen['Strombedarf'] = demand_el.flow
-        zeitreihen['Waermebedarf'] = demand_th.flow
-        zeitreihen['P2H_th'] = P2H_th.flow
-        zeitreihen['CHP_01_th'] = CHP_01_heat.flow
-        zeitreihen['CHPs_th'] = CHP_01_heat
-        zeitreihen['CHP_01_el'] = CHP_01_electricity
-        zeitreihen['CHPs_el'] = CHP_01_electricity
-        zeitreihen['Kessel'] = boiler
-        zeitreihen['negative_Residuallast_MW_el'] = residual_load.flow
-        zeitreihen['Fuellstand_Waermespeicher_relativ'] = TES_soc_rel
-        zeitreihen['Waermespeicher_beladung'] = TES_charge
-        zeitreihen['Waermespeicher_entladung'] = TES_discharge
-        zeitreihen['Fuellstand_Batterie_relativ'] = battery_soc_rel
-        zeitreihen['batterie_beladen'] = battery_charge
-        zeitreihen['batterie_entladen'] = battery_discharge
+        zeitreihen['Strombedarf'] = sequences['demand_el']
+        zeitreihen['Waermebedarf'] = sequences['demand_th']
+        zeitreihen['P2H_th'] = sequences['p2h']
+        zeitreihen['CHP_01_th'] = sequences['chp_heat']
+        zeitreihen['CHPs_th'] = sequences['chp_heat']
+        zeitreihen['CHP_01_el'] = sequences['chp_el']
+        zeitreihen['CHPs_el'] = sequences['chp_el']
+        zeitreihen['Kessel'] = sequences['boiler']
+        zeitreihen['negative_Residuallast_MW_el'] = sequences['residual_load']
+        zeitreihen['Fuellstand_Waermespeicher_relativ'] = (
+            sequences['tes_soc'] / sequences['tes_soc'].max()*100)
+        zeitreihen['Waermespeicher_beladung'] = sequences['tes_charge']
+        zeitreihen['Waermespeicher_entladung'] = sequences['tes_discharge']
+        zeitreihen['Fuellstand_Batterie_relativ'] = (
+            sequences['ees_soc'] / sequences['ees_soc'].max()*100)
+        zeitreihen['batterie_beladen'] = sequences['ees_charge']
+        zeitreihen['batterie_entladen'] = sequences['ees_discharge']
         if cfg['price_el_quadratic'] == False:
             zeitreihen.to_csv('../results/data_postprocessed/'
                               'linear_price_relationship/zeitreihen_A{0}.csv'.
@@ -273,165 +362,31 @@ def analyse_energy_system(config_path, variation_nr):
         # Plots
         #######################################################################
 
-        beuth_red = (239 / 255, 24 / 255, 30 / 255)
-        beuth_col_1 = (190 / 255, 226 / 255, 226 / 255)
-        beuth_col_2 = (57 / 255, 183 / 255, 188 / 255)
-        beuth_col_3 = (0 / 255, 152 / 255, 161 / 255)
-
-        fig3, ax3 = plt.subplots(2, 2, sharey=True, sharex=True)
-        size__01 = 5
-        size_02 = 5
-        fig3.subplots_adjust(hspace=.3)
-        ax3[0, 0].grid(zorder=2)
-        ax3[0, 1].grid(zorder=2)
-        ax3[1, 0].grid(zorder=2)
-        ax3[1, 1].grid(zorder=2)
-        # Upper left diagram
-        ax3[0, 0].scatter(
-            x=zeitreihen['Waermebedarf'],
-            y=zeitreihen['Strombedarf'],
-            label='Total production',
-            marker='o',
-            s=size__01**2,
-            color=beuth_col_2,
-            zorder=10
-        )
-        ax3[0, 0].scatter(
-            x=zeitreihen['Waermebedarf'][zeitreihen[
-                                             'Waermespeicher_entladung'] > 3],
-            y=zeitreihen['Strombedarf'][zeitreihen[
-                                            'Waermespeicher_entladung'] > 3],
-            label='TES discharge',
-            marker='x',
-            s=size_02**2,
-            color=beuth_red,
-            zorder=10
-        )
-        # Upper right diagram
-        ax3[0, 1].scatter(
-            x=zeitreihen['Waermebedarf'],
-            y=zeitreihen['Strombedarf'],
-            label='Total production',
-            marker='o',
-            s=size__01**2,
-            color=beuth_col_2,
-            zorder=10
-        )
-        ax3[0, 1].scatter(
-            x=zeitreihen['Waermebedarf'][zeitreihen['batterie_entladen'] > 3],
-            y=zeitreihen['Strombedarf'][zeitreihen['batterie_entladen'] > 3],
-            label='EES discharge',
-            marker='x',
-            s=size_02**2,
-            color=beuth_red,
-            zorder=10
-        )
-        # Lower left diagram
-        ax3[1, 0].scatter(
-            x=zeitreihen['Waermebedarf'],
-            y=zeitreihen['Strombedarf'],
-            label='Total production',
-            marker='o',
-            s=size__01**2,
-            color=beuth_col_2,
-            zorder=10
-        )
-        ax3[1, 0].scatter(
-            x=zeitreihen['Waermebedarf'][zeitreihen[
-                                             'Waermespeicher_beladung'] > 3],
-            y=zeitreihen['Strombedarf'][zeitreihen[
-                                            'Waermespeicher_beladung'] > 3],
-            label='TES charge',
-            marker='x',
-            s=size_02**2,
-            color=beuth_red,
-            zorder=10
-        )
-        # Lower right diagram
-        ax3[1, 1].scatter(
-            x=zeitreihen['Waermebedarf'],
-            y=zeitreihen['Strombedarf'],
-            label='Total production',
-            marker='o',
-            s=size__01**2,
-            color=beuth_col_2,
-            zorder=10
-        )
-        ax3[1, 1].scatter(
-            x=zeitreihen['Waermebedarf'][zeitreihen['batterie_beladen'] > 3],
-            y=zeitreihen['Strombedarf'][zeitreihen['batterie_beladen'] > 3],
-            label='EES charge',
-            marker='x',
-            s=size_02**2,
-            color=beuth_red,
-            zorder=10
-        )
-        # ax3[0, 0].legend()
-        ax3_ylim = [-120, 2000]
-        ax3_xlim = [0, 1050]
-        ax3[0, 0].set_ylim(ax3_ylim)
-        ax3[0, 0].set_xlim(ax3_xlim)
-        ax3[0, 0].set_title('TES discharge')
-        ax3[0, 1].set_title('EES discharge')
-        ax3[1, 0].set_title('TES charge')
-        ax3[1, 1].set_title('EES charge')
-        ax3[1, 1].set_xlabel('District Heating '
-                             'Distribution ($\mathrm{MWh_{th}}$)')
-        ax3[1, 0].set_xlabel('District Heating '
-                             'Distribution ($\mathrm{MWh_{th}}$)')
-        ax3[0, 0].set_ylabel('Power Supply ($\mathrm{MWh_{el}}$)')
-        ax3[1, 0].set_ylabel('Power Supply ($\mathrm{MWh_{el}}$)')
-        if cfg['price_el_quadratic'] == True:
-            plt.savefig(
-                '../results/plots/quadratic_price_relationship/'
-                'scatter_plot_store_sc_{0}.png'.format(variation_nr),
-                dpi=300
-            )
-        if cfg['price_el_quadratic'] == False:
-            plt.savefig(
-                '../results/plots/linear_price_relationship/'
-                'scatter_plot_store_sc_{0}.png'.format(variation_nr),
-                dpi=300
-            )
-
-        # Plot power supply over electricity price
-        plt.style.use('ggplot')
         if cfg['price_el_quadratic'] == False:
             el_price_aux = param_value['el_price']*-1 * data['demand_el']
-            el_price = el_price_aux[0:8759]
+            el_price = el_price_aux[:len(zeitreihen)]
         if cfg['price_el_quadratic'] == True:
             el_price_aux = param_value['el_price']*-1 \
                            * param_value['price_factor_sqr'] \
                            * data['demand_el'] ** 2
-            el_price = el_price_aux[0:8759]
-
-        fig4, ax4 = plt.subplots()
-        power_supply = (zeitreihen['Strombedarf'][0:8759]
-                        - zeitreihen['negative_Residuallast_MW_el'][0:8759])
-        ax4.scatter(
-            x=el_price,
-            y=power_supply.clip(lower=0),
-            color=beuth_col_3
-        )
-        ax4.scatter(
-            x=el_price,
-            y=power_supply,
-            color=beuth_red,
-            marker='x'
-        )
-        ax4.set_ylim([-100, 1950])
-        ax4.set_xlim([-10, 220])
-        ax4.set_ylabel('Power supply ($\mathrm{MWh_{el}})$')
-        ax4.set_xlabel('Electricity price ($\mathrm{EUR/MWh_{el}}$)')
+            el_price = el_price_aux[:len(zeitreihen)]
+        power_supply = (zeitreihen['Strombedarf']
+                        - zeitreihen['negative_Residuallast_MW_el'])
+
         if cfg['price_el_quadratic'] == True:
-            plt.savefig(
-                '../results/plots/quadratic_price_relationship/'
-                'el_supply_over_price_{0}.png'.format(variation_nr),
-                dpi=300
-            )
+            plot_dir = '../results/plots/quadratic_price_relationship/'
         if cfg['price_el_quadratic'] == False:
-            plt.savefig(
-                '../results/plots/linear_price_relationship/'
-                'el_supply_over_price_{0}.png'.format(variation_nr),
-                dpi=300
-            )
+            plot_dir = '../results/plots/linear_price_relationship/'
+        with stage('plots'):
+            submit(cfg, abs_path, [
+                plot_job(plot_storage_operation,
+                         plot_dir + 'scatter_plot_store_sc_{0}.png'.format(
+                             variation_nr),
+                         layout={'nrows': 2, 'ncols': 2, 'sharey': True,
+                                 'sharex': True},
+                         zeitreihen=zeitreihen[STORAGE_OPERATION_COLUMNS]),
+                plot_job(plot_supply_over_price,
+                         plot_dir + 'el_supply_over_price_{0}.png'.format(
+                             variation_nr),
+                         style='ggplot', el_price=el_price,
+                         power_supply=power_supply)])
@@ -0,0 +1,153 @@
+'''
+First-order sensitivities of a single solved scenario from its optimal
+solution, duals and reduced costs (requires duals=True in the config file).
+
+Objective: the cost parameters only enter the coefficients of the objective
+function. By the envelope theorem the derivative of the optimal objective
+value with respect to such a parameter p is the derivative of the objective
+function at the optimal solution x*, i.e. sum_k dc_k/dp * x*_k.
+
+Capacities: in a linear program the optimal capacities do not change for
+small changes of the cost coefficients. The reduced cost of a component
+that is not installed is the decrease of its specific costs (ep_costs) at
+which an investment becomes worthwhile.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import os
+import numpy as np
+import pandas as pd
+import yaml
+
+from analyse import load_results
+from instrumentation import start_stages, stage
+from parameters import read_parameters
+from timeseries import read_demand, step_hours
+
+# Cost coefficients (see model_flex_chp.cost_coefficients) with the flow
+# and the result variable they are multiplied with in the objective
+# function and the parameter they are additionally multiplied with in the
+# model (None if not)
+COST_TERMS = {
+    'var_costs_gas': (('rgas', 'natural_gas'), 'flow', None),
+    'var_costs_demand_el': (('electricity', 'demand_el'), 'flow', None),
+    'var_costs_demand_th': (('heat', 'demand_th'), 'flow', None),
+    'ep_costs_CHP': (('natural_gas', 'CHP_01'), 'invest',
+                     'conv_factor_full_cond'),
+    'ep_costs_boiler': (('boiler', 'heat'), 'invest', None),
+    'ep_costs_p2h': (('P2H', 'heat'), 'invest', None),
+    'ep_costs_TES': (('storage_th', 'None'), 'invest', None),
+    'ep_costs_EES': (('storage_el', 'None'), 'invest', None)}
+
+SENSITIVITY_PARAMETERS = ['var_costs_gas', 'el_price', 'capex_CHP',
+                          'capex_boiler', 'capex_p2h', 'capex_TES',
+                          'capex_EES']
+
+
+def objective_gradient(cfg, param_value, data, results,
+                       parameters=SENSITIVITY_PARAMETERS, step=1e-4,
+                       timeincrement=1):
+    """
+    Return the derivative of the optimal objective value with respect to
+    each of the given parameters (pd.Series in € per unit of the
+    parameter). The derivatives of the cost coefficients are computed by
+    finite differences of cost_coefficients with the relative step size
+    step. Flows are weighted with the length of the time steps
+    (timeincrement in hours) like in the objective function.
+    """
+    from model_flex_chp import cost_coefficients
+
+    costs = cost_coefficients(cfg, param_value, data)
+    gradient = {}
+    for parameter in parameters:
+        h = step * abs(param_value[parameter]) or step
+        perturbed = param_value.copy()
+        perturbed[parameter] = param_value[parameter] + h
+        costs_perturbed = cost_coefficients(cfg, perturbed, data)
+
+        derivative = 0
+        for key, (flow, variable, factor) in COST_TERMS.items():
+            dc = np.atleast_1d((np.asarray(costs_perturbed[key])
+                                - np.asarray(costs[key])) / h)
+            if factor is not None:
+                dc = dc * param_value[factor]
+            if variable == 'invest':
+                x = np.atleast_1d(results[flow]['scalars']['invest'])
+            else:
+                x = results[flow]['sequences'][variable].values * timeincrement
+                if len(dc) > 1:
+                    dc = dc[:len(x)]
+            derivative += (dc * x).sum()
+        gradient[parameter] = derivative
+    return pd.Series(gradient)
+
+
+def investment_thresholds(reduced_costs, tolerance=1e-6):
+    """
+    Add the factor on the specific costs (ep_costs) of components that are
+    not installed below which an investment becomes worthwhile
+    (1 - reduced cost / ep_costs). Installed components keep their capacity
+    for small changes of the cost coefficients (NaN).
+    """
+    reduced_costs = reduced_costs.copy()
+    not_installed = ((reduced_costs['invest'] <= tolerance)
+                     & (reduced_costs['reduced_cost'] > tolerance))
+    reduced_costs['cost_factor_to_invest'] = np.where(
+        not_installed,
+        1 - reduced_costs['reduced_cost'] / reduced_costs['ep_costs'],
+        np.nan)
+    return reduced_costs
+
+
+def analyse_duals(config_path, variation_nr):
+
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+    start_stages(cfg, abs_path, variation_nr)
+
+    if cfg['price_el_quadratic']:
+        dpath = (abs_path + '/results/optimisation_results/data/'
+                            'quadratic_price_relationship/')
+    if cfg['price_el_quadratic'] == False:
+        dpath = (abs_path + '/results/optimisation_results/data/'
+                            'linear_price_relationship/')
+
+    param_value = read_parameters(cfg, abs_path, variation_nr)
+    data = read_demand(cfg, abs_path)
+    results = load_results(cfg, abs_path, variation_nr,
+                           flows=[term[0] for term in COST_TERMS.values()])
+    duals = pd.read_csv(dpath + 'duals_{0}.csv'.format(variation_nr),
+                        index_col=0)
+    reduced_costs = pd.read_csv(
+        dpath + 'reduced_costs_{0}.csv'.format(variation_nr))
+
+    with stage('analyse_duals'):
+        gradient = objective_gradient(
+            cfg, param_value, data, results,
+            timeincrement=step_hours(cfg['frequency']))
+    objective_sensitivity = pd.DataFrame({
+        'value': param_value[gradient.index],
+        'd_objective': gradient,
+        # Change of the objective value if the parameter increases by 1 %
+        'objective_change_1_percent': gradient * param_value[
+            gradient.index] * 0.01})
+    capacity_sensitivity = investment_thresholds(reduced_costs)
+
+    print('\n*** Dual analysis of scenario {} *** '.format(variation_nr))
+    print('Shadow prices of the buses in EUR/MWh:')
+    print(duals.describe().loc[['mean', 'min', 'max']])
+    print('Sensitivity of the objective value:')
+    print(objective_sensitivity)
+    print('Reduced costs of the investments:')
+    print(capacity_sensitivity)
+
+    objective_sensitivity.to_csv(
+        dpath + 'objective_sensitivity_{0}.csv'.format(variation_nr))
+    capacity_sensitivity.to_csv(
+        dpath + 'capacity_sensitivity_{0}.csv'.format(variation_nr),
+        index=False)
@@ -0,0 +1,88 @@
+'''
+Helpers to detect whether the inputs of a processing stage have changed.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import hashlib
+import json
+import os
+import numpy as np
+
+
+def hash_files(file_paths, block_size=2**20):
+    """
+    Return a sha256 hex digest of the content of all given files.
+
+    The files are read in blocks of block_size bytes, so large input files
+    (e.g. the OPSD time series) are never held in memory completely.
+    """
+    sha = hashlib.sha256()
+    for file_path in file_paths:
+        sha.update(os.path.basename(file_path).encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                sha.update(block)
+    return sha.hexdigest()
+
+
+def hash_file_path(file_path):
+    """Path of the file holding the input hash stored next to file_path."""
+    return file_path + '.sha256'
+
+
+def read_stored_hash(file_path):
+    """
+    Return the input hash stored next to file_path or None if the file or
+    its hash does not exist.
+    """
+    if not (os.path.exists(file_path)
+            and os.path.exists(hash_file_path(file_path))):
+        return None
+    with open(hash_file_path(file_path), 'r') as f:
+        return f.read().strip()
+
+
+def write_stored_hash(file_path, digest):
+    """Store the input hash next to file_path."""
+    with open(hash_file_path(file_path), 'w') as f:
+        f.write(digest)
+
+
+def load_cached_array(source_path, cache_path, build):
+    """
+    Return the data of source_path as numpy array cached in a .npy file.
+
+    build(source_path) is called to convert the source file into an array
+    if the cache does not exist yet or if the source file changed. A change
+    is detected by the modification time and size of the source file. If
+    only those changed (e.g. after copying the file) but not its content
+    hash, the cache is kept. The cached array is loaded memory-mapped.
+    """
+    meta_path = cache_path + '.json'
+    stat = os.stat(source_path)
+    meta = None
+    if os.path.exists(cache_path) and os.path.exists(meta_path):
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+
+    if meta is not None and (meta['mtime'] != stat.st_mtime
+                             or meta['size'] != stat.st_size):
+        if meta['sha256'] == hash_files([source_path]):
+            meta['mtime'] = stat.st_mtime
+            meta['size'] = stat.st_size
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+        else:
+            meta = None
+
+    if meta is None:
+        np.save(cache_path, np.asarray(build(source_path)))
+        with open(meta_path, 'w') as f:
+            json.dump({'mtime': stat.st_mtime,
+                       'size': stat.st_size,
+                       'sha256': hash_files([source_path])}, f)
+
+    return np.load(cache_path, mmap_mode='r')
@@ -20,12 +20,27 @@
     |   |   |   |-linear_price_relationship
     |   |   |   |-quadratic_price_relationship
     |   |   |-log
+    |   |   |-cache
     |   |-data_postprocessed
     |   |   |-linear_price_relationship
     |   |   |-quadratic_price_relationship
     |   |-plots
 
+    Usage (from the src directory):
 
+        python main.py                  all stages selected in the config file
+        python main.py preprocess       create the demand profiles
+        python main.py solve            solve the parameter variations
+        python main.py analyse          analyse the solved variations
+        python main.py sensitivity      analyse the parameter sweep
+        python main.py plot             render the deferred plots
+
+    The config file is experiment_config/experiment.yml unless given with
+    --config, e.g. python main.py --config my_experiment.yml analyse. solve
+    and analyse take the variations with --variations (default: the
+    variation_number with run_single_scenario=True, otherwise all).
+    oemof, pyomo and matplotlib are imported only by the stages that need
+    them.
 """
 
 __copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
@@ -33,27 +48,196 @@ __license__ = "GPLv3"
 __author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
 
 import os
-from model_flex_chp import run_model_flexchp
-from preprocessing import preprocess_timeseries
-from analyse import analyse_energy_system
-from analyse_sensitivity import analyse_sensitivity
+import sys
+# Modules shared by the models (instrumentation, results store, KPIs, ...)
+sys.path.insert(0, os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', '..', 'common')))
+
+from manifest import plan_runs, finish_runs
+from parameters import number_of_variations
+from plotting import discard_deferred, render_deferred
+from instrumentation import (reset, start_stages, stage, write_reports,
+                             force_profile, write_profile_summary)
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import logging
 import yaml
-import os
 
 
-def main():
+def init_worker(log_dir, filename_logfile):
+    """
+    Redirect the console output of a worker process into its own log file.
 
-    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+    The scenario log files written by run_model_flexchp stay untouched, the
+    worker log collects everything that is printed to the screen (e.g. the
+    analysis of the energy system) so that the output of parallel scenarios
+    is not interleaved on the terminal.
+    """
+    worker_log = os.path.join(
+        log_dir, filename_logfile + '_worker_{0}.log'.format(os.getpid()))
+    sys.stdout = open(worker_log, 'a', buffering=1)
 
-    # Select the configuration file
-    exp_cfg_file_name = 'experiment.yml'
-    config_file_path = os.path.abspath('../experiment_config/'
-                                       + exp_cfg_file_name)
-    with open(config_file_path, 'r') as ymlfile:
-        cfg = yaml.load(ymlfile)
 
-    # Directory structure that ist needed to run model and pre- and
-    # postprocessing scripts
+def solve_scenarios(config_path, scenarios, cfg,
+                    screen_level=logging.INFO, warmstart_solution=None,
+                    analyse=True):
+    """
+    Solve and analyse the given parameter variations one after another.
+
+    With reuse_model=True in the config file the model is built once and
+    only its cost coefficients are updated for each variation.
+    With warm_start=True all variations are seeded with warmstart_solution
+    or, if not given, with the solution of the first variation. With
+    analyse=False the variations are only solved. Returns the scenarios and
+    the solution used as warm start.
+    """
+    from model_flex_chp import run_model_flexchp, run_model_sweep
+
+    if cfg['run_model'] and cfg.get('reuse_model', False):
+        first_solution = run_model_sweep(
+            config_path=config_path,
+            variation_nrs=scenarios,
+            screen_level=screen_level,
+            warmstart_solution=warmstart_solution)
+        if warmstart_solution is None:
+            warmstart_solution = first_solution
+    for scenario in scenarios:
+        if cfg['run_model'] and not cfg.get('reuse_model', False):
+            print('\n*** Scenario {0}***'.format(scenario))
+            solution = run_model_flexchp(
+                config_path=config_path,
+                variation_nr=scenario,
+                screen_level=screen_level,
+                warmstart_solution=warmstart_solution)
+            if warmstart_solution is None:
+                warmstart_solution = solution
+        if cfg['run_postprocessing'] and analyse:
+            analyse_variations(config_path, cfg, [scenario])
+        print('')
+    return scenarios, warmstart_solution
+
+
+def solve_scenarios_parallel(config_path, cfg, scenarios, log_dir,
+                             analyse=True):
+    """
+    Solve the parameter variations in separate worker processes.
+
+    With reuse_model=True the variations are split into one chunk per worker
+    and each worker reuses its model within its chunk, otherwise every
+    variation is submitted on its own. With warm_start=True the first
+    scenario (the base scenario) is solved before all others, which are
+    then seeded with its solution.
+    The results are collected in the order of the scenario numbers (not in
+    the order the workers finish) so that the console output and the
+    subsequent sensitivity analysis are deterministic.
+    """
+    n_workers = min(cfg['parallel_workers'], len(scenarios))
+    print('Solve {0} scenarios with {1} worker processes. Worker output is '
+          'written to {2}'.format(len(scenarios), n_workers, log_dir))
+    with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=init_worker,
+            initargs=(log_dir, cfg['filename_logfile'])) as executor:
+        finished = []
+        warmstart_solution = None
+        if cfg.get('warm_start', False) and cfg['run_model']:
+            base_scenarios, warmstart_solution = executor.submit(
+                solve_scenarios, config_path, scenarios[:1], cfg,
+                logging.WARNING, None, analyse).result()
+            finished += base_scenarios
+            scenarios = scenarios[1:]
+        if cfg.get('reuse_model', False):
+            chunks = [scenarios[i::n_workers] for i in range(n_workers)]
+        else:
+            chunks = [[scenario] for scenario in scenarios]
+        futures = [
+            executor.submit(solve_scenarios, config_path, chunk, cfg,
+                            logging.WARNING, warmstart_solution, analyse)
+            for chunk in chunks if chunk]
+        finished += [scenario for future in futures
+                     for scenario in future.result()[0]]
+        for scenario in sorted(finished):
+            print('Scenario {0} finished.'.format(scenario))
+
+
+def analyse_variations(config_path, cfg, variations):
+    """Analyse the energy system (and the duals) of the variations."""
+    from analyse import analyse_energy_system
+    from analyse_duals import analyse_duals
+
+    for variation_nr in variations:
+        analyse_energy_system(config_path=config_path,
+                              variation_nr=variation_nr)
+        if cfg.get('duals', False):
+            analyse_duals(config_path=config_path, variation_nr=variation_nr)
+
+
+def solve_variations(config_path, cfg, abs_path, variations, analyse=True):
+    """
+    Solve (and analyse) the variations, in worker processes with
+    parallel_workers > 1. With result_cache=True only variations whose
+    inputs changed are solved, the others are analysed from the existing or
+    cached results.
+    """
+    if cfg['run_model'] and cfg.get('result_cache', False):
+        to_solve, plan = plan_runs(cfg, abs_path, variations)
+    else:
+        to_solve, plan = variations, None
+    if cfg.get('parallel_workers', 1) > 1 and len(to_solve) > 1:
+        solve_scenarios_parallel(config_path, cfg, to_solve,
+                                 log_dir=abs_path
+                                 + '/results/optimisation_results/log/',
+                                 analyse=analyse and plan is None)
+    else:
+        solve_scenarios(config_path, to_solve, cfg,
+                        analyse=analyse and plan is None)
+    if plan is not None:
+        finish_runs(cfg, abs_path, plan)
+        if analyse and cfg['run_postprocessing']:
+            analyse_variations(config_path, cfg, variations)
+
+
+def preprocess(config_path, force=False):
+    """Create the demand profiles (skipped if the input data is unchanged)."""
+    from preprocessing import preprocess_timeseries
+
+    with stage('preprocessing'):
+        preprocess_timeseries(config_path=config_path, force=force)
+
+
+def sensitivity(config_path, cfg, abs_path):
+    """Compare the key figures of the parameter variations."""
+    from analyse_sensitivity import analyse_sensitivity
+
+    start_stages(cfg, abs_path)
+    with stage('sensitivity'):
+        analyse_sensitivity(config_path=config_path)
+
+
+def plot(cfg, abs_path):
+    """Render the plots deferred by the previous stages (plots='deferred')."""
+    start_stages(cfg, abs_path)
+    with stage('plots'):
+        render_deferred(cfg, abs_path)
+
+
+def selected_variations(cfg, abs_path, variations=None):
+    """
+    The given variations, otherwise variation_number with
+    run_single_scenario=True or all variations of the sweep.
+    """
+    if variations:
+        return variations
+    if cfg['run_single_scenario']:
+        return [cfg['variation_number']]
+    return list(range(number_of_variations(cfg, abs_path)))
+
+
+def create_directories(abs_path):
+    """
+    Create the directory structure that ist needed to run model and pre-
+    and postprocessing scripts (see module docstring).
+    """
     data_prepr_dir = (abs_path + '/data_preprocessed/')
     data_confident_dir = (abs_path + '/data_raw/data_confidential/')
     data_public_dir = (abs_path + '/data_raw/data_public/')
@@ -66,6 +250,7 @@ def main():
     results_dumps_quad_dir = (abs_path + '/results/optimisation_results/dumps/'
                                          'quadratic_price_relationship/')
     results_log_dir = (abs_path + '/results/optimisation_results/log/')
+    results_cache_dir = (abs_path + '/results/optimisation_results/cache/')
     results_postprocess_lin_dir = (abs_path + '/results/data_postprocessed/'
                                               'linear_price_relationship/')
     results_postprocess_quad_dir = (abs_path + '/results/data_postprocessed/'
@@ -82,6 +267,7 @@ def main():
                         results_dumps_lin_dir,
                         results_dumps_quad_dir,
                         results_log_dir,
+                        results_cache_dir,
                         results_postprocess_lin_dir,
                         results_postprocess_quad_dir,
                         results_plots_lin_dir,
@@ -97,37 +283,108 @@ def main():
 
     print("***Directory structure checked and fully established.***\n")
 
+
+def run_all(config_file_path, cfg, abs_path):
+    """Run the stages selected in the config file."""
+    # Plots deferred by an interrupted run are outdated
+    discard_deferred(abs_path)
+
     # Depending on the settings made in the config-file a single scenario will
     # be solved (which one has to be selected in the config-file as well) or
     # the full range of parameter variations will be solved.
     if cfg['run_single_scenario']:
         if cfg['run_preprocessing']:
-            preprocess_timeseries(config_path=config_file_path)
+            preprocess(config_file_path)
         if cfg['run_model']:
+            from model_flex_chp import run_model_flexchp
             run_model_flexchp(
                 config_path=config_file_path,
                 variation_nr=cfg['variation_number'])
         if cfg['run_postprocessing']:
-            analyse_energy_system(
-                config_path=config_file_path,
-                variation_nr=cfg['variation_number'])
+            analyse_variations(config_file_path, cfg,
+                               [cfg['variation_number']])
     else:
-        scenarios = range(len(cfg['parameter_variation']))
-        for scenario in scenarios:
-            if cfg['run_preprocessing']:
-                preprocess_timeseries(config_path=config_file_path)
-            if cfg['run_model']:
-                print('\n*** Scenario {0}***'.format(scenario))
-                run_model_flexchp(
-                    config_path=config_file_path,
-                    variation_nr=scenario)
-            if cfg['run_postprocessing']:
-                analyse_energy_system(
-                    config_path=config_file_path,
-                    variation_nr=scenario)
-            print('')
+        # The base scenario (0) is solved first, it is used as warm start
+        # for all other variations if warm_start=True.
+        scenarios = list(range(number_of_variations(cfg, abs_path)))
+        # The demand time series are the same for all parameter variations,
+        # hence preprocessing is run only once per sweep.
+        if cfg['run_preprocessing']:
+            preprocess(config_file_path)
+        if cfg.get('tipping_point_search', False):
+            # Bisect a single parameter instead of solving the variations
+            from tipping_point import find_tipping_point
+            find_tipping_point(config_path=config_file_path)
+            return
+        solve_variations(config_file_path, cfg, abs_path, scenarios)
         if cfg['run_postprocessing']:
-            analyse_sensitivity(config_path=config_file_path)
+            sensitivity(config_file_path, cfg, abs_path)
+
+    # With plots='deferred' the plots of all stages are rendered at the end
+    plot(cfg, abs_path)
+
+
+def main(argv=None):
+    """
+    Run a stage (see module docstring) or all stages selected in the config
+    file. With --profile all stages are profiled (see instrumentation.py)
+    regardless of the config file.
+    """
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+
+    parser = argparse.ArgumentParser(
+        description='System optimisation of an extended CHP plant.')
+    parser.add_argument('--config',
+                        default=abs_path + '/experiment_config/experiment.yml',
+                        help='config file of the experiment')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile each stage with cProfile')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    preprocess_parser = commands.add_parser(
+        'preprocess', help='create the demand profiles')
+    preprocess_parser.add_argument(
+        '--force', action='store_true',
+        help='run even if the input data did not change')
+    for name, text in [('solve', 'solve the parameter variations'),
+                       ('analyse', 'analyse the solved variations')]:
+        commands.add_parser(name, help=text).add_argument(
+            '--variations', nargs='+', type=int,
+            help='numbers of the parameter variations')
+    commands.add_parser('sensitivity', help='analyse the parameter sweep')
+    commands.add_parser('plot', help='render the deferred plots')
+    args = parser.parse_args(argv)
+
+    config_file_path = os.path.abspath(args.config)
+    with open(config_file_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    create_directories(abs_path)
+    if args.profile:
+        force_profile()
+    # Stages are recorded from here on with metrics=True
+    reset(cfg, abs_path)
+    start_stages(cfg, abs_path)
+
+    if args.command is None:
+        run_all(config_file_path, cfg, abs_path)
+    elif args.command == 'preprocess':
+        preprocess(config_file_path, force=args.force)
+    elif args.command == 'solve':
+        solve_variations(config_file_path, dict(cfg, run_model=True),
+                         abs_path, selected_variations(
+                             cfg, abs_path, args.variations),
+                         analyse=False)
+    elif args.command == 'analyse':
+        analyse_variations(config_file_path, cfg, selected_variations(
+            cfg, abs_path, args.variations))
+    elif args.command == 'sensitivity':
+        sensitivity(config_file_path, cfg, abs_path)
+    elif args.command == 'plot':
+        plot(cfg, abs_path)
+
+    write_reports(cfg, abs_path)
+    write_profile_summary(cfg, abs_path)
 
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+'''
+Run manifest and result cache of the parameter variations.
+
+For each variation a hash of its inputs (merged parameter table, demand time
+series, settings that change the results, the results extracted from the
+model and source code of the model) is
+recorded in run_manifest.json next to the dumps. Variations whose results
+exist for the same hash are not solved again. Variations with identical
+inputs are solved only once. Results are additionally kept in a cache
+directory (results/optimisation_results/cache/<hash>/) with a size budget,
+the least recently used entries are evicted first.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from analyse import ANALYSED_FLOWS, ANALYSED_BUSES
+from caching import hash_files
+from parameters import read_parameters, read_variations
+
+# Settings of the config file that change the results of a variation
+RESULT_SETTINGS = ['debug', 'solver', 'solver_interface', 'price_el_quadratic',
+                   'typical_days', 'start_date', 'frequency',
+                   'results_format', 'duals', 'number_of_time_steps',
+                   'demand_frequency', 'resample_method',
+                   'results_extraction']
+
+# Source files of the model, in src and in the directory of the modules
+# shared by the models
+MODEL_SOURCES = ['model_flex_chp.py', 'parameters.py', 'aggregation.py']
+COMMON_SOURCES = ['results_store.py', 'timeseries.py', 'extraction.py']
+
+# Files holding the results of a variation (suffixes to
+# '<filename_dumb>_scenario_<nr>') for each results format
+RESULT_SUFFIXES = {'oemof': ['.oemof'],
+                   'parquet': ['_sequences.parquet', '_scalars.csv']}
+
+
+def dumps_dir(cfg, abs_path):
+    if cfg['price_el_quadratic']:
+        return (abs_path + "/results/optimisation_results/dumps/"
+                           "quadratic_price_relationship")
+    return (abs_path + "/results/optimisation_results/dumps/"
+                       "linear_price_relationship")
+
+
+def cache_dir(abs_path):
+    return abs_path + "/results/optimisation_results/cache"
+
+
+def result_files(cfg, abs_path, variation_nr):
+    """
+    Paths of the result files of a variation (by suffix), including the
+    duals and reduced costs with duals=True.
+    """
+    filename = cfg['filename_dumb'] + '_scenario_{0}'.format(variation_nr)
+    files = {suffix: os.path.join(dumps_dir(cfg, abs_path), filename + suffix)
+             for suffix in RESULT_SUFFIXES[cfg.get('results_format', 'oemof')]}
+    if cfg.get('duals', False):
+        data_dir = dumps_dir(cfg, abs_path).replace('/dumps/', '/data/')
+        for name in ['duals', 'reduced_costs']:
+            files['_' + name + '.csv'] = os.path.join(
+                data_dir, name + '_{0}.csv'.format(variation_nr))
+    return files
+
+
+def input_hash(cfg, abs_path, variation_nr):
+    """Return the sha256 hex digest of the inputs of a variation."""
+    sha = hashlib.sha256()
+    param_value = read_parameters(cfg, abs_path, variation_nr)
+    sha.update(param_value.sort_index().to_csv().encode('utf-8'))
+    sha.update(hash_files([abs_path + cfg['demand_time_series']]).encode())
+    sha.update(json.dumps({key: cfg.get(key) for key in RESULT_SETTINGS},
+                          sort_keys=True).encode('utf-8'))
+    if cfg.get('results_extraction', 'selected') != 'full':
+        sha.update(json.dumps([ANALYSED_FLOWS, ANALYSED_BUSES]).encode())
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    common_dir = os.path.join(src_dir, '..', '..', 'common')
+    sha.update(hash_files([os.path.join(src_dir, f) for f in MODEL_SOURCES]
+                          + [os.path.join(common_dir, f)
+                             for f in COMMON_SOURCES]).encode())
+    return sha.hexdigest()
+
+
+def read_json(file_path):
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+
+def write_json(file_path, content):
+    with open(file_path, 'w') as f:
+        json.dump(content, f, indent=2, sort_keys=True)
+
+
+def plan_runs(cfg, abs_path, variation_nrs):
+    """
+    Decide which variations have to be solved.
+
+    Results of variations whose inputs did not change are kept, results
+    found in the cache are copied to the dumps. Of several variations with
+    identical inputs only the first one is solved.
+
+    Returns the variations to solve and the plan (dict variation_nr ->
+    {'hash', 'status', 'source'}) needed by finish_runs.
+    """
+    manifest = read_json(os.path.join(dumps_dir(cfg, abs_path),
+                                      'run_manifest.json'))
+    index = read_json(os.path.join(cache_dir(abs_path), 'index.json'))
+
+    plan = {}
+    first_of_hash = {}
+    for variation_nr in variation_nrs:
+        digest = input_hash(cfg, abs_path, variation_nr)
+        files = result_files(cfg, abs_path, variation_nr)
+        entry = manifest.get(str(variation_nr), {})
+        if (entry.get('hash') == digest
+                and all(os.path.exists(f) for f in files.values())):
+            status, source = 'unchanged', None
+        elif digest in index:
+            for suffix, file_path in files.items():
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                shutil.copyfile(os.path.join(cache_dir(abs_path), digest,
+                                             'results' + suffix), file_path)
+            status, source = 'cached', None
+        elif digest in first_of_hash:
+            status, source = 'duplicate', first_of_hash[digest]
+        else:
+            status, source = 'solve', None
+        if status != 'duplicate':
+            first_of_hash.setdefault(digest, variation_nr)
+        if digest in index:
+            index[digest]['last_used'] = time.time()
+        plan[variation_nr] = {'hash': digest, 'status': status,
+                              'source': source}
+        print('Scenario {0}: {1}{2}'.format(
+            variation_nr, status,
+            '' if source is None else ' of scenario {0}'.format(source)))
+
+    if index:
+        write_json(os.path.join(cache_dir(abs_path), 'index.json'), index)
+
+    return [nr for nr in variation_nrs if plan[nr]['status'] == 'solve'], plan
+
+
+def finish_runs(cfg, abs_path, plan):
+    """
+    Copy the results of the solved variations to their duplicates and into
+    the cache, evict least recently used cache entries exceeding the size
+    budget (result_cache_size_mb) and write the run manifest.
+    """
+    os.makedirs(cache_dir(abs_path), exist_ok=True)
+    index_path = os.path.join(cache_dir(abs_path), 'index.json')
+    index = read_json(index_path)
+
+    for variation_nr, entry in plan.items():
+        files = result_files(cfg, abs_path, variation_nr)
+        if entry['status'] == 'duplicate':
+            source_files = result_files(cfg, abs_path, entry['source'])
+            for suffix, file_path in files.items():
+                shutil.copyfile(source_files[suffix], file_path)
+        if entry['status'] == 'solve':
+            entry_dir = os.path.join(cache_dir(abs_path), entry['hash'])
+            os.makedirs(entry_dir, exist_ok=True)
+            for suffix, file_path in files.items():
+                shutil.copyfile(file_path,
+                                os.path.join(entry_dir, 'results' + suffix))
+            index[entry['hash']] = {
+                'last_used': time.time(),
+                'size': sum(os.path.getsize(f) for f in files.values())}
+
+    budget = cfg.get('result_cache_size_mb', 1000) * 2**20
+    total = sum(entry['size'] for entry in index.values())
+    for digest in sorted(index, key=lambda d: index[d]['last_used']):
+        if total <= budget:
+            break
+        print('Evict results {0} from the cache.'.format(digest))
+        shutil.rmtree(os.path.join(cache_dir(abs_path), digest),
+                      ignore_errors=True)
+        total -= index.pop(digest)['size']
+
+    write_json(index_path, index)
+
+    manifest_path = os.path.join(dumps_dir(cfg, abs_path),
+                                 'run_manifest.json')
+    manifest = read_json(manifest_path)
+    variations = read_variations(cfg, abs_path)
+    for variation_nr, entry in plan.items():
+        manifest[str(variation_nr)] = {
+            'hash': entry['hash'],
+            'parameters': variations.loc[variation_nr].dropna().to_dict(),
+            'status': entry['status']}
+    write_json(manifest_path, manifest)
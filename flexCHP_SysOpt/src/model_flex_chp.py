@@ -65,60 +65,98 @@ from oemof.tools import helpers
 
 import oemof.solph as solph
 from oemof.solph.components import ExtractionTurbineCHP
+from oemof.solph.plumbing import sequence
 import oemof.outputlib as outputlib
 import oemof.tools.economics as economics
+from pyomo.opt import SolverFactory
+from pyomo.core.base.var import Var
+
+from parameters import read_parameters, only_costs_differ
+from aggregation import (aggregate_typical_days, objective_weighting,
+                         add_typical_day_storage_constraints,
+                         add_weighted_flow_limits, storage_levels,
+                         without_storage_levels,
+                         disaggregate_results, compare_investments,
+                         typical_steps)
+from results_store import write_results
+from extraction import extraction_mode, extract_results
+from analyse import ANALYSED_FLOWS, ANALYSED_BUSES
+from timeseries import read_demand, time_index, step_hours
+from instrumentation import start_stages, stage, record, record_model_size
 
 import logging
 import os
+import time
 import pandas as pd
 import yaml  # pip install pyyaml
 
+# Buses whose balance duals (shadow prices) are stored with duals=True
+DUAL_BUSES = ['electricity', 'heat', 'natural_gas']
 
-def run_model_flexchp(config_path, variation_nr):
 
-    with open(config_path, 'r') as ymlfile:
-        cfg = yaml.load(ymlfile)
+def cost_coefficients(cfg, param_value, data):
+    """
+    Return the coefficients of the objective function that depend on the
+    (varied) parameters of the energy system.
+    """
+    costs = {}
 
-    if cfg['debug']:
-        number_of_time_steps = 3
-    else:
-        number_of_time_steps = 8760
+    costs['var_costs_gas'] = (param_value['var_costs_gas']
+                              * param_value['gas_price_variation'])
 
-    solver = cfg['solver']
-    debug = cfg['debug']
-    solver_verbose = cfg['solver_verbose']  # show/hide solver output
+    if cfg['price_el_quadratic'] == True:
+        costs['var_costs_demand_el'] = (param_value['el_price']
+                                        * param_value['price_factor_sqr']
+                                        * param_value['el_price_variation']
+                                        * data['demand_el']**2)
+    if cfg['price_el_quadratic'] == False:
+        costs['var_costs_demand_el'] = (param_value['el_price']
+                                        * param_value['el_price_variation']
+                                        * data['demand_el'])
 
-    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+    costs['var_costs_demand_th'] = (- param_value['var_costs_gas']
+                                    / param_value['conversion_factor_boiler'])
 
-    # initiate the logger (see the API docs for more information)
-    logger.define_logging(logpath=(abs_path
-                                   + '/results/optimisation_results/log/'),
-                          logfile=(cfg['filename_logfile']+'_scenario_{0}.log'.
-                                   format(variation_nr)),
-                          screen_level=logging.INFO,
-                          file_level=logging.DEBUG)
+    # Annuities per installed unit of power [€/MW] or capacity [€/MWh]
+    costs['ep_costs_CHP'] = economics.annuity(
+        capex=param_value['capex_CHP'],
+        n=param_value['lifetime_CHP'],
+        wacc=param_value['wacc_CHP'])
+    costs['ep_costs_boiler'] = economics.annuity(
+        capex=param_value['capex_boiler'],
+        n=param_value['lifetime_boiler'],
+        wacc=param_value['wacc_boiler'])
+    costs['ep_costs_p2h'] = economics.annuity(
+        capex=param_value['capex_p2h'],
+        n=param_value['lifetime_p2h'],
+        wacc=param_value['wacc_p2h'])
+    costs['ep_costs_TES'] = economics.annuity(
+        capex=(param_value['capex_TES']*param_value['TES_capex_variation']),
+        n=param_value['lifetime_TES'],
+        wacc=param_value['wacc_TES'])
+    costs['ep_costs_EES'] = economics.annuity(
+        capex=param_value['capex_EES']*param_value['EES_capex_variation'],
+        n=param_value['lifetime_EES'],
+        wacc=param_value['wacc_EES'])
 
-    logging.info('Use parameters for scenario {0}'.format(variation_nr))
-    logging.info('Initialize the energy system')
-    date_time_index = pd.date_range(cfg['start_date'],
-                                    periods=number_of_time_steps,
-                                    freq=cfg['frequency'])
+    return costs
 
-    energysystem = solph.EnergySystem(timeindex=date_time_index)
 
-    ##########################################################################
-    # Read time series and parameter values from data files
-    ##########################################################################
+def loss_per_step(loss_per_hour, hours):
+    """Relative storage loss of a time step of the given length in hours."""
+    return 1 - (1 - loss_per_hour) ** hours
+
 
-    file_path_demand_ts = abs_path + cfg['demand_time_series']
-    data = pd.read_csv(file_path_demand_ts)
+def create_energysystem(cfg, param_value, data, date_time_index):
+    """
+    Create the energy system with all its components. Flows and costs are
+    weighted with the length of the time steps by oemof, the storage losses
+    (given per hour) are converted to the length of the time steps here.
+    """
 
-    file_path_param_01 = abs_path + cfg['parameters_energy_system']
-    file_path_param_02 = abs_path + cfg['parameter_variation'][variation_nr]
-    param_df_01 = pd.read_csv(file_path_param_01, index_col=1)
-    param_df_02 = pd.read_csv(file_path_param_02, index_col=1)
-    param_df = pd.concat([param_df_01, param_df_02], sort=True)
-    param_value = param_df['value']
+    energysystem = solph.EnergySystem(timeindex=date_time_index)
+    costs = cost_coefficients(cfg, param_value, data)
+    hours = step_hours(date_time_index.freq)
 
     ##########################################################################
     # Create oemof object
@@ -159,43 +197,28 @@ def run_model_flexchp(config_path, variation_nr):
          outputs={bgas: solph.Flow(
              nominal_value=param_value['nom_val_gas'],
              summed_max=param_value['sum_max_gas'],
-             variable_costs=(param_value['var_costs_gas']
-                             * param_value['gas_price_variation']))}))
+             variable_costs=costs['var_costs_gas'])}))
 
     energysystem.add(solph.Source(
         label='residual_el',
         outputs={bel_residual: solph.Flow(
-            actual_value=data['neg_residual_el'],
+            actual_value=data['neg_residual_el'].values,
             nominal_value=param_value['nom_val_neg_residual'],
             fixed=True)}))
 
-    if cfg['price_el_quadratic'] == True:
-        energysystem.add(solph.Sink(
-            label='demand_el',
-            inputs={bel: solph.Flow(
-                variable_costs=(param_value['el_price']
-                                * param_value['price_factor_sqr']
-                                * param_value['el_price_variation']
-                                * data['demand_el']**2),
-                nominal_value=8000)}))
-
-    if cfg['price_el_quadratic'] == False:
-        energysystem.add(solph.Sink(
-            label='demand_el',
-            inputs={bel: solph.Flow(
-                variable_costs=(param_value['el_price']
-                                * param_value['el_price_variation']
-                                * data['demand_el']),
-                nominal_value=8000)}))
+    energysystem.add(solph.Sink(
+        label='demand_el',
+        inputs={bel: solph.Flow(
+            variable_costs=costs['var_costs_demand_el'],
+            nominal_value=8000)}))
 
     energysystem.add(solph.Sink(
         label='demand_th',
         inputs={bth: solph.Flow(
-            actual_value=data['demand_th'],
+            actual_value=data['demand_th'].values,
             nominal_value=param_value['nom_val_demand_th'],
             fixed=True,
-            variable_costs=(- param_value['var_costs_gas']
-                            / param_value['conversion_factor_boiler']))}))
+            variable_costs=costs['var_costs_demand_th'])}))
 
     # Auxiliary component to prevent CHP electricity being used in P2H (not
     # representing a physical component!)
@@ -207,18 +230,12 @@ def run_model_flexchp(config_path, variation_nr):
         conversion_factors={bel: 1}))
 
     # Combined Heat and Power Plant (CHP)
-    # Calculate annuity per installed unit of power [€/MW]
-    ep_costs_CHP = economics.annuity(
-        capex=param_value['capex_CHP'],
-        n=param_value['lifetime_CHP'],
-        wacc=param_value['wacc_CHP'])
-
-    # Add CHP with its technical specifications to the energy system
     energysystem.add(ExtractionTurbineCHP(
         label='CHP_01',
         inputs={bgas: solph.Flow(
             investment=solph.Investment(
-                ep_costs=(ep_costs_CHP*param_value['conv_factor_full_cond']),
+                ep_costs=(costs['ep_costs_CHP']
+                          * param_value['conv_factor_full_cond']),
                 maximum=1667))},
         outputs={
             bel: solph.Flow(),
@@ -230,41 +247,26 @@ def run_model_flexchp(config_path, variation_nr):
             bel: param_value['conv_factor_full_cond']}))
 
     # Peak load gas boiler
-    # Calculate annuity per installed unit of power [€/MW]
-    ep_costs_boiler = economics.annuity(
-        capex=param_value['capex_boiler'],
-        n=param_value['lifetime_boiler'],
-        wacc=param_value['wacc_boiler'])
-
-    # Add boiler with its technical specifications to the energy system
     energysystem.add(solph.Transformer(
         label='boiler',
         inputs={bgas: solph.Flow()},
         outputs={bth: solph.Flow(investment=solph.Investment(
-            ep_costs=ep_costs_boiler))},
+            ep_costs=costs['ep_costs_boiler']))},
         conversion_factors={bth: param_value['conversion_factor_boiler']}))
 
-    ep_costs_p2h = economics.annuity(
-        capex=param_value['capex_p2h'],
-        n=param_value['lifetime_p2h'],
-        wacc=param_value['wacc_p2h'])
-
     energysystem.add(solph.Transformer(
         label='P2H',
         inputs={bel_residual: solph.Flow()},
         outputs={bth: solph.Flow(investment=solph.Investment(
-            ep_costs=ep_costs_p2h))},
+            ep_costs=costs['ep_costs_p2h']))},
         conversion_factors={bth: param_value['conversion_factor_p2h']}))
 
-    ep_costs_TES = economics.annuity(
-        capex=(param_value['capex_TES']*param_value['TES_capex_variation']),
-        n=param_value['lifetime_TES'],
-        wacc=param_value['wacc_TES'])
     storage_th = solph.components.GenericStorage(
         label='storage_th',
         inputs={bth: solph.Flow()},
         outputs={bth: solph.Flow()},
-        capacity_loss=param_value['capacity_loss_storage_th'],
+        capacity_loss=loss_per_step(
+            param_value['capacity_loss_storage_th'], hours),
         initial_capacity=param_value['init_capacity_storage_th'],
         inflow_conversion_factor=param_value['inflow_conv_factor_storage_th'],
         outflow_conversion_factor=param_value[
@@ -273,19 +275,15 @@ def run_model_flexchp(config_path, variation_nr):
             'charging_time_storage_th'],
         invest_relation_output_capacity=1/param_value[
             'charging_time_storage_th'],
-        investment=solph.Investment(ep_costs=ep_costs_TES))
+        investment=solph.Investment(ep_costs=costs['ep_costs_TES']))
     energysystem.add(storage_th)
 
-    ep_costs_EES = economics.annuity(
-        capex=param_value['capex_EES']*param_value['EES_capex_variation'],
-        n=param_value['lifetime_EES'],
-        wacc=param_value['wacc_EES'])
-
     storage_el = solph.components.GenericStorage(
         label='storage_el',
         inputs={bel: solph.Flow()},
         outputs={bel: solph.Flow()},
-        capacity_loss=param_value['capacity_loss_storage_el'],
+        capacity_loss=loss_per_step(
+            param_value['capacity_loss_storage_el'], hours),
         initial_capacity=param_value['init_capacity_storage_el'],
         inflow_conversion_factor=param_value['inflow_conv_factor_storage_el'],
         outflow_conversion_factor=param_value[
@@ -294,16 +292,359 @@ def run_model_flexchp(config_path, variation_nr):
             'charging_time_storage_el'],
         invest_relation_output_capacity=1 / param_value[
             'charging_time_storage_el'],
-        investment=solph.Investment(ep_costs=ep_costs_EES))
+        investment=solph.Investment(ep_costs=costs['ep_costs_EES']))
     energysystem.add(storage_el)
 
+    return energysystem
+
+
+def update_cost_coefficients(model, cfg, param_value, data):
+    """
+    Write the cost coefficients of param_value into the components of an
+    existing model and rebuild its objective function. The constraints of
+    the model are left untouched.
+    """
+    costs = cost_coefficients(cfg, param_value, data)
+    nodes = model.es.groups
+
+    nodes['excess_bel'].inputs[nodes['electricity']].variable_costs = (
+        sequence(param_value['var_costs_excess_bel']))
+    nodes['excess_bth'].inputs[nodes['heat']].variable_costs = (
+        sequence(param_value['var_costs_excess_bth']))
+    nodes['shortage_bel'].outputs[nodes['electricity']].variable_costs = (
+        sequence(param_value['var_costs_shortage_bel']))
+    nodes['shortage_bth'].outputs[nodes['heat']].variable_costs = (
+        sequence(param_value['var_costs_shortage_bth']))
+    nodes['rgas'].outputs[nodes['natural_gas']].variable_costs = (
+        sequence(costs['var_costs_gas']))
+    nodes['demand_el'].inputs[nodes['electricity']].variable_costs = (
+        sequence(costs['var_costs_demand_el']))
+    nodes['demand_th'].inputs[nodes['heat']].variable_costs = (
+        sequence(costs['var_costs_demand_th']))
+
+    nodes['CHP_01'].inputs[nodes['natural_gas']].investment.ep_costs = (
+        costs['ep_costs_CHP'] * param_value['conv_factor_full_cond'])
+    nodes['boiler'].outputs[nodes['heat']].investment.ep_costs = (
+        costs['ep_costs_boiler'])
+    nodes['P2H'].outputs[nodes['heat']].investment.ep_costs = (
+        costs['ep_costs_p2h'])
+    nodes['storage_th'].investment.ep_costs = costs['ep_costs_TES']
+    nodes['storage_el'].investment.ep_costs = costs['ep_costs_EES']
+
+    # The investment blocks store their cost expression as a component when
+    # the objective is built, remove them before building it again.
+    for block in [model.InvestmentFlow, model.GenericInvestmentStorageBlock]:
+        block.del_component('investment_costs')
+    model._add_objective(update=True)
+
+
+def get_solution(model):
+    """
+    Return the primal values of all free variables of a solved model keyed
+    by the variable names. The names are identical for models of the same
+    energy system, so the solution can be used as warm start for a model of
+    another parameter variation (see set_solution).
+    """
+    return {v.name: v.value
+            for v in model.component_data_objects(Var)
+            if not v.fixed and v.value is not None}
+
+
+def set_solution(model, solution):
+    """Set the values of the free variables of model as warm start."""
+    for v in model.component_data_objects(Var):
+        if not v.fixed and v.name in solution:
+            v.value = solution[v.name]
+
+
+def iteration_count(solver_results):
+    """Number of solver iterations if reported by the solver, else None."""
+    try:
+        iterations = (solver_results.solver.statistics.black_box.
+                      number_of_iterations)
+    except AttributeError:
+        return None
+    if str(iterations) == '<undefined>':
+        return None
+    return iterations
+
+
+def create_solver(cfg, model):
+    """
+    Return a solver interface that is kept alive between solves of model or
+    None if the model is solved via oemof, i.e. by writing an lp-file and
+    calling the solver executable.
+
+    solver_interface='direct' hands the model to HiGHS in the same process
+    (pyomo 'appsi_highs', requires the highspy package) and reads the
+    solution back without any file I/O. persistent_solver=True uses the
+    persistent pyomo interface '<solver>_persistent'.
+    """
+    if cfg.get('solver_interface', 'lp') == 'direct':
+        return SolverFactory('appsi_highs')
+    if cfg.get('persistent_solver', False):
+        opt = SolverFactory(cfg['solver'] + '_persistent')
+        opt.set_instance(model)
+        return opt
+    return None
+
+
+def solve_model(model, cfg, opt=None, warmstart=False):
+    """
+    Solve the model and store the solver results in the energy system.
+
+    opt is a solver interface created by create_solver. A persistent
+    interface keeps the model instance and only the objective function is
+    updated, the direct (in-memory) interface detects changes of the model
+    itself and restarts from the previous basis.
+    With warmstart=True the current values of the variables are passed to
+    the solver as starting point if the solver supports warm starts. The
+    direct interface takes no starting point.
+    """
+    direct = cfg.get('solver_interface', 'lp') == 'direct'
+
+    if direct:
+        warmstart = False
+    if warmstart:
+        warmstart = (opt or SolverFactory(cfg['solver'])).warm_start_capable()
+        if not warmstart:
+            logging.warning('Solver {0} does not support warm starts, solve '
+                            'from scratch.'.format(cfg['solver']))
+
+    with stage('solve'):
+        if opt is None:
+            solve_kwargs = {'tee': cfg['solver_verbose']}
+            if warmstart:
+                solve_kwargs['warmstart'] = True
+            solver_results = model.solve(solver=cfg['solver'],
+                                         solve_kwargs=solve_kwargs)
+        elif direct:
+            solver_results = opt.solve(model, tee=cfg['solver_verbose'])
+            model.es.results = solver_results
+        else:
+            opt.set_objective(model.objective)
+            solver_results = opt.solve(
+                tee=cfg['solver_verbose'], warmstart=warmstart,
+                suffixes=['dual', 'rc'] if hasattr(model, 'dual') else [])
+            model.es.results = solver_results
+
+    logging.info('Solved {0} warm start, solver iterations: {1}'.format(
+        'with' if warmstart else 'without', iteration_count(solver_results)))
+    return solver_results
+
+
+def build_model(cfg, param_value, data, date_time_index):
+    """
+    Create the energy system and the optimization model.
+
+    With typical_days > 0 in the config file the demand time series are
+    aggregated into typical days (see aggregation.py). The model then only
+    covers the typical days, which are weighted in the objective function and
+    in the summed flow limits (e.g. of the natural gas) by the number of days
+    they represent. The storage levels are linked across the days of the
+    full horizon.
+
+    With duals=True in the config file the model requests the duals and
+    reduced costs from the solver (see store_duals).
+
+    Returns the model and the aggregation (None without aggregation).
+    """
+    if not cfg.get('typical_days', 0):
+        with stage('energysystem'):
+            energysystem = create_energysystem(cfg, param_value, data,
+                                               date_time_index)
+        with stage('model'):
+            model = solph.Model(energysystem)
+            if cfg.get('duals', False):
+                model.receive_duals()
+        return model, None
+
+    logging.info('Aggregate time series into {0} typical days'.format(
+        cfg['typical_days']))
+    with stage('aggregation'):
+        aggregation = aggregate_typical_days(
+            data.iloc[:len(date_time_index)], cfg['typical_days'],
+            steps_per_day=int(round(24 / step_hours(date_time_index.freq))))
+    typical_index = pd.date_range(date_time_index[0],
+                                  periods=len(aggregation['data']),
+                                  freq=date_time_index.freq)
+    with stage('energysystem'):
+        energysystem = create_energysystem(cfg, param_value,
+                                           aggregation['data'], typical_index)
+    weighting = objective_weighting(
+        aggregation, timeincrement=step_hours(date_time_index.freq))
+    with stage('model'):
+        model = solph.Model(energysystem, objective_weighting=weighting)
+        add_typical_day_storage_constraints(model, aggregation)
+        add_weighted_flow_limits(model, weighting)
+        if cfg.get('duals', False):
+            model.receive_duals()
+    aggregation['timeindex'] = date_time_index
+    return model, aggregation
+
+
+def process_results(model, cfg):
+    """
+    Results of the solved model: the flows and components read by the
+    analysis or, with results_extraction='full', all (see extraction.py).
+    """
+    if extraction_mode(cfg) == 'full':
+        with without_storage_levels(model):
+            return outputlib.processing.results(model)
+    return extract_results(model, flows=ANALYSED_FLOWS, nodes=ANALYSED_BUSES)
+
+
+def store_results(model, cfg, abs_path, variation_nr, aggregation=None):
+    """
+    Process the results of the solved model and dump the energy system.
+    Results of typical days are disaggregated to the full time horizon.
+
+    The time index of the energy system of the model is left at the typical
+    days, the model is solved again for further variations of a sweep
+    (reuse_model=True). Only the dump covers the full horizon.
+    """
+
+    energysystem = model.es
+
+    logging.info('Store the energy system with the results.')
+
+    with stage('processing'):
+        energysystem.results['main'] = process_results(model, cfg)
+        if aggregation is not None:
+            energysystem.results['main'] = disaggregate_results(
+                energysystem.results['main'], aggregation,
+                aggregation['timeindex'],
+                levels=storage_levels(model, aggregation))
+        energysystem.results['meta'] = outputlib.processing.meta_results(
+            model)
+
+    if cfg['price_el_quadratic']:
+        dpath = (abs_path + "/results/optimisation_results/dumps/"
+                            "quadratic_price_relationship")
+    if cfg['price_el_quadratic'] == False:
+        dpath = (abs_path + "/results/optimisation_results/dumps/"
+                            "linear_price_relationship")
+    filename = cfg['filename_dumb'] + '_scenario_{0}'.format(variation_nr)
+
+    with stage('dump'):
+        if cfg.get('results_format', 'oemof') == 'parquet':
+            write_results(energysystem.results['main'], dpath, filename)
+        else:
+            typical_index = energysystem.timeindex
+            if aggregation is not None:
+                energysystem.timeindex = aggregation['timeindex']
+            try:
+                energysystem.dump(dpath=dpath, filename=filename + '.oemof')
+            finally:
+                energysystem.timeindex = typical_index
+
+
+def store_duals(model, cfg, abs_path, variation_nr, aggregation=None):
+    """
+    Write the duals of the balance of the buses in DUAL_BUSES (shadow prices
+    in €/MWh per time step) to duals_<variation_nr>.csv and the optimal
+    value, reduced cost and specific costs (ep_costs) of the investment
+    variables to reduced_costs_<variation_nr>.csv.
+
+    The duals are divided by the length of the time steps in hours (the
+    weight of a time step in the objective function). The duals of typical
+    days are divided by their weight in the objective function and expanded
+    to the full time horizon.
+    """
+    nodes = model.es.groups
+    duals = pd.DataFrame({
+        label: [model.dual[model.Bus.balance[nodes[label], t]]
+                for t in model.TIMESTEPS]
+        for label in DUAL_BUSES})
+    if aggregation is None:
+        duals = duals / step_hours(model.es.timeindex.freq)
+        duals.index = model.es.timeindex
+    else:
+        timeindex = aggregation['timeindex']
+        duals = duals.div(objective_weighting(
+            aggregation, timeincrement=step_hours(timeindex.freq)), axis=0)
+        duals = duals.iloc[typical_steps(aggregation, len(timeindex))]
+        duals.index = timeindex
+
+    reduced_costs = []
+    if hasattr(model, 'InvestmentFlow'):
+        for i, o in model.InvestmentFlow.FLOWS:
+            variable = model.InvestmentFlow.invest[i, o]
+            reduced_costs.append((str(i), str(o), variable.value,
+                                  model.rc[variable],
+                                  model.flows[i, o].investment.ep_costs))
+    if hasattr(model, 'GenericInvestmentStorageBlock'):
+        for n in model.GenericInvestmentStorageBlock.INVESTSTORAGES:
+            variable = model.GenericInvestmentStorageBlock.invest[n]
+            reduced_costs.append((str(n), 'None', variable.value,
+                                  model.rc[variable], n.investment.ep_costs))
+    reduced_costs = pd.DataFrame(
+        reduced_costs,
+        columns=['from', 'to', 'invest', 'reduced_cost', 'ep_costs'])
+
+    if cfg['price_el_quadratic']:
+        dpath = (abs_path + '/results/optimisation_results/data/'
+                            'quadratic_price_relationship/')
+    if cfg['price_el_quadratic'] == False:
+        dpath = (abs_path + '/results/optimisation_results/data/'
+                            'linear_price_relationship/')
+    duals.to_csv(dpath + 'duals_{0}.csv'.format(variation_nr))
+    reduced_costs.to_csv(dpath + 'reduced_costs_{0}.csv'.format(variation_nr),
+                         index=False)
+
+
+def define_scenario_logging(cfg, abs_path, variation_nr, screen_level):
+    """Initiate the logger (see the API docs for more information)."""
+    logger.define_logging(logpath=(abs_path
+                                   + '/results/optimisation_results/log/'),
+                          logfile=(cfg['filename_logfile']+'_scenario_{0}.log'.
+                                   format(variation_nr)),
+                          screen_level=screen_level,
+                          file_level=logging.DEBUG)
+
+
+def run_model_flexchp(config_path, variation_nr, screen_level=logging.INFO,
+                      warmstart_solution=None):
+    """
+    Build, solve and store the model of a single parameter variation.
+
+    warmstart_solution (see get_solution), e.g. the solution of the base
+    scenario, is passed to the solver as starting point. With
+    warm_start=True in the config file the solution of this variation is
+    returned, otherwise None.
+    """
+
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    debug = cfg['debug']
+
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+
+    define_scenario_logging(cfg, abs_path, variation_nr, screen_level)
+    start_stages(cfg, abs_path, variation_nr)
+
+    logging.info('Use parameters for scenario {0}'.format(variation_nr))
+    logging.info('Initialize the energy system')
+
+    ##########################################################################
+    # Read time series and parameter values from data files
+    ##########################################################################
+
+    with stage('read_data'):
+        data = read_demand(cfg, abs_path)
+        date_time_index = time_index(cfg, data)
+
+        param_value = read_parameters(cfg, abs_path, variation_nr)
+
     ##########################################################################
     # Optimise the energy system and store the results
     ##########################################################################
 
     logging.info('Optimise the energy system')
 
-    model = solph.Model(energysystem)
+    model, aggregation = build_model(cfg, param_value, data, date_time_index)
+    record_model_size(model)
 
     if debug:
         lpfile_name = 'flexCHP_scenario_{0}.lp'.format(variation_nr)
@@ -312,22 +653,129 @@ def run_model_flexchp(config_path, variation_nr):
         logging.info('Store lp-file in {0}.'.format(filename))
         model.write(filename, io_options={'symbolic_solver_labels': True})
 
+    if warmstart_solution is not None:
+        set_solution(model, warmstart_solution)
+
     logging.info('Solve the optimization problem')
-    model.solve(solver=solver, solve_kwargs={'tee': solver_verbose})
+    solve_model(model, cfg, opt=create_solver(cfg, model),
+                warmstart=warmstart_solution is not None)
+
+    store_results(model, cfg, abs_path, variation_nr, aggregation)
+    if cfg.get('duals', False):
+        with stage('duals'):
+            store_duals(model, cfg, abs_path, variation_nr, aggregation)
+
+    if aggregation is not None and cfg.get('aggregation_compare_full', False):
+        compare_with_full_resolution(model, cfg, abs_path, variation_nr,
+                                     param_value, data, date_time_index)
+
+    if cfg.get('warm_start', False):
+        return get_solution(model)
+
+
+def compare_with_full_resolution(model, cfg, abs_path, variation_nr,
+                                 param_value, data, date_time_index):
+    """
+    Solve the model without aggregation and report the error of the
+    installed capacities of the aggregated model (already solved).
+    """
+    logging.info('Solve the full resolution model for comparison')
+    full_model = solph.Model(create_energysystem(cfg, param_value, data,
+                                                 date_time_index))
+    solve_model(full_model, cfg, opt=create_solver(cfg, full_model))
+    comparison = compare_investments(
+        model.es.results['main'], process_results(full_model, cfg))
+    logging.info('Installed capacities with {0} typical days compared to '
+                 'the full resolution:\n{1}'.format(cfg['typical_days'],
+                                                     comparison))
+    if cfg['price_el_quadratic']:
+        price_relationship = 'quadratic_price_relationship'
+    else:
+        price_relationship = 'linear_price_relationship'
+    comparison.to_csv(abs_path + '/results/optimisation_results/data/'
+                      + price_relationship
+                      + '/aggregation_error_{0}.csv'.format(variation_nr))
 
-    logging.info('Store the energy system with the results.')
 
-    energysystem.results['main'] = outputlib.processing.results(model)
-    energysystem.results['meta'] = outputlib.processing.meta_results(model)
-    if cfg['price_el_quadratic']:
-        energysystem.dump(
-            dpath=(abs_path + "/results/optimisation_results/dumps/"
-                              "quadratic_price_relationship"),
-            filename=(cfg['filename_dumb']+'_scenario_{0}.oemof'.
-                      format(variation_nr)))
-    if cfg['price_el_quadratic'] == False:
-        energysystem.dump(
-            dpath=(abs_path + "/results/optimisation_results/dumps/"
-                              "linear_price_relationship"),
-            filename=(cfg['filename_dumb']+'_scenario_{0}.oemof'.format(
-                variation_nr)))
+def run_model_sweep(config_path, variation_nrs, screen_level=logging.INFO,
+                    warmstart_solution=None):
+    """
+    Solve several parameter variations with a single model instance.
+
+    The model is built once for the first variation. For all further
+    variations that differ from it in cost parameters only (see
+    parameters.COST_PARAMETERS), just the coefficients of the objective
+    function are updated before the model is solved again. Other variations
+    trigger a rebuild of the model.
+
+    With persistent_solver=True in the config file the persistent pyomo
+    interface of the solver (e.g. 'gurobi_persistent') is used, so the
+    problem is kept in the solver and not written to an lp-file again.
+
+    With warm_start=True each solve starts from the previous solution of the
+    model (or from warmstart_solution after the model was built). The
+    solution of the first variation is returned, otherwise None.
+    """
+
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+
+    start_stages(cfg, abs_path)
+    with stage('read_data'):
+        data = read_demand(cfg, abs_path)
+        date_time_index = time_index(cfg, data)
+
+    warm_start = cfg.get('warm_start', False)
+    first_solution = None
+    model = None
+    model_param_value = None
+    aggregation = None
+    opt = None
+    size = None
+    for variation_nr in variation_nrs:
+        define_scenario_logging(cfg, abs_path, variation_nr, screen_level)
+        start_stages(cfg, abs_path, variation_nr)
+        logging.info('Use parameters for scenario {0}'.format(variation_nr))
+        with stage('read_data'):
+            param_value = read_parameters(cfg, abs_path, variation_nr)
+
+        if model is not None and only_costs_differ(model_param_value,
+                                                   param_value):
+            logging.info('Reuse model, update cost coefficients')
+            with stage('update_costs'):
+                update_cost_coefficients(
+                    model, cfg, param_value,
+                    data if aggregation is None else aggregation['data'])
+            if size is not None:
+                record(**size)
+        else:
+            logging.info('Initialize the energy system')
+            start = time.time()
+            model, aggregation = build_model(cfg, param_value, data,
+                                             date_time_index)
+            model_param_value = param_value
+            logging.info('Model built in {0:.1f} s'.format(
+                time.time() - start))
+            size = record_model_size(model)
+            seed = (warmstart_solution if warmstart_solution is not None
+                    else first_solution)
+            if warm_start and seed is not None:
+                set_solution(model, seed)
+            opt = create_solver(cfg, model)
+
+        logging.info('Solve the optimization problem')
+        solve_model(model, cfg, opt=opt, warmstart=(
+            warm_start and (first_solution is not None
+                            or warmstart_solution is not None)))
+
+        store_results(model, cfg, abs_path, variation_nr, aggregation)
+        if cfg.get('duals', False):
+            with stage('duals'):
+                store_duals(model, cfg, abs_path, variation_nr, aggregation)
+
+        if warm_start and first_solution is None:
+            first_solution = get_solution(model)
+
+    return first_solution
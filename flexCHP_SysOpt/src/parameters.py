@@ -0,0 +1,104 @@
+'''
+Read the parameters of the energy system for a given parameter variation.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import json
+import pandas as pd
+
+from sweep import generate_variations
+
+
+# Parameters that only enter the objective function of the optimization
+# problem (cost coefficients). Variations of these parameters do not change
+# the structure or the constraints of the model.
+COST_PARAMETERS = [
+    'var_costs_excess_bel', 'var_costs_excess_bth',
+    'var_costs_shortage_bel', 'var_costs_shortage_bth',
+    'var_costs_gas', 'gas_price_variation',
+    'el_price', 'price_factor_sqr', 'el_price_variation',
+    'capex_CHP', 'lifetime_CHP', 'wacc_CHP',
+    'capex_boiler', 'lifetime_boiler', 'wacc_boiler',
+    'capex_p2h', 'lifetime_p2h', 'wacc_p2h',
+    'capex_TES', 'lifetime_TES', 'wacc_TES', 'TES_capex_variation',
+    'capex_EES', 'lifetime_EES', 'wacc_EES', 'EES_capex_variation']
+
+
+# Variations generated from sweeps declared in the config file
+_generated_variations = {}
+
+
+def read_parameter_files(cfg, abs_path, file_path_variation):
+    """
+    Return the parameter values (pd.Series indexed by var_name) of the
+    energy system merged with the values of a parameter variation file.
+    """
+    file_path_param_01 = abs_path + cfg['parameters_energy_system']
+    file_path_param_02 = abs_path + file_path_variation
+    param_df_01 = pd.read_csv(file_path_param_01, index_col=1)
+    param_df_02 = pd.read_csv(file_path_param_02, index_col=1)
+    param_df = pd.concat([param_df_01, param_df_02], sort=True)
+    return param_df['value']
+
+
+def read_variations(cfg, abs_path):
+    """
+    Return the values of the varied parameters of all parameter variations
+    (one row per variation, one column per var_name).
+
+    With sweep_method 'files' the variations are read from the files in
+    parameter_variation, otherwise they are generated from the sweep
+    declared in the config file (see sweep.py). Generated sweeps are kept
+    in memory, so they are created only once per process.
+    """
+    method = cfg.get('sweep_method', 'files')
+    if method == 'files':
+        return pd.DataFrame(
+            [pd.read_csv(abs_path + file_path, index_col=1)['value']
+             for file_path in cfg['parameter_variation']],
+            index=range(len(cfg['parameter_variation'])))
+
+    key = json.dumps([abs_path, cfg['parameters_energy_system'],
+                      cfg['parameter_variation'][0], method,
+                      cfg['sweep_parameters'], cfg.get('sweep_samples'),
+                      cfg.get('sweep_seed', 0)], sort_keys=True)
+    if key not in _generated_variations:
+        base_value = read_parameter_files(cfg, abs_path,
+                                          cfg['parameter_variation'][0])
+        _generated_variations[key] = generate_variations(cfg, base_value)
+    return _generated_variations[key]
+
+
+def number_of_variations(cfg, abs_path):
+    return len(read_variations(cfg, abs_path))
+
+
+def read_parameters(cfg, abs_path, variation_nr):
+    """
+    Return the parameter values (pd.Series indexed by var_name) of the
+    energy system merged with the values of the parameter variation.
+    """
+    if cfg.get('sweep_method', 'files') == 'files':
+        return read_parameter_files(cfg, abs_path,
+                                    cfg['parameter_variation'][variation_nr])
+
+    param_value = read_parameter_files(cfg, abs_path,
+                                       cfg['parameter_variation'][0]).copy()
+    for name, value in read_variations(cfg, abs_path).loc[
+            variation_nr].items():
+        param_value[name] = value
+    return param_value
+
+
+def only_costs_differ(param_value_01, param_value_02):
+    """
+    Return True if two parameter sets differ in cost parameters only, i.e.
+    a model built with the first set can be reused for the second one by
+    updating its objective function.
+    """
+    other_01 = param_value_01.drop(COST_PARAMETERS, errors='ignore')
+    other_02 = param_value_02.drop(COST_PARAMETERS, errors='ignore')
+    return other_01.dropna().equals(other_02.dropna())
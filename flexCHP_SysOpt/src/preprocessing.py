@@ -6,335 +6,427 @@ __license__ = "GPLv3"
 __author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
 
 import pandas as pd
+import hashlib
+import json
 import os
 import yaml
-import matplotlib.pyplot as plt
 import numpy as np
-
-
-def preprocess_timeseries(config_path):
-
-    with open(config_path, 'r') as ymlfile:
-        cfg = yaml.load(ymlfile)
-
-    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
-
-    # Assumptions for load profile projections
-    file_name_param = cfg['parameters_load_profile']
-    file_path_param = abs_path + file_name_param
-
-    # Technical and economical specifications
-    param_df = pd.read_csv(file_path_param, index_col=1)
-    param_value = param_df['value']
-
-    # Electricity generation and demand
-    file_path_ts_loads_el = abs_path + cfg['time_series_loads_el']
-    data = pd.read_csv(file_path_ts_loads_el, parse_dates=['utc_timestamp'])
-
-    # District heating demand
-    file_path_ts_loads_heat = abs_path + cfg['time_series_loads_heat']
-    xls = pd.ExcelFile(file_path_ts_loads_heat)
+from caching import (hash_files, read_stored_hash, write_stored_hash,
+                     load_cached_array)
+from instrumentation import record, traced_memory
+from plotting import plot_job, submit
+from timeseries import TIMESTAMP, year_slices
+
+# Colors
+BEUTH_RED = (227/255, 35/255, 37/255)
+BEUTH_COL_2 = (178/255, 225/255, 227/255)
+BEUTH_COL_3 = (0/255, 152/255, 161/255)
+
+# Week shown in the plots of the residual load (hours from start of year)
+START_WEEK = 24*3
+HOURS_WEEK = 24*7
+
+# Year of the district heating profile (leap year, 8784 hours)
+HEAT_PROFILE_YEAR = 2012
+
+# Columns read from the OPSD time series (load and generation in MW) and
+# their types. The timestamps are parsed only for the rows that are kept.
+OPSD_DTYPES = {
+    'utc_timestamp': str,
+    'DE_load_entsoe_power_statistics': 'float32',
+    'DE_solar_profile': 'float32',
+    'DE_wind_profile': 'float32',
+    'DE_solar_generation_actual': 'float32',
+    'DE_wind_generation_actual': 'float32'}
+
+# Minimum number of rows of the OPSD time series read at once
+MIN_CHUNK_SIZE = 24
+
+
+def read_heat_profile(file_path):
+    """Read the district heating profile (in %) from the Excel workbook."""
+    xls = pd.ExcelFile(file_path)
     data_heat = pd.read_excel(
         xls, 'Daten', header=None, usecols='E',
-        names=['district_heating_profile_2012'])  # Load in %
-
-    load_and_profiles = pd.DataFrame()
-    demand_profiles = pd.DataFrame()
-
-    load_and_profiles_szenario2040 = pd.DataFrame()
-    coln_time = ['utc_timestamp']
-    load_and_profiles[coln_time] = (data[coln_time])
-    coln = [
-        'utc_timestamp', 'DE_load_entsoe_power_statistics',
-        'DE_solar_profile', 'DE_wind_profile',
-        'DE_solar_generation_actual', 'DE_wind_generation_actual'
-            ]
-    load_and_profiles[coln] = data[coln]  # Load in MW
-    load_and_profiles_2011 = (
-        load_and_profiles[(load_and_profiles['utc_timestamp']
-                          > '2010-12-31 23:00:00')
-                          & (load_and_profiles['utc_timestamp']
-                             < '2012-01-01 00:00:00')])
-
-    load_and_profiles_2012 = (
-        load_and_profiles[(load_and_profiles['utc_timestamp']
-                          > '2011-12-31 23:00:00')
-                          & (load_and_profiles['utc_timestamp']
-                              < '2013-01-01 00:00:00')])
-
-    load_and_profiles_2011.reset_index(inplace=True)
-    load_and_profiles_2012.reset_index(inplace=True)
-
-    load_and_profiles_szenario2040['utc_timestamp'] = load_and_profiles_2012[
-        'utc_timestamp']
-    load_and_profiles_szenario2040['load_MW'] = \
-        load_and_profiles_2012['DE_load_entsoe_power_statistics']
-    load_and_profiles_szenario2040['solar_generation_MW'] = \
-        load_and_profiles_2012['DE_solar_profile']\
-        * param_value['cap_inst_PV_2040']*1000
-    load_and_profiles_szenario2040['wind_generation_MW'] = \
-        load_and_profiles_2012['DE_wind_profile'] \
-        * (param_value['cap_inst_wind_onshore_2040']
-           + param_value['cap_inst_wind_offshore_2040'])*1000
-    load_and_profiles_szenario2040['EE_generation_MW'] = \
-        load_and_profiles_szenario2040['solar_generation_MW'] \
-        + load_and_profiles_szenario2040['wind_generation_MW']
-    load_and_profiles_szenario2040['residual_load_MW'] = \
-        load_and_profiles_szenario2040['load_MW'] \
-        - load_and_profiles_szenario2040['EE_generation_MW']
-
+        names=['district_heating_profile_2012'])
+    return data_heat['district_heating_profile_2012'].values.astype(float)
+
+
+def hour_of_year_key(timestamps):
+    """Month, day and hour of the timestamps as one integer (mmddhh)."""
+    return (timestamps.dt.month * 10000 + timestamps.dt.day * 100
+            + timestamps.dt.hour).values
+
+
+def heat_profile_of(timestamps, heat_profile):
+    """
+    District heating profile (one value per hour of HEAT_PROFILE_YEAR) at
+    the given timestamps. The values are matched by month, day and hour, so
+    the 29th of February is skipped in common years.
+    """
+    profile_index = pd.Series(pd.date_range(
+        str(HEAT_PROFILE_YEAR), str(HEAT_PROFILE_YEAR + 1), freq='h')[:-1])
+    profile = pd.Series(np.asarray(heat_profile)[:len(profile_index)],
+                        index=hour_of_year_key(profile_index))
+    return profile.reindex(hour_of_year_key(timestamps)).values
+
+
+def chunk_size(file_path, memory_mb):
+    """
+    Rows of the OPSD time series read at once within a memory budget of
+    memory_mb. The size of a row is estimated from the first data row, the
+    text of a chunk and its parsed columns are assumed to need twice the
+    size of its rows in the file.
+    """
+    with open(file_path, 'rb') as f:
+        f.readline()
+        row_bytes = max(len(f.readline()), 1)
+    return max(MIN_CHUNK_SIZE, int(memory_mb * 2**20 / (2 * row_bytes)))
+
+
+def read_years(file_path, years, chunksize):
+    """
+    Yield the rows of the OPSD time series (OPSD_DTYPES) one year (of
+    utc_timestamp) at a time. The file is read in chunks of chunksize rows,
+    rows of other years are dropped before their timestamps are parsed and
+    the file is read only up to the last of the years (the time series is
+    sorted by time).
+    """
+    year, parts = None, []
+    for chunk in pd.read_csv(file_path, usecols=list(OPSD_DTYPES),
+                             dtype=OPSD_DTYPES, chunksize=chunksize):
+        chunk_years = chunk['utc_timestamp'].str[:4].astype(int)
+        if chunk_years.iloc[0] > max(years):
+            break
+        keep = chunk_years.isin(years).values
+        if not keep.any():
+            continue
+        chunk = chunk[keep].assign(utc_timestamp=lambda rows: pd.to_datetime(
+            rows['utc_timestamp'], utc=True))
+        for chunk_year, rows in chunk.groupby(chunk_years.values[keep],
+                                              sort=False):
+            if chunk_year != year and parts:
+                yield year, pd.concat(parts, ignore_index=True)
+                parts = []
+            year = chunk_year
+            parts.append(rows)
+    if parts:
+        yield year, pd.concat(parts, ignore_index=True)
+
+
+def project_residual_load(load_and_profiles, param_value):
+    """
+    Residual load of one year projected to the installed capacities of
+    2040 and the residual load of the actual generation of that year (MW,
+    float32). Returns the residual loads (with utc_timestamp) and the
+    characteristics of the projection (sums in MWh, counts in hours).
+    """
+    load = load_and_profiles['DE_load_entsoe_power_statistics'].values
+    solar = load_and_profiles['DE_solar_profile'].values * float(
+        param_value['cap_inst_PV_2040'] * 1000)
+    renewables = load_and_profiles['DE_wind_profile'].values * float(
+        (param_value['cap_inst_wind_onshore_2040']
+         + param_value['cap_inst_wind_offshore_2040']) * 1000)
+    characteristics = {'solar_generation_MWh': np.nansum(
+        solar, dtype=np.float64)}
+    renewables += solar
+    del solar
+    residual = load - renewables
+    characteristics.update(
+        EE_generation_MWh=np.nansum(renewables, dtype=np.float64),
+        load_MWh=np.nansum(load, dtype=np.float64),
+        negative_h=int((residual < 0).sum()),
+        positive_h=int((residual > 0).sum()),
+        zero_h=int((residual == 0).sum()))
+    del renewables
+    residual_actual = (
+        load - load_and_profiles['DE_solar_generation_actual'].values
+        - load_and_profiles['DE_wind_generation_actual'].values)
+    residual_loads = pd.DataFrame({
+        'utc_timestamp': load_and_profiles['utc_timestamp'],
+        'residual_load_MW': residual,
+        'residual_load_actual_MW': residual_actual})
+    return residual_loads, characteristics
+
+
+def print_characteristics(characteristics, param_value, year):
+    """Print the characteristics of the residual load of one year."""
     print("")
     print("***Characteristics of the created residual load profile "
-          "(projection for 2040)***")
+          "(projection for 2040, weather year {0})***".format(year))
     print("Hours of negative residual load:",
-          load_and_profiles_szenario2040['residual_load_MW'][(
-                  load_and_profiles_szenario2040['residual_load_MW'] < 0)].count(), " h")
-    hours_of_pos_resload = load_and_profiles_szenario2040['residual_load_MW'][(
-            load_and_profiles_szenario2040['residual_load_MW'] > 0)].count()
-    print("Hours of positive residual load:", hours_of_pos_resload, "h")
+          characteristics['negative_h'], " h")
+    print("Hours of positive residual load:",
+          characteristics['positive_h'], "h")
     print("Hours of residual load equal zero:",
-          load_and_profiles_szenario2040['residual_load_MW'][(
-                  load_and_profiles_szenario2040['residual_load_MW'] == 0)].
-          count(), " h")
-    print("PV power generation (whole year): ", load_and_profiles_szenario2040[
-        'solar_generation_MW'].sum()/1e6, " TWh")
+          characteristics['zero_h'], " h")
+    print("PV power generation (whole year): ",
+          characteristics['solar_generation_MWh']/1e6, " TWh")
     water_and_biomass_TWh = (param_value['misc_renewables_gen_2040_TWh']
                              + param_value['biomass_gen_2040_TWh']
                              + param_value['biomass_CHP_gen_2040_TWh'])
     print("Power generation all renewable energies (RE) in whole year: ",
-          load_and_profiles_szenario2040['EE_generation_MW'].sum()/1e6
+          characteristics['EE_generation_MWh']/1e6
           + water_and_biomass_TWh, " TWh")
     print("Load Germany (electr. power comsumption whole year): ",
-          load_and_profiles_szenario2040['load_MW'].sum()/1e6, " TWh")
+          characteristics['load_MWh']/1e6, " TWh")
     print("Share of RE in power generation ",
-          (load_and_profiles_szenario2040['EE_generation_MW'].sum()
+          (characteristics['EE_generation_MWh']
            + water_and_biomass_TWh*1e6)
-          / load_and_profiles_szenario2040['load_MW'].sum())
+          / characteristics['load_MWh'])
 
-    # Relative heat demand (range from 0 to 1)
-    demand_profiles["demand_th"] = (
-            data_heat['district_heating_profile_2012']/100)
 
-    # Relative electricity demand (only positive share of residual load)
-    demand_el_max = load_and_profiles_szenario2040['residual_load_MW'].max()
+def plot_residual_load(fig, ax, timestamp, residual_load):
+    ax.plot(timestamp, residual_load)
+    ax.set_xlabel('Zeit')
+    ax.set_ylabel('Leistung in MW')
+    ax.set_title('Residuallastverlauf (installierte Kapazitaeten nach '
+                 'Basisszenario 2040)')
+    fig.suptitle('53,7% EE-Strom, 439h negative Residuallast')
 
-    demand_profiles['demand_el'] = (
-            load_and_profiles_szenario2040['residual_load_MW'].
-            clip(lower=0)/demand_el_max)
-
-    # Relative negative residual load (only negative share of residual load).
-    # Values are turned positive and will be used as positive "source" in the
-    # oemof application.
-    demand_el_min = load_and_profiles_szenario2040['residual_load_MW'].min()
-
-    demand_profiles['neg_residual_el'] = (
-            load_and_profiles_szenario2040['residual_load_MW'].clip(upper=0)
-            / demand_el_min)
-    average_el_pice_lin = (
-            demand_profiles['demand_el'][(demand_profiles['demand_el'] > 0)].
-            sum()/hours_of_pos_resload)
-    print("Average electricity price (lin) =", average_el_pice_lin,
-          "*P_el_max_lin")
-    price_sqr = (demand_profiles['demand_el']
-                 [(demand_profiles['demand_el'] > 0)]**2)
-    print("Max electricity price (quadratic) to receive same average price as "
-          "in linear model:",
-          demand_profiles['demand_el'][(demand_profiles['demand_el'] > 0)].
-          sum()/price_sqr[price_sqr > 0].sum(), "*P_el_max_lin")
 
-# ****************************************************************************
-# ********Save preprocessed data (input data for optimization)****************
-# ****************************************************************************
-
-    demand_profiles.to_csv(
-        abs_path + cfg['demand_time_series'],
-        encoding='utf-8',
-        index=False)
-
-    print("")
-    print("Saved csv-file with time series for domestic heating and "
-          "electricity demand to folder", cfg['demand_time_series'])
-
-# ****************************************************************************
-# ************************** Plots *******************************************
-# ****************************************************************************
-
-    # Colors
-    beuth_red = (227/255, 35/255, 37/255)
-    beuth_col_1 = (223/255, 242/255, 243/255)
-    beuth_col_2 = (178/255, 225/255, 227/255)
-    beuth_col_3 = (0/255, 152/255, 161/255)
-
-    plt.plot(
-        load_and_profiles_szenario2040['utc_timestamp'],
-        load_and_profiles_szenario2040['residual_load_MW']
-    )
-    plt.xlabel('Zeit')
-    plt.ylabel('Leistung in MW')
-    plt.title('Residuallastverlauf (installierte Kapazitaeten nach '
-              'Basisszenario 2040)')
-    plt.suptitle('53,7% EE-Strom, 439h negative Residuallast')
-    plt.savefig("../results/plots/Residuallastverlauf.png", dpi=300)
-
-    fig, ax = plt.subplots()
-    plt.grid(color='grey' ,
-             linestyle='-',
-             linewidth=0.5,
-             zorder=1)
+def plot_demand_scatter(fig, ax, demand_profiles):
+    ax.grid(color='grey',
+            linestyle='-',
+            linewidth=0.5,
+            zorder=1)
     ax.scatter(
         x=demand_profiles['demand_th']*1000,
         y=(demand_profiles['demand_el']*1000).
         add(demand_profiles['neg_residual_el']*-150),
         marker='.',
-        c=[beuth_col_3],
+        c=[BEUTH_COL_3],
         zorder=10
     )
     ax.set_ylabel('Strombedarf in $\mathrm{MW_{el}}$', fontsize=12)
     ax.set_xlabel('Wärmebedarf in $\mathrm{MW_{th}}$', fontsize=12)
     ax.set_ylim([-250, 1050])
-    plt.savefig(cfg['demand_scatter_plot'], dpi=300)
-
-    fig2, ax2 = plt.subplots()
-    residual_2012 = (load_and_profiles_2012['DE_load_entsoe_power_statistics']
-                     - load_and_profiles_2012['DE_solar_generation_actual']
-                     - load_and_profiles_2012['DE_wind_generation_actual'])
-
-    # negative residual load
-    ax2.plot(
-        load_and_profiles_szenario2040['residual_load_MW'][72:72+24*7],
-        color=beuth_red
-)
-    ax2.plot(
-        residual_2012[72:72+24*7],
-        color=beuth_col_3
-    )
-    ax2.grid()
-    plt.savefig("../results/plots/Vergleich2012_2040.png", dpi=300)
 
-    fig3, ax3 = plt.subplots()
-    start_b = 24*3
-    delta_time = 24*7
-    ymax = 70000
-    ymin = -30000
-    ax3.vlines(x=np.arange(start_b, start_b+delta_time, 24),
-               ymin=ymin, ymax=ymax, linewidth=1, color=beuth_col_2)
-    ax3.plot(
-        load_and_profiles_szenario2040['residual_load_MW'][
-            start_b:start_b+delta_time]/1e3,
-        color=beuth_red
-    )
-    ax3.plot(
-        residual_2012[start_b:start_b+delta_time]/1e3,
-        color=beuth_col_3
-    )
-    ax3.set_ylabel('Residual Load ($\mathrm{GW_{el}}$)')
-    ax3.set_xlabel('Time (h)')
-    ax3.set_ylim([ymin/1e3, ymax/(1e3)])
-    ax3.set_xlim([start_b, start_b+delta_time])
-    ax3.hlines(
-        y=0,
-        xmin=start_b,
-        xmax=start_b+delta_time,
-        linewidth=2,
-        color='k'
-    )
-    plt.savefig("../results/plots/RL_Comparison_2012_2040.png", dpi=300)
 
-    fig4, ax4 = plt.subplots()
+def plot_week_comparison(fig, ax, residual_2040, residual_2012):
+    ax.plot(residual_2040[START_WEEK:START_WEEK+HOURS_WEEK], color=BEUTH_RED)
+    ax.plot(residual_2012[START_WEEK:START_WEEK+HOURS_WEEK],
+            color=BEUTH_COL_3)
+    ax.grid()
 
-    ax4.plot(residual_2012[start_b:start_b+delta_time], color=beuth_col_3)
-    ax4.vlines(
-        x=np.arange(start_b, start_b+delta_time, 24),
-        ymin=ymin,
-        ymax=ymax,
-        linewidth=1,
-        color=beuth_col_2
-    )
-    ax4.set_ylim([ymin, ymax])
-    ax4.set_xlim([start_b, start_b+delta_time])
-    ax4.hlines(
-        y=0,
-        xmin=start_b,
-        xmax=start_b+delta_time,
-        linewidth=2,
-        color='k'
-    )
-    plt.savefig("../results/plots/Residuallast2012.png", dpi=300)
-
-    fig5, ax5 = plt.subplots()
-    ax5.vlines(
-        x=np.arange(start_b, start_b+delta_time, 24),
-        ymin=ymin,
-        ymax=ymax,
-        linewidth=1,
-        color=beuth_col_2
-    )
-    ax5.hlines(
-        y=0,
-        xmin=start_b,
-        xmax=start_b+delta_time,
-        linewidth=2,
-        color='k'
-    )
-    ax5.plot(
-        load_and_profiles_szenario2040['residual_load_MW'][
-            start_b:start_b+delta_time],
-        color=beuth_red)
-    ax5.set_ylim([ymin, ymax])
-    ax5.set_xlim([start_b, start_b+delta_time])
-    plt.savefig("../results/plots/Residuallast2040.png", dpi=300)
-
-    plt.style.use('ggplot')
-    x = np.linspace(0, 8784, 8784, endpoint=True)
-    fig6, ax6 = plt.subplots()
-    ax6.plot(
-        demand_profiles["demand_th"]*100,
-        color=beuth_col_3,
-        label="Thermal Energy Demand Profile"
-    )
-    ax6.plot(
-        x,
-        demand_profiles["demand_th"].sort_values(ascending=False)*100,
-        color=beuth_red,
-        label="Load Duration Curve"
-    )
-    ax6.legend(
-        bbox_to_anchor=(0., 1.02, 1., .102),
-        loc=3,
-        ncol=2,
-        mode="expand",
-        borderaxespad=0.
-    )
-    ax6.set_xlim(0, 8760)
-    ax6.set_ylabel("Thermal Energy Demand (%)")
-    ax6.set_xlabel("Time (h)")
-    plt.savefig("../results/plots/Thermal_load_DH.png", dpi=300)
-
-    fig7, ax7 = plt.subplots()
-    ax7.hlines(y=0, xmin=0, xmax=8760, linewidth=1, color='k')
-    ax7.plot(
-        load_and_profiles_szenario2040['residual_load_MW']/1e3,
-        color=beuth_col_3,
-        label="Residual Load Germany (Future)"
-    )
-    ax7.plot(
-        x,
-        load_and_profiles_szenario2040['residual_load_MW'].
-        sort_values(ascending=False)/1e3,
-        color=beuth_red,
-        label="Load Duration Curve"
-    )
-    ax7.set_ylabel("Residual Load ($\mathrm{GW_{el}}$)")
-    ax7.set_xlabel("Time (h)")
-    ax7.legend(
+
+def plot_week(fig, ax, residuals, scale=1, labels=False):
+    """Residual loads (series, color) in one week divided by scale."""
+    ymax = 70000
+    ymin = -30000
+    ax.vlines(x=np.arange(START_WEEK, START_WEEK+HOURS_WEEK, 24),
+              ymin=ymin, ymax=ymax, linewidth=1, color=BEUTH_COL_2)
+    for residual_load, color in residuals:
+        ax.plot(residual_load[START_WEEK:START_WEEK+HOURS_WEEK]/scale,
+                color=color)
+    if labels:
+        ax.set_ylabel('Residual Load ($\mathrm{GW_{el}}$)')
+        ax.set_xlabel('Time (h)')
+    ax.set_ylim([ymin/scale, ymax/scale])
+    ax.set_xlim([START_WEEK, START_WEEK+HOURS_WEEK])
+    ax.hlines(y=0, xmin=START_WEEK, xmax=START_WEEK+HOURS_WEEK, linewidth=2,
+              color='k')
+
+
+def plot_duration_curve(fig, ax, series, label, ylabel, zero_line=False):
+    """Time series of the whole horizon and its duration curve."""
+    x = np.linspace(0, len(series), len(series), endpoint=True)
+    if zero_line:
+        ax.hlines(y=0, xmin=0, xmax=len(series), linewidth=1, color='k')
+    ax.plot(series, color=BEUTH_COL_3, label=label)
+    ax.plot(x, series.sort_values(ascending=False), color=BEUTH_RED,
+            label="Load Duration Curve")
+    ax.legend(
         bbox_to_anchor=(0., 1.02, 1., .102),
         loc=3,
         ncol=2,
         mode="expand",
         borderaxespad=0.
     )
-    ax7.set_xlim([0, 8760])
-    plt.savefig("../results/plots/Residuallast2040_entireYear.png", dpi=300)
+    ax.set_xlim([0, len(series)])
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel("Time (h)")
+
+
+def create_profiles(cfg, abs_path, file_path_param, years, memory_mb):
+    """
+    Project the residual loads of the years and derive the nominal demand
+    profiles. The OPSD time series is read in chunks within memory_mb, only
+    the residual loads of the years are kept (float32). Returns the residual
+    loads and the demand profiles.
+    """
+    # Technical and economical specifications
+    param_df = pd.read_csv(file_path_param, index_col=1)
+    param_value = param_df['value']
+
+    # District heating demand. The Excel sheet is converted only once into a
+    # binary cache file, which is rebuilt when the workbook changes.
+    file_path_ts_loads_heat = abs_path + cfg['time_series_loads_heat']
+    heat_profile = load_cached_array(
+        source_path=file_path_ts_loads_heat,
+        cache_path=abs_path + cfg['time_series_loads_heat_cache'],
+        build=read_heat_profile)  # Load in %
+
+    # Electricity generation and demand, projected year by year. Only the
+    # residual loads are kept, not the columns of the OPSD time series.
+    file_path_ts_loads_el = abs_path + cfg['time_series_loads_el']
+    projections = []
+    for year, load_and_profiles in read_years(
+            file_path_ts_loads_el, years,
+            chunk_size(file_path_ts_loads_el, memory_mb)):
+        projection, characteristics = project_residual_load(
+            load_and_profiles, param_value)
+        del load_and_profiles
+        print_characteristics(characteristics, param_value, year)
+        projections.append(projection)
+    missing = sorted(set(years) - set(
+        projection['utc_timestamp'].dt.year.iloc[0]
+        for projection in projections))
+    if missing:
+        raise ValueError("The time series {0} has no data of the years "
+                         "{1}.".format(cfg['time_series_loads_el'], missing))
+    residual_loads = pd.concat(projections, ignore_index=True)
+    del projections
+
+    # Relative electricity demand (only positive share of residual load) and
+    # relative negative residual load (only negative share of residual load)
+    # are scaled to the extreme values of the whole horizon. Negative values
+    # are turned positive and will be used as positive "source" in the
+    # oemof application.
+    residual = residual_loads['residual_load_MW'].values
+    demand_el = np.maximum(residual, 0)
+    demand_el /= np.nanmax(residual)
+    neg_residual_el = np.minimum(residual, 0)
+    neg_residual_el /= np.nanmin(residual)
+
+    # Relative heat demand (range from 0 to 1)
+    demand_th = (heat_profile_of(residual_loads['utc_timestamp'],
+                                 heat_profile) / 100).astype('float32')
+
+    demand_el_pos = demand_el[demand_el > 0]
+    average_el_pice_lin = (np.sum(demand_el_pos, dtype=np.float64)
+                           / np.count_nonzero(residual > 0))
+    print("")
+    print("Average electricity price (lin) =", average_el_pice_lin,
+          "*P_el_max_lin")
+    print("Max electricity price (quadratic) to receive same average price as "
+          "in linear model:",
+          np.sum(demand_el_pos, dtype=np.float64)
+          / np.sum(np.square(demand_el_pos, dtype=np.float64)),
+          "*P_el_max_lin")
+    del demand_el_pos
+
+    demand_profiles = pd.DataFrame({
+        TIMESTAMP: residual_loads['utc_timestamp'],
+        'demand_th': demand_th,
+        'demand_el': demand_el,
+        'neg_residual_el': neg_residual_el})
+    return residual_loads, demand_profiles
+
+
+def preprocess_timeseries(config_path, force=False):
+    """
+    Create the nominal demand profiles used as model input.
+
+    The profiles cover the years of the OPSD time series given in
+    time_series_years in the config file (e.g. 2011 to 2020), which are
+    read, projected and written one year at a time. Only the needed
+    columns of the OPSD time series are read (float32), in chunks sized to
+    preprocessing_memory_mb in the config file. The peak memory of the stage
+    is printed (and recorded with metrics=True).
+
+    The stage is skipped if the content hash of the raw time series, of
+    the load profile parameters and the selected years match the hash
+    stored next to the existing preprocessed file. Set force=True to run it
+    anyway.
+    """
+
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+    years = [int(year) for year in cfg.get('time_series_years', [2012])]
+
+    # Assumptions for load profile projections
+    file_name_param = cfg['parameters_load_profile']
+    file_path_param = abs_path + file_name_param
+
+    # Skip preprocessing if the input data (and this script) did not change
+    # since the last run
+    file_path_demand_ts = abs_path + cfg['demand_time_series']
+    input_hash = hashlib.sha256((hash_files([
+        abs_path + cfg['time_series_loads_el'],
+        abs_path + cfg['time_series_loads_heat'],
+        file_path_param,
+        os.path.abspath(__file__)]) + json.dumps(years)).encode()).hexdigest()
+    if not force and read_stored_hash(file_path_demand_ts) == input_hash:
+        print("")
+        print("Input data unchanged, preprocessed time series are up to "
+              "date:", cfg['demand_time_series'])
+        return
+
+    memory_mb = cfg.get('preprocessing_memory_mb', 256)
+    with traced_memory() as memory:
+        residual_loads, demand_profiles = create_profiles(
+            cfg, abs_path, file_path_param, years, memory_mb)
+
+        # The file is written one year at a time
+        for i, (_, steps) in enumerate(year_slices(
+                pd.DatetimeIndex(demand_profiles[TIMESTAMP]))):
+            demand_profiles.iloc[steps].to_csv(
+                file_path_demand_ts,
+                mode='w' if i == 0 else 'a',
+                header=i == 0,
+                encoding='utf-8',
+                index=False)
+    write_stored_hash(file_path_demand_ts, input_hash)
+
+    print("")
+    print("Saved csv-file with time series for domestic heating and "
+          "electricity demand to folder", cfg['demand_time_series'])
+    print("Peak memory of preprocessing: {0:.1f} MB (process: {1:.1f} MB)"
+          .format(memory['peak_mb'], memory['process_peak_mb']))
+    if memory['peak_mb'] > memory_mb:
+        print("Warning: preprocessing exceeded preprocessing_memory_mb = "
+              "{0} MB.".format(memory_mb))
+    record(preprocessing_peak_mb=memory['peak_mb'])
+
+# ****************************************************************************
+# ************************** Plots *******************************************
+# ****************************************************************************
+
+    # The weeks compared in the plots are taken from the first year
+    residual_actual = residual_loads['residual_load_actual_MW']
+    residual_2040 = residual_loads['residual_load_MW']
+
+    submit(cfg, abs_path, [
+        plot_job(plot_residual_load,
+                 '../results/plots/Residuallastverlauf.png',
+                 timestamp=residual_loads['utc_timestamp'],
+                 residual_load=residual_2040),
+        plot_job(plot_demand_scatter, cfg['demand_scatter_plot'],
+                 demand_profiles=demand_profiles),
+        plot_job(plot_week_comparison,
+                 '../results/plots/Vergleich2012_2040.png',
+                 residual_2040=residual_2040, residual_2012=residual_actual),
+        plot_job(plot_week, '../results/plots/RL_Comparison_2012_2040.png',
+                 residuals=[(residual_2040, BEUTH_RED),
+                            (residual_actual, BEUTH_COL_3)],
+                 scale=1e3, labels=True),
+        plot_job(plot_week, '../results/plots/Residuallast2012.png',
+                 residuals=[(residual_actual, BEUTH_COL_3)]),
+        plot_job(plot_week, '../results/plots/Residuallast2040.png',
+                 residuals=[(residual_2040, BEUTH_RED)]),
+        plot_job(plot_duration_curve, '../results/plots/Thermal_load_DH.png',
+                 style='ggplot', series=demand_profiles['demand_th']*100,
+                 label='Thermal Energy Demand Profile',
+                 ylabel='Thermal Energy Demand (%)'),
+        plot_job(plot_duration_curve,
+                 '../results/plots/Residuallast2040_entireYear.png',
+                 style='ggplot', series=residual_2040/1e3,
+                 label='Residual Load Germany (Future)',
+                 ylabel='Residual Load ($\mathrm{GW_{el}}$)',
+                 zero_line=True)])
 
     print("")
     print("***Precrocessing: Finish!***")
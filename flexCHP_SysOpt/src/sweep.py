@@ -0,0 +1,121 @@
+'''
+Generate parameter variations from a sweep declared in the config file.
+
+Each swept parameter (var_name of the parameter files) is given either as a
+list of values or as a range {min: .., max: .., levels: ..}. The variations
+are generated in memory as a DataFrame with one row per variation and one
+column per swept parameter. Row 0 is always the base scenario, i.e. the
+values of parameters_energy_system and of the first file in
+parameter_variation.
+
+    oat:        one-at-a-time, every level of each parameter while all
+                other parameters keep their base value
+    factorial:  all combinations of the levels of all parameters
+    lhs:        sweep_samples Latin hypercube samples within the ranges
+    sobol:      sweep_samples points of a scrambled Sobol sequence within
+                the ranges (requires scipy)
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+import itertools
+import numpy as np
+import pandas as pd
+
+SWEEP_METHODS = ['oat', 'factorial', 'lhs', 'sobol']
+
+
+def parameter_levels(spec):
+    """Levels of a swept parameter (list or range with levels)."""
+    if isinstance(spec, dict):
+        return list(np.linspace(spec['min'], spec['max'], spec['levels']))
+    return list(spec)
+
+
+def parameter_range(spec):
+    """Lower and upper bound of a swept parameter (list or range)."""
+    if isinstance(spec, dict):
+        return spec['min'], spec['max']
+    return min(spec), max(spec)
+
+
+def one_at_a_time(levels, base):
+    rows = []
+    for name, values in levels.items():
+        for value in values:
+            if not np.isclose(value, base[name]):
+                row = dict(base)
+                row[name] = value
+                rows.append(row)
+    return rows
+
+
+def full_factorial(levels):
+    return [dict(zip(levels, values))
+            for values in itertools.product(*levels.values())]
+
+
+def latin_hypercube(n_samples, n_dimensions, seed=0):
+    """
+    Latin hypercube samples in the unit hypercube: each dimension is split
+    into n_samples intervals, each interval holds exactly one sample.
+    """
+    rng = np.random.RandomState(seed)
+    samples = (rng.rand(n_samples, n_dimensions)
+               + np.arange(n_samples)[:, None]) / n_samples
+    for d in range(n_dimensions):
+        samples[:, d] = samples[rng.permutation(n_samples), d]
+    return samples
+
+
+def sobol(n_samples, n_dimensions, seed=0):
+    """Points of a scrambled Sobol sequence in the unit hypercube."""
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        raise ImportError("sweep_method 'sobol' requires scipy "
+                          "(pip install scipy).")
+    return qmc.Sobol(n_dimensions, scramble=True, seed=seed).random(
+        n_samples)
+
+
+def generate_variations(cfg, base_value):
+    """
+    Return the variations (DataFrame, one row per variation) of the sweep
+    declared in cfg. base_value holds the parameter values of the base
+    scenario.
+    """
+    method = cfg['sweep_method']
+    specs = cfg['sweep_parameters']
+    unknown = [name for name in specs if name not in base_value.index]
+    if method not in SWEEP_METHODS:
+        raise ValueError("Unknown sweep_method '{0}', use 'files' or one of "
+                         "{1}.".format(method, SWEEP_METHODS))
+    if unknown:
+        raise ValueError('Swept parameters {0} are not defined in the '
+                         'parameter files.'.format(unknown))
+
+    base = {name: float(base_value[name]) for name in specs}
+    if method in ['oat', 'factorial']:
+        levels = {name: parameter_levels(spec)
+                  for name, spec in specs.items()}
+        if method == 'oat':
+            rows = one_at_a_time(levels, base)
+        else:
+            rows = full_factorial(levels)
+    else:
+        if method == 'lhs':
+            unit = latin_hypercube(cfg['sweep_samples'], len(specs),
+                                   cfg.get('sweep_seed', 0))
+        else:
+            unit = sobol(cfg['sweep_samples'], len(specs),
+                         cfg.get('sweep_seed', 0))
+        bounds = np.array([parameter_range(spec) for spec in specs.values()])
+        values = bounds[:, 0] + unit * (bounds[:, 1] - bounds[:, 0])
+        rows = [dict(zip(specs, row)) for row in values]
+
+    rows = [base] + [row for row in rows if not np.allclose(
+        [row[name] for name in specs], [base[name] for name in specs])]
+    return pd.DataFrame(rows, columns=list(specs))
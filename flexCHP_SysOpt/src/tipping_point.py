@@ -0,0 +1,143 @@
+'''
+Search the value of a parameter at which the investment into a component
+switches on or off (tipping point), e.g. the EES CAPEX at which a battery is
+no longer installed.
+
+The parameter is bisected within the given bounds until the interval
+containing the tipping point is smaller than the tolerance. The model is
+built once and reused as long as only cost parameters change, each solve
+starts from the solution of the previous one.
+'''
+
+__copyright__ = "Beuth Hochschule für Technik Berlin, Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "jakob-wo (jakob.wolf@beuth-hochschule.de)"
+
+from oemof.tools import logger
+
+from model_flex_chp import (build_model, update_cost_coefficients,
+                            create_solver, solve_model, set_solution,
+                            get_solution)
+from parameters import read_parameters, only_costs_differ
+from timeseries import read_demand, time_index
+
+import logging
+import os
+import time
+import pandas as pd
+import yaml
+
+
+def invest_value(model, label):
+    """
+    Return the optimal investment (invest) of the component with the given
+    label: the storage capacity of a storage or the sum of the investments
+    into the flows of any other component.
+    """
+    node = model.es.groups[label]
+    if hasattr(model, 'GenericInvestmentStorageBlock') and (
+            node in model.GenericInvestmentStorageBlock.INVESTSTORAGES):
+        return model.GenericInvestmentStorageBlock.invest[node].value
+    if not hasattr(model, 'InvestmentFlow'):
+        return 0
+    return sum(model.InvestmentFlow.invest[i, o].value
+               for i, o in model.InvestmentFlow.FLOWS
+               if node in (i, o))
+
+
+def find_tipping_point(config_path, screen_level=logging.INFO):
+    """
+    Bisect tipping_point_parameter within tipping_point_bounds until the
+    investment into tipping_point_component crosses
+    tipping_point_threshold within an interval smaller than
+    tipping_point_tolerance. All other parameters are those of the base
+    scenario (variation 0).
+
+    All evaluated parameter values and investments are written to
+    tipping_point_<parameter>_<component>.csv. Returns the interval
+    containing the tipping point or None if the investment does not cross
+    the threshold within the bounds.
+    """
+
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+
+    logger.define_logging(logpath=(abs_path
+                                   + '/results/optimisation_results/log/'),
+                          logfile=cfg['filename_logfile'] + '_tipping_point.log',
+                          screen_level=screen_level,
+                          file_level=logging.DEBUG)
+
+    parameter = cfg['tipping_point_parameter']
+    component = cfg['tipping_point_component']
+    threshold = cfg['tipping_point_threshold']
+
+    data = read_demand(cfg, abs_path)
+    date_time_index = time_index(cfg, data)
+    base_value = read_parameters(cfg, abs_path, 0)
+
+    state = {'model': None, 'param_value': None, 'aggregation': None,
+             'opt': None, 'solution': None}
+    evaluations = []
+
+    def evaluate(value):
+        param_value = base_value.copy()
+        param_value[parameter] = value
+        model = state['model']
+        if model is not None and only_costs_differ(state['param_value'],
+                                                   param_value):
+            update_cost_coefficients(
+                model, cfg, param_value,
+                data if state['aggregation'] is None
+                else state['aggregation']['data'])
+        else:
+            start = time.time()
+            model, state['aggregation'] = build_model(
+                cfg, param_value, data, date_time_index)
+            logging.info('Model built in {0:.1f} s'.format(
+                time.time() - start))
+            if state['solution'] is not None:
+                set_solution(model, state['solution'])
+            state.update(model=model, param_value=param_value,
+                         opt=create_solver(cfg, model))
+        solve_model(model, cfg, opt=state['opt'],
+                    warmstart=state['solution'] is not None)
+        state['solution'] = get_solution(model)
+        invest = invest_value(model, component)
+        evaluations.append((value, invest))
+        logging.info('{0} = {1:.4f}: invest {2} = {3:.2f}'.format(
+            parameter, value, component, invest))
+        return invest > threshold
+
+    lower, upper = cfg['tipping_point_bounds']
+    invests_lower = evaluate(lower)
+    invests_upper = evaluate(upper)
+    if invests_lower == invests_upper:
+        logging.warning('The investment into {0} does not cross {1} for {2} '
+                        'between {3} and {4}.'.format(component, threshold,
+                                                      parameter, lower, upper))
+        interval = None
+    else:
+        while upper - lower > cfg['tipping_point_tolerance']:
+            middle = (lower + upper) / 2
+            if evaluate(middle) == invests_lower:
+                lower = middle
+            else:
+                upper = middle
+        interval = (lower, upper)
+        print('Tipping point of {0} for {1}: {2:.4f} - {3:.4f} '
+              '({4} solves)'.format(parameter, component, lower, upper,
+                                    len(evaluations)))
+
+    if cfg['price_el_quadratic']:
+        price_relation = 'quadratic_price_relationship'
+    if cfg['price_el_quadratic'] == False:
+        price_relation = 'linear_price_relationship'
+    pd.DataFrame(evaluations, columns=[parameter, 'invest']).to_csv(
+        abs_path + '/results/optimisation_results/data/' + price_relation
+        + '/tipping_point_{0}_{1}.csv'.format(parameter, component),
+        index=False)
+
+    return interval
@@ -0,0 +1,90 @@
+'''
+Test setup: the modules of flexCHP_SysOpt and the modules shared by the
+models (common) are imported by their bare names like in main.py. The models
+themselves are solved in separate processes (see solve_case), so that the
+modules of flexCHP and flexCHP_SysOpt, which have the same names, do not
+collide.
+'''
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+sys.path.insert(0, os.path.join(ROOT, 'flexCHP_SysOpt', 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+
+def solver_settings(solver='cbc'):
+    """
+    Settings to solve the models with cbc or, if it is not installed, with
+    HiGHS in memory (solver_interface='direct'). None if neither is
+    available.
+    """
+    try:
+        import oemof.solph  # noqa: F401
+    except ImportError:
+        return None
+    if shutil.which(solver) is not None:
+        return {'solver': solver}
+    try:
+        import highspy  # noqa: F401
+    except ImportError:
+        return None
+    return {'solver_interface': 'direct'}
+
+
+requires_solver = pytest.mark.skipif(
+    solver_settings() is None,
+    reason='requires oemof and the cbc solver or highspy')
+
+
+@pytest.fixture
+def solve_case(tmp_path):
+    """
+    Solve a model on the synthetic profiles of the benchmark with the given
+    settings (run main.py with the given command in its own process).
+    Returns the directory of the dumps. The results and the synthetic
+    profiles written for the test are deleted afterwards.
+    """
+    import run_benchmarks
+    written = []
+    profiles = []
+
+    def solve(model, steps, settings, command):
+        demand = os.path.join(ROOT, model, 'data_preprocessed',
+                              run_benchmarks.case_name(steps) + '_demand.csv')
+        if not os.path.exists(demand):
+            profiles.append(demand)
+        config_path = run_benchmarks.prepare_case(model, steps,
+                                                  str(tmp_path))
+        with open(config_path, 'r') as ymlfile:
+            cfg = yaml.safe_load(ymlfile)
+        name = 'pytest_{0}_{1}'.format(model, steps)
+        cfg.update(solver_settings(), filename_dumb=name,
+                   filename_logfile=name)
+        cfg.update(settings)
+        with open(config_path, 'w') as ymlfile:
+            yaml.safe_dump(cfg, ymlfile)
+        written.append((model, name))
+        subprocess.run([sys.executable, 'main.py', '--config', config_path]
+                       + command, cwd=os.path.join(ROOT, model, 'src'),
+                       check=True)
+        return os.path.join(ROOT, model, 'results', 'optimisation_results',
+                            'dumps')
+
+    yield solve
+    for model, name in written:
+        for file_path in glob.glob(os.path.join(
+                ROOT, model, 'results', 'optimisation_results', '**',
+                name + '*'), recursive=True):
+            os.remove(file_path)
+    for file_path in set(profiles):
+        if os.path.exists(file_path):
+            os.remove(file_path)
@@ -0,0 +1,64 @@
+'''
+Tests of the aggregation into typical days (flexCHP_SysOpt/src/aggregation.py).
+'''
+
+import numpy as np
+import pandas as pd
+
+from aggregation import (kmeans, aggregate_typical_days, objective_weighting,
+                         typical_steps, disaggregate_results)
+
+
+def days(*profiles, steps_per_day=4):
+    """Time series of days with constant demands given per day."""
+    values = np.repeat(np.array(profiles, dtype=float), steps_per_day,
+                       axis=0)
+    return pd.DataFrame(values, columns=['demand_el', 'demand_th',
+                                         'neg_residual_el'])
+
+
+def test_kmeans_separates_clusters():
+    features = np.array([[0., 0.], [0.1, 0.], [10., 10.], [10., 10.1]])
+    labels = kmeans(features, 2)
+    assert labels[0] == labels[1]
+    assert labels[2] == labels[3]
+    assert labels[0] != labels[2]
+
+
+def test_aggregate_typical_days():
+    data = days([1, 1, 0], [1, 1, 0], [5, 5, 1], [1.1, 1, 0], [5, 5, 1])
+    aggregation = aggregate_typical_days(data, 2, steps_per_day=4)
+    assert len(aggregation['data']) == 2*4
+    assert list(aggregation['weights']) == [3, 2]
+    assert list(aggregation['day_to_typical_day']) == [0, 0, 1, 0, 1]
+    assert objective_weighting(aggregation, timeincrement=0.5) == \
+        [1.5]*4 + [1.0]*4
+
+
+def test_typical_steps_fill_incomplete_day():
+    aggregation = {'steps_per_day': 2,
+                   'day_to_typical_day': np.array([1, 0])}
+    assert list(typical_steps(aggregation, 5)) == [2, 3, 0, 1, 0]
+
+
+def test_disaggregate_results_adds_storage_levels():
+    aggregation = {'steps_per_day': 2,
+                   'day_to_typical_day': np.array([0, 1, 0])}
+    timeindex = pd.date_range('2019-01-01', periods=6, freq='60min')
+    results = {('storage', None): {
+        'sequences': pd.DataFrame({'capacity': [1., 2., -1., -2.]}),
+        'scalars': pd.Series({'invest': 4.})},
+        ('chp', 'heat'): {
+        'sequences': pd.DataFrame({'flow': [1., 2., 3., 4.]}),
+        'scalars': pd.Series(dtype=float)}}
+    levels = {'storage': (np.array([0., 2., 0., 2.]), 0.)}
+
+    full = disaggregate_results(results, aggregation, timeindex,
+                                levels=levels)
+
+    capacity = full[('storage', None)]['sequences']['capacity']
+    assert list(capacity) == [1., 2., 1., 0., 1., 2.]
+    assert capacity.index.equals(timeindex)
+    assert list(full[('chp', 'heat')]['sequences']['flow']) == \
+        [1., 2., 3., 4., 1., 2.]
+    assert full[('storage', None)]['scalars']['invest'] == 4.
@@ -0,0 +1,20 @@
+'''
+The modules in common are shared by both models and must not be copied into
+their src directories again (a copy would shadow the shared module).
+'''
+
+import os
+
+import pytest
+
+from conftest import ROOT
+
+COMMON = sorted(f for f in os.listdir(os.path.join(ROOT, 'common'))
+                if f.endswith('.py'))
+
+
+@pytest.mark.parametrize('model', ['flexCHP', 'flexCHP_SysOpt'])
+def test_no_copies_of_common_modules(model):
+    src = os.listdir(os.path.join(ROOT, model, 'src'))
+    assert COMMON
+    assert [f for f in COMMON if f in src] == []
@@ -0,0 +1,57 @@
+'''
+Tests of the profiles of the stages (common/instrumentation.py).
+'''
+
+import os
+
+import pytest
+
+from instrumentation import (log_dir, profile_files, reset, start_stages,
+                             stage, write_profile_summary)
+
+
+@pytest.fixture
+def abs_path(tmp_path):
+    os.makedirs(log_dir(str(tmp_path)))
+    return str(tmp_path)
+
+
+def touch(file_path):
+    with open(file_path, 'w'):
+        pass
+
+
+def test_profile_files_of_the_active_profiler(abs_path):
+    cfg = {'filename_logfile': 'test', 'profile': 'pyinstrument'}
+    touch(log_dir(abs_path) + 'test_0_solve.prof')
+    touch(log_dir(abs_path) + 'test_0_solve.html')
+
+    assert profile_files(cfg, abs_path) == [
+        log_dir(abs_path) + 'test_0_solve.html']
+    assert profile_files(dict(cfg, profile=True), abs_path) == [
+        log_dir(abs_path) + 'test_0_solve.prof']
+    assert profile_files(dict(cfg, profile=False), abs_path) == []
+
+    # The profiles of an earlier run with another profiler are deleted too
+    reset(cfg, abs_path)
+    assert os.listdir(log_dir(abs_path)) == []
+
+
+def test_summary_of_cprofile(abs_path):
+    cfg = {'filename_logfile': 'test', 'profile': True}
+    start_stages(cfg, abs_path, scenario=0)
+    with stage('solve'):
+        sum(range(1000))
+    # The following stages of the test process are not profiled
+    start_stages({'filename_logfile': 'test'}, abs_path)
+
+    write_profile_summary(cfg, abs_path)
+    with open(log_dir(abs_path) + 'test_profile_summary.txt', 'r') as f:
+        assert f.readline().startswith('*** Stage solve:')
+
+
+def test_no_summary_of_pyinstrument(abs_path):
+    cfg = {'filename_logfile': 'test', 'profile': 'pyinstrument'}
+    touch(log_dir(abs_path) + 'test_0_solve.html')
+    write_profile_summary(cfg, abs_path)
+    assert not os.path.exists(log_dir(abs_path) + 'test_profile_summary.txt')
@@ -0,0 +1,60 @@
+'''
+Tests of the key performance indicators (common/kpi.py).
+'''
+
+import numpy as np
+import pandas as pd
+
+from kpi import FLOWS, stack_sequences, compute_kpis, merge_kpis
+
+
+def results(chp_heat, chp_el, gas_chp, boiler):
+    def sequences(values, variable='flow'):
+        return {'sequences': pd.DataFrame({variable: values})}
+    return {('CHP_01', 'heat'): sequences(chp_heat),
+            ('CHP_01', 'electricity'): sequences(chp_el),
+            ('natural_gas', 'CHP_01'): sequences(gas_chp),
+            ('boiler', 'heat'): sequences(boiler)}
+
+
+def kpis(string_results, timeincrement=1):
+    values, names, _ = stack_sequences(string_results)
+    return compute_kpis(values, names, timeincrement=timeincrement)
+
+
+def test_stack_sequences_fills_missing_flows():
+    values, names, index = stack_sequences(
+        results([1., 2.], [1., 1.], [4., 6.], [0., 3.]))
+    assert names == [name for name, _, _ in FLOWS]
+    assert values.shape == (2, len(FLOWS))
+    assert values[:, names.index('boiler')].tolist() == [0., 3.]
+    assert not values[:, names.index('p2h')].any()
+    assert len(index) == 2
+
+
+def test_compute_kpis():
+    record = kpis(results([1., 2., 0.], [1., 1., 0.], [4., 6., 0.],
+                          [0., 3., 0.1]), timeincrement=0.5)
+    assert record['boiler_sum'] == 0.5 * 3.1
+    assert record['boiler_max'] == 3.
+    # Threshold of the boiler is 0.2 MW, time steps are half hours
+    assert record['boiler_hours'] == 0.5
+    assert record['chp_sum'] == 0.5 * 5.
+    assert record['eta_el_min'] == 1. / 6.
+    assert record['eta_el_max'] == 1. / 4.
+    assert record['omega_sum'] == 5. / 10.
+    assert record['period_hours'] == 1.5
+
+
+def test_merge_kpis_of_two_years():
+    first = kpis(results([1.], [1.], [4.], [2.]))
+    second = kpis(results([3.], [1.], [8.], [1.]))
+    merged = merge_kpis([first, second])
+    assert merged['chp_heat_sum'] == 4.
+    assert merged['boiler_max'] == 2.
+    assert merged['eta_el_min'] == 1. / 8.
+    assert merged['boiler_full_load_hours'] == 3. / 2.
+    assert merged['eta_el_sum'] == 2. / 12.
+    assert merged['time_steps'] == 2
+    assert np.isnan(merge_kpis([kpis(results([0.], [0.], [0.], [0.]))])[
+        'eta_el_sum'])
@@ -0,0 +1,91 @@
+'''
+Tests of the run manifest and the result cache
+(flexCHP_SysOpt/src/manifest.py).
+'''
+
+import os
+import shutil
+
+import pytest
+
+from manifest import plan_runs, finish_runs, result_files, dumps_dir
+
+
+def write_parameters(path, values):
+    with open(path, 'w') as f:
+        f.write('id,var_name,value\n')
+        for i, (name, value) in enumerate(values.items()):
+            f.write('{0},{1},{2}\n'.format(i + 1, name, value))
+
+
+@pytest.fixture
+def experiment(tmp_path):
+    """Config and directory of an experiment with three variations, the
+    last one has the same inputs as the first one."""
+    abs_path = str(tmp_path)
+    write_parameters(abs_path + '/parameters.csv', {'nom_val_gas': 100})
+    write_parameters(abs_path + '/variation_a.csv', {'gas_price_variation': 1})
+    write_parameters(abs_path + '/variation_b.csv', {'gas_price_variation': 2})
+    with open(abs_path + '/demand.csv', 'w') as f:
+        f.write('demand_el,demand_th\n1,2\n')
+    cfg = {'price_el_quadratic': False, 'filename_dumb': 'test',
+           'results_format': 'oemof', 'result_cache_size_mb': 1,
+           'parameters_energy_system': '/parameters.csv',
+           'parameter_variation': ['/variation_a.csv', '/variation_b.csv',
+                                   '/variation_a.csv'],
+           'demand_time_series': '/demand.csv'}
+    os.makedirs(dumps_dir(cfg, abs_path))
+    return cfg, abs_path
+
+
+def solve(cfg, abs_path, variation_nrs, size=10):
+    """Write dummy results of the variations to solve."""
+    for variation_nr in variation_nrs:
+        for file_path in result_files(cfg, abs_path, variation_nr).values():
+            with open(file_path, 'wb') as f:
+                f.write(bytes(size))
+
+
+def test_duplicates_are_solved_once(experiment):
+    cfg, abs_path = experiment
+    to_solve, plan = plan_runs(cfg, abs_path, [0, 1, 2])
+    assert to_solve == [0, 1]
+    assert plan[2]['status'] == 'duplicate'
+    assert plan[2]['source'] == 0
+
+    solve(cfg, abs_path, to_solve)
+    finish_runs(cfg, abs_path, plan)
+    assert all(os.path.exists(f)
+               for f in result_files(cfg, abs_path, 2).values())
+
+    to_solve, plan = plan_runs(cfg, abs_path, [0, 1, 2])
+    assert to_solve == []
+    assert {entry['status'] for entry in plan.values()} == {'unchanged'}
+
+
+def test_cache_hit_restores_missing_dumps_directory(experiment):
+    cfg, abs_path = experiment
+    to_solve, plan = plan_runs(cfg, abs_path, [0])
+    solve(cfg, abs_path, to_solve)
+    finish_runs(cfg, abs_path, plan)
+    shutil.rmtree(abs_path + '/results/optimisation_results/dumps')
+
+    to_solve, plan = plan_runs(cfg, abs_path, [0])
+
+    assert to_solve == []
+    assert plan[0]['status'] == 'cached'
+    assert all(os.path.exists(f)
+               for f in result_files(cfg, abs_path, 0).values())
+
+
+def test_least_recently_used_results_are_evicted(experiment):
+    cfg, abs_path = experiment
+    size = 600 * 2**10
+    for variation_nr in [0, 1]:
+        to_solve, plan = plan_runs(cfg, abs_path, [variation_nr])
+        solve(cfg, abs_path, to_solve, size=size)
+        finish_runs(cfg, abs_path, plan)
+
+    cache = abs_path + '/results/optimisation_results/cache'
+    assert sorted(os.listdir(cache)) == sorted(['index.json',
+                                                plan[1]['hash']])
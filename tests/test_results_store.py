@@ -0,0 +1,60 @@
+'''
+Tests of the columnar results store (common/results_store.py).
+'''
+
+import pandas as pd
+import pytest
+
+from results_store import write_results, read_results, iter_years, node
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def results():
+    index = pd.date_range('2019-12-31 22:00', periods=4, freq='60min')
+    return {
+        ('CHP_01', 'heat'): {
+            'sequences': pd.DataFrame({'flow': [1., 2., 3., 4.]},
+                                      index=index),
+            'scalars': pd.Series(dtype=float)},
+        ('storage_th', None): {
+            'sequences': pd.DataFrame({'capacity': [5., 6., 7., 8.]},
+                                      index=index),
+            'scalars': pd.Series({'invest': 10.})},
+        ('heat', 'demand_th'): {
+            'sequences': pd.DataFrame({'flow': [0., 1., 0., 1.]},
+                                      index=index),
+            'scalars': pd.Series(dtype=float)}}
+
+
+def test_round_trip(tmp_path, results):
+    write_results(results, str(tmp_path), 'test')
+    restored = read_results(str(tmp_path), 'test')
+
+    assert set(restored) == {('CHP_01', 'heat'), ('storage_th', 'None'),
+                             ('heat', 'demand_th')}
+    pd.testing.assert_frame_equal(
+        restored[('CHP_01', 'heat')]['sequences'],
+        results[('CHP_01', 'heat')]['sequences'], check_names=False,
+        check_freq=False)
+    assert restored[('storage_th', 'None')]['scalars']['invest'] == 10.
+
+
+def test_read_selected_flows_and_nodes(tmp_path, results):
+    write_results(results, str(tmp_path), 'test')
+    restored = read_results(str(tmp_path), 'test',
+                            flows=[('storage_th', 'None')], nodes=['heat'])
+    assert set(restored) == set([('storage_th', 'None'), ('CHP_01', 'heat'),
+                                 ('heat', 'demand_th')])
+    restored = read_results(str(tmp_path), 'test', nodes=['CHP_01'])
+    assert set(restored) == {('CHP_01', 'heat')}
+    assert list(node(restored, 'heat')['sequences'].sum()) == [10.]
+
+
+def test_iter_years(tmp_path, results):
+    write_results(results, str(tmp_path), 'test')
+    years = list(iter_years(str(tmp_path), 'test',
+                            flows=[('CHP_01', 'heat')]))
+    assert [list(year[('CHP_01', 'heat')]['sequences']['flow'])
+            for year in years] == [[1., 2.], [3., 4.]]
@@ -0,0 +1,38 @@
+'''
+Tests of the sensitivity table (flexCHP_SysOpt/src/analyse_sensitivity.py).
+'''
+
+import pandas as pd
+
+from analyse_sensitivity import sensitivity_table
+
+
+def test_one_at_a_time_variation():
+    variations = pd.DataFrame({'gas_price_variation': [1.0, 0.5, 1.5, 1.0],
+                               'TES_capex_variation': [1.0, 1.0, 1.0, 2.0],
+                               'fixed': [1.0, 1.0, 1.0, 1.0]})
+    data = pd.DataFrame({'TES_cap_MWh': [10., 20., 5., 2.]})
+
+    table = sensitivity_table(data, variations, ['TES_cap_MWh'])
+
+    assert set(table['parameter']) == {'gas_price_variation',
+                                       'TES_capex_variation'}
+    gas = table[table['parameter'] == 'gas_price_variation'].set_index(
+        'level')
+    assert gas.loc[0.5, 'value'] == 20.
+    assert gas.loc[1.0, 'value'] == 10.
+    assert (table['method'] == 'one_at_a_time').all()
+
+
+def test_main_effect_without_base_slice():
+    # Latin hypercube like sample: no run varies a single parameter only
+    variations = pd.DataFrame({'a': [0., 1., 2., 1.],
+                               'b': [0., 2., 1., 1.]})
+    data = pd.DataFrame({'kpi': [1., 2., 3., 4.]})
+
+    table = sensitivity_table(data, variations, ['kpi'])
+
+    a = table[table['parameter'] == 'a'].set_index('level')
+    assert a.loc[0., 'method'] == 'one_at_a_time'
+    assert a.loc[1., 'method'] == 'main_effect'
+    assert a.loc[1., 'value'] == 3.
@@ -0,0 +1,91 @@
+'''
+Small solves of both models on synthetic profiles (skipped without oemof
+and cbc).
+'''
+
+import glob
+import os
+
+from conftest import requires_solver
+
+
+@requires_solver
+def test_sweep_reuses_model(solve_case):
+    dumps = solve_case('flexCHP_SysOpt', 24,
+                       {'reuse_model': True, 'price_el_quadratic': False},
+                       ['solve', '--variations', '0', '1'])
+    for variation_nr in [0, 1]:
+        assert glob.glob(os.path.join(
+            dumps, 'linear_price_relationship',
+            'pytest_flexCHP_SysOpt_24_scenario_{0}*'.format(variation_nr)))
+
+
+@requires_solver
+def test_sweep_reuses_model_with_typical_days(solve_case):
+    # Variation 1 differs from the base scenario in costs only, so the model
+    # of the typical days is solved a second time
+    dumps = solve_case('flexCHP_SysOpt', 72,
+                       {'reuse_model': True, 'typical_days': 2,
+                        'price_el_quadratic': False},
+                       ['solve', '--variations', '0', '1'])
+    for variation_nr in [0, 1]:
+        assert glob.glob(os.path.join(
+            dumps, 'linear_price_relationship',
+            'pytest_flexCHP_SysOpt_72_scenario_{0}*'.format(variation_nr)))
+
+
+@requires_solver
+def test_typical_days_with_full_extraction(solve_case):
+    from oemof import solph
+    dumps = solve_case('flexCHP_SysOpt', 72,
+                       {'typical_days': 2, 'results_extraction': 'full',
+                        'results_format': 'oemof',
+                        'price_el_quadratic': False},
+                       ['solve', '--variations', '0'])
+    energysystem = solph.EnergySystem()
+    energysystem.restore(
+        dpath=os.path.join(dumps, 'linear_price_relationship'),
+        filename='pytest_flexCHP_SysOpt_72_scenario_0.oemof')
+    results = {tuple(str(n) for n in key): value
+               for key, value in energysystem.results['main'].items()}
+    storage = results[('storage_th', 'None')]
+    # The levels at the start of the days are not read as a time series or
+    # as scalars of the storage
+    assert len(storage['sequences']) == 72
+    assert list(storage['sequences'].columns) == ['capacity']
+    assert list(storage['scalars'].index) == ['invest']
+    # The levels are added to the change within the typical days
+    assert storage['sequences']['capacity'].between(
+        -1e-6, storage['scalars']['invest'] + 1e-6).all()
+
+
+@requires_solver
+def test_rolling_horizon_counts_overlap_once(solve_case):
+    from oemof import solph
+
+    def solve(settings):
+        dumps = solve_case('flexCHP', 72, dict(settings,
+                                               results_format='oemof'),
+                           ['solve', '--scenarios', '1'])
+        energysystem = solph.EnergySystem()
+        energysystem.restore(dpath=dumps,
+                             filename='pytest_flexCHP_72_scenario_1.oemof')
+        return energysystem
+
+    rolling = solve({'rolling_horizon': True,
+                     'rolling_horizon_window_days': 2,
+                     'rolling_horizon_overlap_days': 1})
+    full = solve({'rolling_horizon': False})
+
+    assert len(rolling.timeindex) == 72
+    assert rolling.results['meta']['rolling_horizon_windows'] == 2
+    # The meta results have the structure of a single optimisation
+    assert set(full.results['meta']) <= set(rolling.results['meta'])
+    assert str(rolling.results['meta']['solver']['Status']) == 'ok'
+    assert str(rolling.results['meta']['solver'][
+        'Termination condition']) == 'optimal'
+    # The windows cover 96 time steps, the costs of the 24 steps of the
+    # overlap are not counted twice
+    objective = full.results['meta']['objective']
+    assert objective * (1 - 1e-6) <= rolling.results['meta']['objective'] \
+        <= objective * 1.05
@@ -0,0 +1,59 @@
+'''
+Tests of the parameter sweeps (flexCHP_SysOpt/src/sweep.py).
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sweep import generate_variations, latin_hypercube
+
+BASE = pd.Series({'gas_price_variation': 1.0, 'TES_capex_variation': 1.0,
+                  'nom_val_gas': 100.0})
+
+SPECS = {'gas_price_variation': [0.8, 1.0, 1.2],
+         'TES_capex_variation': {'min': 0.5, 'max': 1.5, 'levels': 3}}
+
+
+def sweep(method, **settings):
+    cfg = dict(sweep_method=method, sweep_parameters=SPECS, **settings)
+    return generate_variations(cfg, BASE)
+
+
+def test_one_at_a_time():
+    variations = sweep('oat')
+    assert list(variations.columns) == list(SPECS)
+    assert variations.loc[0].tolist() == [1.0, 1.0]
+    # Two levels besides the base value for each parameter
+    assert len(variations) == 1 + 2 + 2
+    assert ((variations != 1.0).sum(axis=1) <= 1).all()
+
+
+def test_full_factorial_without_duplicate_base():
+    variations = sweep('factorial')
+    assert len(variations) == 3 * 3
+    assert variations.loc[0].tolist() == [1.0, 1.0]
+    assert not variations.duplicated().any()
+
+
+def test_latin_hypercube_within_ranges():
+    variations = sweep('lhs', sweep_samples=10, sweep_seed=1)
+    samples = variations.iloc[1:]
+    assert len(samples) == 10
+    assert samples['gas_price_variation'].between(0.8, 1.2).all()
+    assert samples['TES_capex_variation'].between(0.5, 1.5).all()
+    assert variations.equals(sweep('lhs', sweep_samples=10, sweep_seed=1))
+
+
+def test_latin_hypercube_strata():
+    samples = latin_hypercube(8, 2, seed=3)
+    for d in range(2):
+        assert sorted(np.floor(samples[:, d] * 8)) == list(range(8))
+
+
+def test_unknown_method_and_parameter():
+    with pytest.raises(ValueError):
+        sweep('grid')
+    cfg = {'sweep_method': 'oat', 'sweep_parameters': {'unknown': [1, 2]}}
+    with pytest.raises(ValueError):
+        generate_variations(cfg, BASE)
@@ -0,0 +1,62 @@
+'''
+Tests of the time series handling shared by the models (common/timeseries.py).
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from timeseries import (horizon_steps, step_hours, resampling_ratio,
+                        resample, year_slices)
+
+
+def test_horizon_steps():
+    assert horizon_steps({'debug': True, 'number_of_time_steps': 8760}) == 3
+    assert horizon_steps({'debug': False,
+                          'number_of_time_steps': 8760}) == 8760
+    assert horizon_steps({'debug': False,
+                          'number_of_time_steps': None}) is None
+
+
+def test_resampling_ratio():
+    assert step_hours('15min') == 0.25
+    assert resampling_ratio('60min', '15min') == 4
+    assert resampling_ratio('15min', '60min') == 0.25
+    with pytest.raises(ValueError):
+        resampling_ratio('60min', '25min')
+
+
+def test_resample_repeat_keeps_energy():
+    data = pd.DataFrame({'demand_el': [1., 3.]})
+    resampled = resample(data, '60min', '15min')
+    assert list(resampled['demand_el']) == [1.] * 4 + [3.] * 4
+    assert resampled['demand_el'].sum() * 0.25 == data['demand_el'].sum()
+
+
+def test_resample_interpolate_and_average():
+    data = pd.DataFrame({'demand_el': [0., 4.]})
+    interpolated = resample(data, '60min', '15min', method='interpolate')
+    assert list(interpolated['demand_el'][:5]) == [0., 1., 2., 3., 4.]
+
+    averaged = resample(pd.DataFrame({'demand_el': np.arange(8.)}),
+                        '15min', '60min')
+    assert list(averaged['demand_el']) == [1.5, 5.5]
+
+    with pytest.raises(ValueError):
+        resample(data, '60min', '15min', method='spline')
+
+
+def test_resample_continues_timestamps():
+    data = pd.DataFrame({
+        'timestamp': pd.date_range('2019-01-01', periods=2, freq='60min'),
+        'demand_el': [1., 2.]})
+    resampled = resample(data, '60min', '30min')
+    assert list(resampled.columns) == ['timestamp', 'demand_el']
+    assert resampled['timestamp'].iloc[-1] == pd.Timestamp(
+        '2019-01-01 01:30')
+
+
+def test_year_slices():
+    index = pd.date_range('2019-12-31 22:00', periods=4, freq='60min')
+    assert year_slices(index) == [(2019, slice(0, 2)), (2020, slice(2, 4))]
+    assert year_slices(pd.RangeIndex(3)) == [(None, slice(0, 3))]